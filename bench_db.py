@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Handler throughput while a slow query is in flight: the old sync Session used
+directly on the event loop versus the async engine. Needs DATABASE_URL
+pointing at a Postgres database the bot has initialised.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import statistics
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from models import User, init_async_db
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+DURATION = float(os.getenv('BENCH_DURATION', '5'))  # seconds per run
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', '8'))  # concurrent handlers
+SLOW_QUERY_SECONDS = float(os.getenv('BENCH_SLOW_QUERY', '2'))
+
+async def run_load(handler, slow_query):
+    """Run CONCURRENCY handler loops for DURATION seconds with one slow query started alongside"""
+    latencies = []
+    deadline = time.perf_counter() + DURATION
+
+    async def worker(uid):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await handler(uid)
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0)  # give the other handlers a turn, as PTB would between updates
+
+    await asyncio.gather(slow_query(), *(worker(uid) for uid in range(CONCURRENCY)))
+    return latencies
+
+def report(name, latencies):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if len(latencies) >= 100 else latencies[-1]
+    logger.info(
+        f"{name}: {len(latencies) / DURATION:,.0f} handlers/s | p50 {statistics.median(latencies) * 1000:.1f}ms | "
+        f"p99 {p99 * 1000:.1f}ms | max {latencies[-1] * 1000:.0f}ms"
+    )
+
+async def bench_sync(database_url):
+    """The old path: a sync Session queried straight from the coroutine"""
+    engine = create_engine(database_url, pool_size=CONCURRENCY + 1)
+    Session = sessionmaker(bind=engine)
+
+    async def handler(uid):
+        session = Session()
+        try:
+            session.execute(select(User.id).filter_by(telegram_id=uid)).first()
+        finally:
+            session.close()
+
+    async def slow_query():
+        session = Session()
+        try:
+            session.execute(text("SELECT pg_sleep(:s)"), {'s': SLOW_QUERY_SECONDS})
+        finally:
+            session.close()
+
+    try:
+        return await run_load(handler, slow_query)
+    finally:
+        engine.dispose()
+
+async def bench_async(database_url):
+    """The new path: async sessions from a sized pool"""
+    engine = init_async_db(database_url, pool_size=CONCURRENCY + 1, max_overflow=0)
+    AsyncSession = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def handler(uid):
+        async with AsyncSession() as session:
+            await session.scalar(select(User.id).filter_by(telegram_id=uid))
+
+    async def slow_query():
+        async with AsyncSession() as session:
+            await session.execute(text("SELECT pg_sleep(:s)"), {'s': SLOW_QUERY_SECONDS})
+
+    try:
+        return await run_load(handler, slow_query)
+    finally:
+        await engine.dispose()
+
+async def main():
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL is required for this benchmark")
+        return
+    logger.info(f"{CONCURRENCY} concurrent handlers for {DURATION:g}s, one {SLOW_QUERY_SECONDS:g}s query in flight")
+    report("sync Session on the loop", await bench_sync(database_url))
+    report("async engine", await bench_async(database_url))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Per-event cost of the metrics instrumentation: a histogram observation, a
+counter increment, a timed block, and a wrapped handler versus a bare one.
+"""
+
+import os
+import time
+import asyncio
+import logging
+
+from metrics import Registry, instrument_handler
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+EVENTS = int(os.getenv('BENCH_EVENTS', '1000000'))
+BUDGET_US = 3.0  # per-event overhead we're willing to pay on the hot path
+
+def per_event_us(fn):
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) / EVENTS * 1e6
+
+def main():
+    registry = Registry()
+    latency = registry.histogram('bench_seconds', 'Bench latency', ('handler', 'kind'))
+    calls = registry.counter('bench_total', 'Bench calls', ('method', 'status'))
+    values = [(i % 1000) / 10000 for i in range(EVENTS)]
+
+    def empty():
+        for value in values:
+            pass
+
+    def observe():
+        for value in values:
+            latency.observe(value, 'button_handler', 'menu_buy')
+
+    def inc():
+        for value in values:
+            calls.inc('sendMessage', '200')
+
+    def timed():
+        for value in values:
+            with latency.time('handle_message', 'buy'):
+                pass
+
+    async def handler(update, context):
+        pass
+
+    wrapped = instrument_handler(handler, 'bench', lambda update: 'kind')
+
+    def handlers(callback):
+        async def run():
+            for value in values:
+                await callback(None, None)
+        return lambda: asyncio.run(run())
+
+    baseline = per_event_us(empty)
+    results = {
+        'histogram observe': per_event_us(observe) - baseline,
+        'counter inc': per_event_us(inc) - baseline,
+        'timed block': per_event_us(timed) - baseline,
+        'wrapped handler': per_event_us(handlers(wrapped)) - per_event_us(handlers(handler)),
+    }
+    logger.info(f"{EVENTS:,} events each")
+    for name, us in results.items():
+        logger.info(f"{name:<18} {us:.2f}µs/event {'✅' if us < BUDGET_US else '❌'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Latency comparison between the old thread-offloaded requests.get price path
+and the pooled aiohttp BirdeyeProvider, using a local fake Birdeye server.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import statistics
+import requests
+from aiohttp import web
+
+from token_utils import BirdeyeProvider
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
+
+TOTAL_REQUESTS = int(os.getenv('BENCH_REQUESTS', '1000'))
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', '50'))
+SERVER_DELAY = float(os.getenv('BENCH_SERVER_DELAY', '0.005'))  # simulated upstream work
+TOKEN = "DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263"
+
+async def fake_price_handler(request):
+    """Pretend to be Birdeye's /defi/price endpoint"""
+    await asyncio.sleep(SERVER_DELAY)
+    return web.json_response({"success": True, "data": {"value": 0.0000123, "updateUnixTime": int(time.time())}})
+
+async def start_fake_birdeye():
+    """Start the fake Birdeye server on a free local port"""
+    app = web.Application()
+    app.router.add_get('/defi/price', fake_price_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+async def legacy_get_price(base_url, token_address):
+    """The original bot.get_token_price path: a new requests.get per lookup in a worker thread"""
+    url = f"{base_url}/defi/price?address={token_address}"
+    headers = {"accept": "application/json", "x-chain": "solana", "X-API-KEY": "bench"}
+    response = await asyncio.to_thread(requests.get, url, headers=headers)
+    return float(response.json()["data"]["value"])
+
+async def run_load(fetch):
+    """Fire TOTAL_REQUESTS lookups with CONCURRENCY in flight and collect latencies"""
+    latencies = []
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await fetch(TOKEN)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(TOTAL_REQUESTS)))
+    return latencies, time.perf_counter() - started
+
+def report(name, latencies, elapsed):
+    """Log latency percentiles and throughput for one run"""
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    mean = statistics.mean(latencies) * 1000
+    logger.info(
+        f"{name:<14} mean {mean:7.2f} ms | p50 {p50:7.2f} ms | p95 {p95:7.2f} ms | "
+        f"p99 {p99:7.2f} ms | {len(latencies) / elapsed:8.1f} req/s"
+    )
+    return p50
+
+async def main():
+    """Run both paths against the same fake server"""
+    runner, base_url = await start_fake_birdeye()
+    logger.info(f"Fake Birdeye at {base_url}: {TOTAL_REQUESTS} lookups, concurrency {CONCURRENCY}")
+    try:
+        legacy_p50 = report("to_thread", *await run_load(lambda t: legacy_get_price(base_url, t)))
+
+        client = BirdeyeProvider("bench", base_url=base_url, pool_size=CONCURRENCY)
+        await client.start()
+        try:
+            await client.get_price(TOKEN)  # warm the pool like a running bot would be
+            pooled_p50 = report("pooled aiohttp", *await run_load(client.get_price))
+        finally:
+            await client.close()
+
+        logger.info(f"p50 speedup: {legacy_p50 / pooled_p50:.1f}x")
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the tick store: bulk append, then range and OHLC queries
+against a large single-token history.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import tempfile
+
+from tick_store import TickStore
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+TOTAL_TICKS = int(os.getenv('BENCH_TICKS', '10000000'))
+QUERIES = int(os.getenv('BENCH_QUERIES', '200'))
+TOKEN = "DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263"
+
+async def main():
+    """Fill a store with TOTAL_TICKS one-per-second ticks and time queries on it"""
+    with tempfile.TemporaryDirectory() as root:
+        store = TickStore(root)
+        started = time.perf_counter()
+        price = 1.0
+        for i in range(TOTAL_TICKS):
+            price *= 1 + random.uniform(-0.001, 0.001)
+            store.append(TOKEN, float(i), price)
+            if i % 1_000_000 == 999_999:
+                await store.flush()
+        await store.flush()
+        elapsed = time.perf_counter() - started
+        logger.info(f"Appended {TOTAL_TICKS:,} ticks in {elapsed:.1f}s ({TOTAL_TICKS / elapsed:,.0f} ticks/s)")
+
+        reopened = TickStore(root)  # cold: segments discovered from disk and memory-mapped
+        windows = [random.uniform(0, TOTAL_TICKS - 3600) for _ in range(QUERIES)]
+
+        started = time.perf_counter()
+        for start in windows:
+            ts, px = reopened.range(TOKEN, start, start + 3600)
+        per_query = (time.perf_counter() - started) / QUERIES
+        logger.info(f"1h range query ({len(ts)} ticks): {per_query * 1e6:,.0f} µs")
+
+        started = time.perf_counter()
+        for start in windows[:20]:
+            bars = reopened.ohlc(TOKEN, start, start + 86400, 60)
+        per_query = (time.perf_counter() - started) / 20
+        logger.info(f"24h → 1m OHLC ({len(bars)} bars): {per_query * 1e3:,.1f} ms")
+
+        await store.stop()
+        await reopened.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
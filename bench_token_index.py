@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the local token search index: rebuild time and per-query
+latency for prefix hits, fuzzy (typo) hits and misses.
+"""
+
+import os
+import time
+import random
+import string
+import asyncio
+import logging
+
+from token_index import TokenSearchIndex
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+TOKENS = int(os.getenv('BENCH_TOKENS', '1000'))  # TOKEN_INDEX_SIZE in production
+QUERIES = int(os.getenv('BENCH_QUERIES', '10000'))
+
+def make_universe(count):
+    rng = random.Random(42)
+    tokens = []
+    for i in range(count):
+        symbol = ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(3, 7)))
+        name = ' '.join(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8))) for _ in range(rng.randint(1, 3)))
+        tokens.append({'address': f"{symbol}{i:08d}", 'symbol': symbol, 'name': name,
+                       'v24hUSD': rng.uniform(0, 1e7)})
+    return tokens
+
+def typo(symbol, rng):
+    i = rng.randrange(len(symbol))
+    return symbol[:i] + symbol[i + 1:] if len(symbol) > 4 else symbol + 'X'
+
+def time_queries(index, queries):
+    started = time.perf_counter()
+    found = 0
+    for query in queries:
+        found += bool(index.lookup(query))
+    return (time.perf_counter() - started) / len(queries), found
+
+async def main():
+    """Index TOKENS synthetic tokens and time lookups against them"""
+    universe = make_universe(TOKENS)
+
+    async def load_universe():
+        return universe
+
+    async def remote_search(query):
+        return []
+
+    index = TokenSearchIndex(load_universe, remote_search)
+    started = time.perf_counter()
+    await index.refresh()
+    logger.info(f"Indexed {len(index):,} tokens in {(time.perf_counter() - started) * 1e3:,.1f} ms")
+
+    rng = random.Random(7)
+    symbols = [t['symbol'] for t in universe]
+    cases = {
+        'prefix': [rng.choice(symbols)[:rng.randint(2, 3)] for _ in range(QUERIES)],
+        'exact symbol': [rng.choice(symbols) for _ in range(QUERIES)],
+        'typo (fuzzy)': [typo(rng.choice(symbols), rng) for _ in range(QUERIES)],
+        'miss': [''.join(rng.choices(string.digits, k=6)) for _ in range(QUERIES)],
+    }
+    for name, queries in cases.items():
+        per_query, found = time_queries(index, queries)
+        logger.info(f"{name}: {per_query * 1e6:,.1f} µs/query ({found / len(queries):.0%} answered locally)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Throughput of sequential update handling (the Application default) versus
+PerUserUpdateProcessor, at 1, 8 and 64 concurrent users. Each update
+simulates a trade whose price fetch takes BENCH_FETCH_DELAY seconds.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+
+from update_processor import PerUserUpdateProcessor
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+UPDATES_PER_USER = int(os.getenv('BENCH_UPDATES_PER_USER', '10'))
+FETCH_DELAY = float(os.getenv('BENCH_FETCH_DELAY', '0.02'))  # simulated price fetch
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', '64'))  # MAX_CONCURRENT_UPDATES
+USER_COUNTS = (1, 8, 64)
+
+def make_updates(users):
+    """Updates from `users` users, interleaved as they'd arrive"""
+    updates = []
+    for n in range(UPDATES_PER_USER):
+        for uid in range(1, users + 1):
+            user = User(id=uid, first_name=f"user{uid}", is_bot=False)
+            message = Message(message_id=n, date=datetime.now(), chat=Chat(id=uid, type='private'), from_user=user)
+            updates.append(Update(update_id=len(updates), message=message))
+    return updates
+
+async def handle_trade(update, balances, order):
+    """Read-modify-write on the user's state around a slow price fetch, like handle_buy_token"""
+    uid = update.effective_user.id
+    balance = balances[uid]
+    await asyncio.sleep(FETCH_DELAY)
+    balances[uid] = balance - 1
+    order.setdefault(uid, []).append(update.update_id)
+
+async def run_sequential(updates):
+    balances = {update.effective_user.id: 0 for update in updates}
+    order = {}
+    for update in updates:
+        await handle_trade(update, balances, order)
+    return balances, order
+
+async def run_per_user(updates):
+    balances = {update.effective_user.id: 0 for update in updates}
+    order = {}
+    processor = PerUserUpdateProcessor(max_concurrent_updates=CONCURRENCY)
+    # Application creates one task per update when updates are processed concurrently
+    tasks = [asyncio.create_task(processor.process_update(update, handle_trade(update, balances, order)))
+             for update in updates]
+    await asyncio.gather(*tasks)
+    assert processor.stats()['user_locks'] == 0
+    return balances, order
+
+async def measure(run, updates):
+    started = time.perf_counter()
+    balances, order = await run(updates)
+    elapsed = time.perf_counter() - started
+    # No lost updates and each user's trades applied in arrival order
+    assert all(balance == -UPDATES_PER_USER for balance in balances.values()), balances
+    assert all(ids == sorted(ids) for ids in order.values())
+    return len(updates) / elapsed
+
+async def main():
+    logger.info(f"{UPDATES_PER_USER} updates per user, {FETCH_DELAY * 1000:.0f}ms fetch, concurrency {CONCURRENCY}")
+    for users in USER_COUNTS:
+        updates = make_updates(users)
+        sequential = await measure(run_sequential, updates)
+        per_user = await measure(run_per_user, updates)
+        logger.info(
+            f"{users:>3} users: sequential {sequential:,.0f} updates/s | "
+            f"per-user locks {per_user:,.0f} updates/s ({per_user / sequential:.1f}x)"
+        )
+
+if __name__ == "__main__":
+    asyncio.run(main())
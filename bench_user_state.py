@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for resident user state: the old dict-of-dicts USERS entries
+versus slotted UserState objects, for BENCH_USERS synthetic users.
+"""
+
+import os
+import gc
+import json
+import random
+import logging
+import tracemalloc
+
+from user_state import UserState, Holding
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+USERS = int(os.getenv('BENCH_USERS', '1000000'))
+TOKENS = int(os.getenv('BENCH_TOKENS', '5000'))  # distinct tokens users pick their holdings from
+HOLDINGS = int(os.getenv('BENCH_HOLDINGS', '3'))  # positions per user
+HISTORY = int(os.getenv('BENCH_HISTORY', '5'))  # recent activity entries per user
+ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+def synthetic_rows():
+    """Yield (holdings, history) per user as they'd come out of the database"""
+    rng = random.Random(42)
+    tokens = ["".join(rng.choice(ALPHABET) for _ in range(44)) for _ in range(TOKENS)]
+    for _ in range(USERS):
+        holdings = {}
+        for token in rng.sample(tokens, HOLDINGS):
+            holdings[token] = {'qty': rng.uniform(1, 1e6), 'avg_price': rng.uniform(1e-6, 1.0)}
+        history = [f"🟢 Bought {h['qty']:.4f} of {t} at ${h['avg_price']:.4f}" for t, h in holdings.items()]
+        history += [f"🔴 Sold 1.0000 of {t} at $0.0100 | PnL: $0.00" for t in list(holdings)[:HISTORY - len(history)]]
+        # Round-trip through JSON so every string is a separate object, as with rows loaded from Postgres
+        yield json.loads(json.dumps(holdings)), json.loads(json.dumps(history[:HISTORY]))
+
+def legacy_entry(uid, holdings, history):
+    return {
+        'db_id': uid,
+        'balance': 1000.0,
+        'holdings': holdings,
+        'realized_pnl': 0.0,
+        'history': history,
+        'context': {},
+        'referral_id': None,
+    }
+
+def slotted_entry(uid, holdings, history):
+    return UserState(
+        db_id=uid,
+        balance=1000.0,
+        holdings={token: Holding(h['qty'], h['avg_price']) for token, h in holdings.items()},
+        history=history,
+    )
+
+def measure(build):
+    """Bytes allocated per user by a USERS dict filled with `build` entries"""
+    gc.collect()
+    tracemalloc.start()
+    users = {}
+    for uid, (holdings, history) in enumerate(synthetic_rows()):
+        users[uid] = build(uid, holdings, history)
+    gc.collect()
+    # The row dicts a builder copies from are freed as we go; only what the entries keep counts
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del users
+    gc.collect()
+    return current / USERS
+
+def main():
+    logger.info(f"{USERS:,} users, {HOLDINGS} holdings and {HISTORY} history entries each, {TOKENS:,} tokens")
+    before = measure(legacy_entry)
+    logger.info(f"dict of dicts: {before:,.0f} bytes/user ({before * USERS / 2**20:,.0f} MiB)")
+    after = measure(slotted_entry)
+    logger.info(f"UserState:     {after:,.0f} bytes/user ({after * USERS / 2**20:,.0f} MiB)")
+    logger.info(f"Saved {1 - after / before:.0%}")
+
+if __name__ == "__main__":
+    main()
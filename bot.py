@@ -1,21 +1,44 @@
+import time
+STARTED_AT = time.monotonic()  # cold-start timing starts before the heavy imports
+
 import os
 import logging
+import random
 import re
 import signal
+import hashlib
 import sys
 from datetime import datetime
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, TypeHandler, filters
+from sqlalchemy import create_engine, select, update as sql_update, func, bindparam, tuple_
 from sqlalchemy.orm import sessionmaker
-import requests
+from sqlalchemy.ext.asyncio import async_sessionmaker
 import asyncio
 import aiohttp
 from aiohttp import web
-import threading
-import time
 
-from models import User, init_db
+from models import User, Trade, Position, init_async_db, migrate
+from token_utils import TokenUtils, BirdeyeProvider, HeliusProvider, PRICE, CATALOG
+from price_cache import PriceCache
+from portfolio import value_portfolio
+from price_feed import HotPriceTable
+from metadata_cache import TokenMetadataCache
+from market_snapshot import MarketSnapshot
+from token_index import TokenSearchIndex
+from rate_limiter import PriorityRateLimiter, request_priority, TRADE, VALUATION, BACKGROUND
+from circuit_breaker import CircuitBreaker
+from tick_store import TickStore
+from persistence import WriteBehind
+from user_cache import UserStateCache
+from user_state import UserState, Holding
+from leaderboard import Leaderboard
+from update_processor import PerUserUpdateProcessor
+from webhook import TelegramWebhook
+from metrics import (REGISTRY, TOKEN_PRICE_SECONDS, TOKEN_PRICE_ERRORS, DB_COMMIT_SECONDS,
+                     instrument_handler, InstrumentedRequest, LoopLagMonitor)
+from readiness import ReadinessProber, Freshness
 
 # Load environment variables
 load_dotenv()
@@ -27,60 +50,144 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize database
-import time
-max_retries = 5
-retry_delay = 10  # seconds
-
-for attempt in range(max_retries):
-    try:
-        logger.info(f"Attempting to connect to database (attempt {attempt + 1}/{max_retries})...")
-        engine = init_db(os.getenv('DATABASE_URL'))
-        Session = sessionmaker(bind=engine)
-        logger.info("Database initialized successfully")
-        break
-    except Exception as e:
-        logger.error(f"Failed to initialize database (attempt {attempt + 1}/{max_retries}): {e}")
-        if attempt < max_retries - 1:
-            logger.info(f"Retrying in {retry_delay} seconds...")
-            time.sleep(retry_delay)
-        else:
-            logger.error("Max retries reached. Please check your DATABASE_URL and ensure the database is running.")
-            raise
-
 # Constants
 INITIAL_BALANCE = 1000.0
 REFERRAL_BONUS = 500.0
 ADMIN_ID = int(os.getenv('ADMIN_ID'))
 BIRDEYE_API_KEY = os.getenv('BIRDEYE_API_KEY')
+BIRDEYE_TIMEOUT = float(os.getenv('BIRDEYE_TIMEOUT', '5'))
+BIRDEYE_POOL_SIZE = int(os.getenv('BIRDEYE_POOL_SIZE', '100'))
+BIRDEYE_RATE_LIMIT = float(os.getenv('BIRDEYE_RATE_LIMIT', '15'))  # requests per second
+BIRDEYE_BURST = float(os.getenv('BIRDEYE_BURST', '15'))
+HELIUS_API_KEY = os.getenv('HELIUS_API_KEY')
+HELIUS_TIMEOUT = float(os.getenv('HELIUS_TIMEOUT', '5'))
+MARKET_DATA_HEDGE_DELAY = float(os.getenv('MARKET_DATA_HEDGE_DELAY', '0.5'))  # until p95 is known
+BREAKER_FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', '0.5'))
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '10'))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '15'))
+PRICE_CACHE_TTL = float(os.getenv('PRICE_CACHE_TTL', '5'))  # seconds
+PRICE_CACHE_MAX_SIZE = int(os.getenv('PRICE_CACHE_MAX_SIZE', '10000'))
+PRICE_REFRESH_INTERVAL = float(os.getenv('PRICE_REFRESH_INTERVAL', '10'))  # seconds
+MARKET_SNAPSHOT_INTERVAL = float(os.getenv('MARKET_SNAPSHOT_INTERVAL', '15'))  # seconds
+TOP_MOVERS_LIMIT = 10
+TOKEN_INDEX_SIZE = int(os.getenv('TOKEN_INDEX_SIZE', '1000'))  # top tokens by volume to index
+TOKEN_INDEX_INTERVAL = float(os.getenv('TOKEN_INDEX_INTERVAL', '600'))  # seconds
+SEARCH_RESULTS_LIMIT = 8
+HISTORY_WINDOW = 20  # recent activity entries kept on the user row; full trades live in the ledger
+HISTORY_PAGE_SIZE = 10
+REFERRAL_LEADERBOARD_SIZE = 10
+READY_PROBE_INTERVAL = float(os.getenv('READY_PROBE_INTERVAL', '5'))  # seconds between readiness probes
+READY_MAX_LOOP_LAG = float(os.getenv('READY_MAX_LOOP_LAG', '1'))  # seconds
+PRICE_STALE_AFTER = float(os.getenv('PRICE_STALE_AFTER', '120'))  # seconds of failing price fetches before unready
+UPDATE_STALL_SECONDS = float(os.getenv('UPDATE_STALL_SECONDS', '60'))  # longest an update may wait to start
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', '64'))  # handlers running at once, one per user
+TICK_STORE_DIR = os.getenv('TICK_STORE_DIR', 'data/ticks')
+TICK_FLUSH_INTERVAL = float(os.getenv('TICK_FLUSH_INTERVAL', '5'))  # seconds
+WRITE_BEHIND_INTERVAL = float(os.getenv('WRITE_BEHIND_INTERVAL', '1'))  # seconds of trades a crash can lose
+WRITE_BEHIND_MAX_DIRTY = int(os.getenv('WRITE_BEHIND_MAX_DIRTY', '500'))  # flush early past this many users
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))  # users kept in memory
+LEADERBOARD_INTERVAL = float(os.getenv('LEADERBOARD_INTERVAL', '60'))  # seconds between equity rankings
+LEADERBOARD_SIZE = 10
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '5'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))  # seconds to wait for a free connection
+DB_CONNECT_ATTEMPTS = int(os.getenv('DB_CONNECT_ATTEMPTS', '6'))
+DB_CONNECT_BASE_DELAY = float(os.getenv('DB_CONNECT_BASE_DELAY', '1'))  # seconds, doubled per attempt
+DB_CONNECT_MAX_DELAY = float(os.getenv('DB_CONNECT_MAX_DELAY', '20'))
 
 # Uptime monitoring settings
 UPTIME_MONITORING_ENABLED = os.getenv('UPTIME_MONITORING_ENABLED', 'true').lower() == 'true'
 UPTIME_PING_INTERVAL = int(os.getenv('UPTIME_PING_INTERVAL', '300'))  # 5 minutes default
 UPTIME_URLS = os.getenv('UPTIME_URLS', '').split(',') if os.getenv('UPTIME_URLS') else []
 
+# Webhook mode: set WEBHOOK_URL to the public base URL of the uptime server to receive updates there instead of polling
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+# Defaults to one derived from the bot token, so it survives restarts without extra config
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or hashlib.sha256(os.getenv('BOT_TOKEN', '').encode()).hexdigest()
+
 # Promotional links
 TROJAN_BOT_LINK = "https://t.me/solana_trojanbot?start=r-abhyudday"
 GMGN_BOT_LINK = "https://t.me/GMGN_sol_bot?start=i_NEu2DbZx"
 
-# In-memory user data
-USERS = {}
+# Engines connect lazily; post_init connects and migrates with backoff.
+# Handlers use the async engine; the sync engine is only used from worker threads
+# (write-behind flushes, metadata cache)
+engine = create_engine(os.getenv('DATABASE_URL'), pool_pre_ping=True)
+Session = sessionmaker(bind=engine)
+async_engine = init_async_db(os.getenv('DATABASE_URL'), pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                             pool_timeout=DB_POOL_TIMEOUT)
+AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
+first_update_seen = False
+bot_application = None  # set in post_init, for the readiness checks
+services_started = None  # when post_init finished starting the database and background services
+price_fetches = Freshness()
 
 # Global variables for uptime monitoring
 uptime_server = None
 uptime_task = None
 
+# Market data providers in order of preference (sessions opened in post_init)
+# All Birdeye calls share one API key quota; trades get slots first, then valuation, then rankings/search
+birdeye_limiter = PriorityRateLimiter(BIRDEYE_RATE_LIMIT, BIRDEYE_BURST)
+def provider_breakers(name):
+    """One breaker per method group, so catalog failures never block pricing"""
+    return {group: CircuitBreaker(f"{name}:{group}", BREAKER_FAILURE_RATE, BREAKER_MIN_CALLS,
+                                  open_for=BREAKER_OPEN_SECONDS) for group in (PRICE, CATALOG)}
+
+market_providers = [BirdeyeProvider(BIRDEYE_API_KEY, pool_size=BIRDEYE_POOL_SIZE, timeout=BIRDEYE_TIMEOUT,
+                                    rate_limiter=birdeye_limiter, circuit_breakers=provider_breakers('birdeye'))]
+if HELIUS_API_KEY:
+    market_providers.append(HeliusProvider(HELIUS_API_KEY, timeout=HELIUS_TIMEOUT,
+                                           circuit_breakers=provider_breakers('helius')))
+market_data = TokenUtils(market_providers, hedge_delay=MARKET_DATA_HEDGE_DELAY)
+
+# Symbols/decimals, batch-filled from Helius' multi-mint metadata when available
+metadata_source = TokenUtils(sorted(market_providers, key=lambda p: p.name != 'helius'), hedging=False)
+token_metadata = TokenMetadataCache(Session, metadata_source.get_tokens_metadata)
+
+# Top gainers/losers are the same for everyone, so they're refreshed in the background
+market_snapshot = MarketSnapshot({
+    'gainers': lambda: market_data.get_top_gainers(TOP_MOVERS_LIMIT),
+    'losers': lambda: market_data.get_top_losers(TOP_MOVERS_LIMIT),
+}, interval=MARKET_SNAPSHOT_INTERVAL)
+
+# Local symbol/name search over the highest-volume tokens
+token_index = TokenSearchIndex(
+    lambda: market_data.get_token_universe(TOKEN_INDEX_SIZE),
+    market_data.search_tokens,
+    interval=TOKEN_INDEX_INTERVAL,
+)
+price_cache = PriceCache(ttl=PRICE_CACHE_TTL, max_size=PRICE_CACHE_MAX_SIZE)
+
+# Every price we fetch is kept as a tick for charts and replays
+tick_store = TickStore(TICK_STORE_DIR)
+
 async def uptime_ping_handler(request):
     """Handle uptime ping requests"""
     return web.Response(text="Bot is alive! 🚀", status=200)
 
-async def start_uptime_server():
-    """Start the uptime monitoring HTTP server"""
+async def ready_handler(request):
+    """Readiness: the background prober's last verdict on the database, prices, updates and loop lag"""
+    ready, report = readiness.report()
+    return web.json_response(report, status=200 if ready else 503)
+
+async def metrics_handler(request):
+    """Expose counters and latency histograms in Prometheus text format"""
+    return web.Response(body=REGISTRY.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+async def start_uptime_server(webhook=None):
+    """Start the uptime monitoring HTTP server, plus the webhook route in webhook mode"""
     global uptime_server
     app = web.Application()
     app.router.add_get('/', uptime_ping_handler)
     app.router.add_get('/ping', uptime_ping_handler)
     app.router.add_get('/health', uptime_ping_handler)
+    app.router.add_get('/ready', ready_handler)
+    app.router.add_get('/metrics', metrics_handler)
+    if webhook is not None:
+        webhook.add_routes(app)
     
     runner = web.AppRunner(app)
     await runner.setup()
@@ -93,59 +200,465 @@ async def start_uptime_server():
     logger.info(f"Uptime server started on port {uptime_port}")
     return runner
 
-async def ping_uptime_services():
-    """Ping external uptime monitoring services"""
-    if not UPTIME_MONITORING_ENABLED or not UPTIME_URLS:
-        return
-    
-    async with aiohttp.ClientSession() as session:
-        for url in UPTIME_URLS:
-            url = url.strip()
-            if url:
-                try:
-                    async with session.get(url, timeout=10) as response:
-                        if response.status == 200:
-                            logger.info(f"Successfully pinged uptime service: {url}")
-                        else:
-                            logger.warning(f"Uptime service returned status {response.status}: {url}")
-                except Exception as e:
-                    logger.error(f"Failed to ping uptime service {url}: {e}")
+async def ping_uptime_service(session, url):
+    """Ping one external uptime monitoring service"""
+    try:
+        async with session.get(url) as response:
+            if response.status == 200:
+                logger.info(f"Successfully pinged uptime service: {url}")
+            else:
+                logger.warning(f"Uptime service returned status {response.status}: {url}")
+    except Exception as e:
+        logger.error(f"Failed to ping uptime service {url}: {e}")
+
+async def ping_uptime_services(session):
+    """Ping every external uptime monitoring service concurrently"""
+    urls = [url.strip() for url in UPTIME_URLS if url.strip()]
+    await asyncio.gather(*(ping_uptime_service(session, url) for url in urls))
 
 async def uptime_ping_loop():
-    """Background task to periodically ping uptime services"""
-    while True:
-        try:
-            await ping_uptime_services()
-        except Exception as e:
-            logger.error(f"Error in uptime ping loop: {e}")
-        
-        await asyncio.sleep(UPTIME_PING_INTERVAL)
+    """Background task to periodically ping uptime services, over one shared session"""
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
+        while True:
+            try:
+                await ping_uptime_services(session)
+            except Exception as e:
+                logger.error(f"Error in uptime ping loop: {e}")
+            
+            await asyncio.sleep(UPTIME_PING_INTERVAL)
 
 def is_solana_address(text):
     return bool(re.fullmatch(r"[1-9A-HJ-NP-Za-km-z]{32,44}", text.strip()))
 
+async def fetch_token_price(token_address):
+    """Fetch a live price from the providers and record it as a tick"""
+    try:
+        price = await market_data.get_token_price(token_address)
+    except Exception:
+        price_fetches.failure()
+        raise
+    if price is not None:
+        price_fetches.success()
+        tick_store.append(token_address, time.time(), price)
+    else:
+        price_fetches.failure()
+    return price
+
+async def fetch_token_prices(token_addresses):
+    """Fetch live prices from the providers in one batch and record them as ticks"""
+    try:
+        prices = await market_data.get_token_prices(token_addresses)
+    except Exception:
+        price_fetches.failure()
+        raise
+    if prices:
+        price_fetches.success()
+    elif token_addresses:
+        price_fetches.failure()
+    now = time.time()
+    for address, price in prices.items():
+        tick_store.append(address, now, price)
+    return prices
+
 async def get_token_price(token_address):
-    url = f"https://public-api.birdeye.so/defi/price?address={token_address}"
-    headers = {
-        "accept": "application/json",
-        "x-chain": "solana",
-        "X-API-KEY": BIRDEYE_API_KEY
-    }
+    started = time.perf_counter()
     try:
-        response = await asyncio.to_thread(requests.get, url, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            return float(data["data"]["value"])
+        price = await price_cache.get(token_address, fetch_token_price)
+        if price is None:
+            TOKEN_PRICE_ERRORS.inc('no_price')
+        return price
     except Exception as e:
+        TOKEN_PRICE_ERRORS.inc('exception')
         logger.error(f"Error fetching token price: {e}")
+    finally:
+        TOKEN_PRICE_SECONDS.observe(time.perf_counter() - started)
     return None
 
+async def get_token_prices(token_addresses):
+    """Get prices for many tokens, fetching all cache misses in one batched request"""
+    try:
+        return await price_cache.get_many(token_addresses, fetch_token_prices)
+    except Exception as e:
+        logger.error(f"Error fetching token prices: {e}")
+    return {}
+
+# Background-refreshed prices for every token someone holds
+hot_prices = HotPriceTable(get_token_prices, interval=PRICE_REFRESH_INTERVAL)
+
+async def get_held_token_price(token_address):
+    """Get a held token's price from the hot table, falling back to a live lookup"""
+    price = hot_prices.get(token_address)
+    if price is None:
+        price = await get_token_price(token_address)
+    return price
+
+async def get_held_token_prices(token_addresses):
+    """Get held tokens' prices from the hot table, batch-fetching any that aren't fresh"""
+    prices = {}
+    missing = []
+    for address in token_addresses:
+        price = hot_prices.get(address)
+        if price is None:
+            missing.append(address)
+        else:
+            prices[address] = price
+    if missing:
+        prices.update(await get_token_prices(missing))
+    return prices
+
+def last_known_price(token_address):
+    """Return (price, age in seconds) of the last price we saw for a token, or None"""
+    return price_cache.last_known(token_address)
+
+def format_age(seconds):
+    """Format a staleness age like 45s / 3m / 2h"""
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+def snapshot_user(uid):
+    """Copy a user's persisted fields out of USERS for the write-behind flusher"""
+    user = USERS.peek(uid)
+    if user is None:
+        return None
+    return {
+        'uid': uid,
+        'balance': user.balance,
+        'realized_pnl': user.realized_pnl,
+        'history': user.history,
+    }
+
+def snapshot_position(uid, token_address):
+    """Current state of one position for the flusher (qty None once it's closed)"""
+    user = USERS.peek(uid)
+    if user is None:
+        return None
+    holding = user.holdings.get(token_address)
+    return {
+        'user_id': user.db_id,
+        'token_address': token_address,
+        'qty': holding.qty if holding else None,
+        'avg_price': holding.avg_price if holding else None,
+        'updated_at': datetime.utcnow(),
+    }
+
+# Trades update USERS and are written to the database in batches in the background
+write_behind = WriteBehind(Session, snapshot_user, snapshot_position,
+                           interval=WRITE_BEHIND_INTERVAL, max_dirty=WRITE_BEHIND_MAX_DIRTY)
+
+def add_history(user, entry):
+    """Add an entry to a user's recent activity, keeping only the last HISTORY_WINDOW"""
+    user.add_history(entry, HISTORY_WINDOW)
+
+def persist_user(uid, user):
+    """Mark a user for the next flush, keeping their updated state resident until it's written"""
+    user = USERS.restore(uid, user)
+    track_user(uid, user)  # holdings may have changed
+    write_behind.mark_dirty(uid)
+
+def record_trade(uid, user, token_address, trade_type, amount, price, entry):
+    """Queue a ledger row for a trade and mark the user for the next flush"""
+    add_history(user, entry)
+    write_behind.record_trade({
+        'user_id': user.db_id,
+        'token_address': token_address,
+        'token_symbol': token_metadata.symbol(token_address),  # None if not resolved yet; /history looks it up
+        'amount': amount,
+        'price': price,
+        'trade_type': trade_type,
+        'timestamp': datetime.utcnow(),
+    })
+    persist_user(uid, user)
+    write_behind.mark_position_dirty(uid, token_address)
+
+async def load_holdings(session, user_id):
+    """A user's open positions as the in-memory holdings dict"""
+    positions = await session.scalars(select(Position).filter_by(user_id=user_id))
+    return {p.token_address: Holding(p.qty, p.avg_price) for p in positions}
+
+def user_state(user, holdings):
+    """In-memory state for a database user and their positions"""
+    return UserState(
+        db_id=user.id,
+        balance=user.balance,
+        realized_pnl=user.realized_pnl,
+        holdings=holdings,
+        history=(user.history or [])[-HISTORY_WINDOW:],
+        context=user.context,
+        referral_id=user.referral_id
+    )
+
+async def load_user(uid):
+    """Load a user's state from the database on a cache miss (None if they never registered)"""
+    async with AsyncSession() as session:
+        user = await session.scalar(select(User).filter_by(telegram_id=uid))
+        if not user:
+            return None
+        holdings = await load_holdings(session, user.id)
+    return user_state(user, holdings)
+
+tracked_tokens = {}  # uid -> tokens that resident user holds a hot price subscription for
+
+def track_user(uid, user):
+    """Keep hot prices and metadata warm for a resident user's holdings (idempotent)"""
+    held = set(user.holdings)
+    subscribed = tracked_tokens.get(uid, set())
+    for token in held - subscribed:
+        hot_prices.subscribe(token)
+    for token in subscribed - held:
+        hot_prices.unsubscribe(token)
+    tracked_tokens[uid] = held
+    token_metadata.request(user.holdings)
+
+def untrack_user(uid, user):
+    for token in tracked_tokens.pop(uid, ()):
+        hot_prices.unsubscribe(token)
+
+def user_pinned(uid):
+    """Users that mustn't be evicted: unwritten changes, or an update in flight holding their state"""
+    return write_behind.is_dirty(uid) or update_processor.busy(uid)
+
+# In-memory user data: a bounded LRU that loads users from the database on a miss
+USERS = UserStateCache(load_user, capacity=USER_CACHE_SIZE, is_dirty=user_pinned,
+                       on_insert=track_user, on_evict=untrack_user, merge=UserState.absorb)
+
+async def load_pnl_scores():
+    """Realized PnL of every user who has closed a trade"""
+    async with AsyncSession() as session:
+        rows = await session.execute(select(User.telegram_id, User.realized_pnl).where(User.realized_pnl != 0))
+        return dict(rows.all())
+
+async def load_equity_inputs():
+    """Every user's cash and open positions, as of the latest write-behind flush"""
+    await write_behind.flush()
+    async with AsyncSession() as session:
+        balances = dict((await session.execute(select(User.telegram_id, User.balance))).all())
+        positions = (await session.execute(
+            select(User.telegram_id, Position.token_address, Position.qty, Position.avg_price)
+            .join(User, User.id == Position.user_id)
+        )).all()
+    return balances, positions
+
+# Realized PnL ranks move with each sell; equity ranks are rebuilt in a periodic batch
+leaderboard = Leaderboard(load_pnl_scores, load_equity_inputs, get_held_token_prices, interval=LEADERBOARD_INTERVAL)
+
+# Event loop lag is sampled continuously; gauges are read when /metrics is scraped
+loop_lag = LoopLagMonitor()
+REGISTRY.gauge('bot_users_resident', 'Users held in the in-memory cache', lambda: len(USERS))
+REGISTRY.gauge('bot_event_loop_lag_last_seconds', 'Most recent event loop lag sample', lambda: loop_lag.lag)
+REGISTRY.gauge('bot_write_behind_dirty_users', 'Users with changes not yet written', lambda: write_behind.stats()['dirty'])
+
+async def check_database():
+    """The pool can hand out a working connection"""
+    async with async_engine.connect() as conn:
+        await conn.scalar(select(1))
+    return True, async_engine.pool.status()
+
+async def check_prices():
+    """Some price provider is usable and fetches haven't been failing for long"""
+    if not market_data.is_available():
+        return False, "every price provider's circuit breaker is open"
+    failing = price_fetches.failing_for()
+    if failing > PRICE_STALE_AFTER:
+        return False, f"price fetches failing for {failing:.0f}s"
+    if price_fetches.last_success is None:
+        return True, "no prices fetched yet"
+    return True, f"last price {time.monotonic() - price_fetches.last_success:.0f}s ago"
+
+async def check_updates():
+    """Updates are being received and queued updates are being processed"""
+    if bot_application is None or not bot_application.running:
+        return False, "application not running"
+    if webhook is None and not bot_application.updater.running:
+        return False, "polling stopped"
+    backlog = update_processor.backlog
+    stalled = update_processor.stalled_for()
+    if stalled > UPDATE_STALL_SECONDS:
+        return False, f"{backlog} updates pending, oldest queued for {stalled:.0f}s"
+    return True, f"{backlog} pending, {update_processor.processed} processed"
+
+async def check_loop_lag():
+    lag = loop_lag.lag
+    return lag <= READY_MAX_LOOP_LAG, f"{lag * 1000:.0f}ms"
+
+async def check_startup():
+    """post_init has connected the database and started the background services"""
+    if services_started is None:
+        return False, f"starting for {time.monotonic() - STARTED_AT:.0f}s"
+    return True, f"started in {services_started - STARTED_AT:.2f}s"
+
+# Checks run in the background; /ready only reads their cached results
+readiness = ReadinessProber({
+    'startup': check_startup,
+    'database': check_database,
+    'prices': check_prices,
+    'updates': check_updates,
+    'event_loop': check_loop_lag,
+}, interval=READY_PROBE_INTERVAL)
+
+def callback_kind(update):
+    """A button press's metrics label: the callback data up to its first ':'"""
+    return (update.callback_query.data or '').split(':', 1)[0]
+
+def message_mode(update):
+    """A text message's metrics label: the conversation mode it arrives in"""
+    user = USERS.peek(update.effective_user.id) if update.effective_user else None
+    ctx = user.context if user is not None else None
+    return ctx.get('mode', 'none') if ctx else 'none'
+
+async def get_user(uid, message):
+    """A user's state, loaded on a miss; unregistered users are told to /start"""
+    user = await USERS.get(uid)
+    if user is None:
+        await message.reply_text("❌ User not found. Please use /start to register.")
+    return user
+
+async def init_database():
+    """Connect and apply migrations, retrying with jittered exponential backoff"""
+    for attempt in range(1, DB_CONNECT_ATTEMPTS + 1):
+        try:
+            logger.info(f"Attempting to connect to database (attempt {attempt}/{DB_CONNECT_ATTEMPTS})...")
+            await migrate(async_engine)
+            logger.info("Database initialized successfully")
+            return
+        except Exception as e:
+            logger.error(f"Failed to initialize database (attempt {attempt}/{DB_CONNECT_ATTEMPTS}): {e}")
+            if attempt == DB_CONNECT_ATTEMPTS:
+                logger.error("Max retries reached. Please check your DATABASE_URL and ensure the database is running.")
+                raise
+            # Jitter keeps retries from landing in lockstep with other clients reconnecting after a DB outage
+            delay = min(DB_CONNECT_MAX_DELAY, DB_CONNECT_BASE_DELAY * 2 ** (attempt - 1))
+            delay = random.uniform(delay / 2, delay)
+            logger.info(f"Retrying in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
+
+async def log_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Log time-to-first-update once per process, to track cold-start regressions"""
+    global first_update_seen
+    if not first_update_seen:
+        first_update_seen = True
+        logger.info(f"⏱ First update handled {time.monotonic() - STARTED_AT:.2f}s after start")
+
+async def start_uptime_services():
+    """Serve /health (and the webhook route) and start pinging uptime services, on the bot's loop"""
+    global uptime_server, uptime_task
+    if UPTIME_MONITORING_ENABLED or webhook is not None:
+        logger.info("Starting uptime HTTP server...")
+        try:
+            uptime_server = await start_uptime_server(webhook)
+        except OSError as e:
+            if webhook is not None:
+                raise  # nothing else would receive updates
+            logger.error(f"Uptime server error: {e}")
+    if UPTIME_MONITORING_ENABLED and UPTIME_URLS:
+        logger.info("Starting uptime monitoring...")
+        uptime_task = asyncio.create_task(uptime_ping_loop())
+
+async def stop_uptime_services():
+    """Cancel the ping loop and close the HTTP server"""
+    global uptime_server, uptime_task
+    if uptime_task is not None:
+        uptime_task.cancel()
+        try:
+            await uptime_task
+        except asyncio.CancelledError:
+            pass
+        uptime_task = None
+    if uptime_server is not None:
+        await uptime_server.cleanup()
+        uptime_server = None
+
+async def post_init(application: Application):
+    """Open long-lived resources once the bot's event loop is running"""
+    global bot_application, services_started
+    bot_application = application
+    # /health answers while the database is still connecting; /ready reports not ready until we're done
+    await start_uptime_services()
+    loop_lag.start()
+    readiness.start()
+    db_started = time.monotonic()
+    await init_database()
+    db_seconds = time.monotonic() - db_started
+    try:
+        await leaderboard.seed()
+    except Exception as e:
+        logger.error(f"Error seeding leaderboard: {e}")
+    await market_data.start()
+    write_behind.start()
+    tick_store.start(TICK_FLUSH_INTERVAL)
+    with request_priority(VALUATION):
+        hot_prices.start()
+    try:
+        await token_metadata.warm()
+    except Exception as e:
+        logger.error(f"Error warming token metadata cache: {e}")
+    with request_priority(BACKGROUND):
+        token_metadata.start()
+        market_snapshot.start()
+        token_index.start()
+        leaderboard.start()
+    services_started = time.monotonic()
+    logger.info(f"⏱ Startup took {services_started - STARTED_AT:.2f}s (database {db_seconds:.2f}s)")
+
+async def post_shutdown(application: Application):
+    """Release long-lived resources on shutdown"""
+    await stop_uptime_services()
+    await readiness.stop()
+    await loop_lag.stop()
+    await hot_prices.stop()
+    await token_metadata.stop()
+    await market_snapshot.stop()
+    await token_index.stop()
+    await leaderboard.stop()
+    await tick_store.stop()
+    await write_behind.stop()
+    await market_data.close()
+    await async_engine.dispose()
+
+async def register_user(session, tg_user, referral_id):
+    """Create a new user row, paying the referral bonus to both sides"""
+    referrer = await USERS.get(referral_id) if referral_id else None
+    user = User(
+        telegram_id=tg_user.id,
+        username=tg_user.username,
+        balance=INITIAL_BALANCE,
+        holdings={},
+        realized_pnl=0.0,
+        history=[],
+        context={},
+        referral_id=referral_id
+    )
+    
+    # If referred, add bonus to both users
+    if referrer:
+        user.balance += REFERRAL_BONUS
+        user.history = [f"🎁 Referral bonus: +${REFERRAL_BONUS}"]
+    
+    session.add(user)
+    if referrer:
+        # Committed with the new row, so the counter never drifts from the referrals that exist
+        await session.execute(
+            sql_update(User)
+            .where(User.telegram_id == referral_id)
+            .values(referral_count=User.referral_count + 1)
+        )
+    with DB_COMMIT_SECONDS.time('register'):
+        await session.commit()
+    if referrer:
+        # The referrer is credited in memory, which is ahead of their row; the flusher writes it.
+        # Re-read after the commit: the copy fetched above may have been evicted while we waited.
+        referrer = await USERS.get(referral_id) or referrer
+        referrer.balance += REFERRAL_BONUS
+        add_history(referrer, f"🎁 Referral bonus: +${REFERRAL_BONUS}")
+        persist_user(referral_id, referrer)
+    return user
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /start command"""
     try:
         uid = update.effective_user.id
-        session = Session()
-        user = session.query(User).filter_by(telegram_id=uid).first()
         
         # Check for referral
         referral_id = None
@@ -157,45 +670,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             except:
                 referral_id = None
         
-        if not user:
-            user = User(
-                telegram_id=uid,
-                username=update.effective_user.username,
-                balance=INITIAL_BALANCE,
-                holdings={},
-                realized_pnl=0.0,
-                history=[],
-                context={},
-                referral_id=referral_id
-            )
-            session.add(user)
-            session.commit()
-            
-            # If referred, add bonus to both users
-            if referral_id:
-                referrer = session.query(User).filter_by(telegram_id=referral_id).first()
-                if referrer:
-                    # Add bonus to referrer
-                    referrer.balance += REFERRAL_BONUS
-                    referrer.history = referrer.history or []
-                    referrer.history.append(f"🎁 Referral bonus: +${REFERRAL_BONUS}")
-                    
-                    # Add bonus to new user
-                    user.balance += REFERRAL_BONUS
-                    user.history = user.history or []
-                    user.history.append(f"🎁 Referral bonus: +${REFERRAL_BONUS}")
-                    
-                    session.commit()
-        
-        # Initialize in-memory user data
-        USERS[uid] = {
-            'balance': user.balance,
-            'holdings': user.holdings or {},
-            'realized_pnl': user.realized_pnl,
-            'history': user.history or [],
-            'context': user.context or {},
-            'referral_id': user.referral_id
-        }
+        # Known users are loaded into memory (which is ahead of the database under write-behind)
+        if await USERS.get(uid) is None:
+            async with AsyncSession() as session:
+                user = await register_user(session, update.effective_user, referral_id)
+            USERS.put(uid, user_state(user, {}))
 
         # Generate referral link
         bot_username = (await context.bot.get_me()).username
@@ -231,7 +710,10 @@ async def handle_buy_start(query, context):
     """Handle buy menu selection"""
     try:
         uid = query.from_user.id
-        USERS[uid]['context'] = {'mode': 'buy'}
+        user = await get_user(uid, query.message)
+        if not user:
+            return
+        user.context = {'mode': 'buy'}
         await query.message.reply_text("🔍 Enter the Solana token contract address to buy:")
     except Exception as e:
         logger.error(f"Error in buy start: {e}")
@@ -241,12 +723,14 @@ async def handle_sell_start(query, context):
     """Handle sell menu selection"""
     try:
         uid = query.from_user.id
-        user = USERS.get(uid)
-        tokens = list(user['holdings'].keys())
+        user = await get_user(uid, query.message)
+        if not user:
+            return
+        tokens = list(user.holdings.keys())
         if not tokens:
             await query.message.reply_text("📭 No tokens to sell.")
             return
-        keyboard = [[InlineKeyboardButton(token, callback_data=f"sell_token:{token}")] for token in tokens]
+        keyboard = [[InlineKeyboardButton(token_metadata.label(token), callback_data=f"sell_token:{token}")] for token in tokens]
         await query.message.reply_text("📉 Choose token to sell:", reply_markup=InlineKeyboardMarkup(keyboard))
     except Exception as e:
         logger.error(f"Error in sell start: {e}")
@@ -257,7 +741,10 @@ async def handle_token_selected_for_sell(query, context):
     try:
         uid = query.from_user.id
         token = query.data.split(":")[1]
-        USERS[uid]['context'] = {'mode': 'sell', 'token': token}
+        user = await get_user(uid, query.message)
+        if not user:
+            return
+        user.context = {'mode': 'sell', 'token': token}
         await query.message.reply_text("💸 Enter the % of token to sell:")
     except Exception as e:
         logger.error(f"Error in token selection: {e}")
@@ -267,109 +754,139 @@ async def handle_buy_token(update, context, ca, usd_amount):
     """Handle token purchase"""
     try:
         uid = update.effective_user.id
-        user = USERS[uid]
+        user = await get_user(uid, update.message)
+        if not user:
+            return
+        token_metadata.request([ca])  # resolved in the background while we price the trade
         
-        price = await get_token_price(ca)
+        if not market_data.is_available():
+            await update.message.reply_text("⚠️ Market data is temporarily unavailable. Please try again shortly.")
+            return
+
+        with request_priority(TRADE):
+            price = await get_token_price(ca)
         if not price:
             await update.message.reply_text("❌ Token price fetch failed.")
             return
 
         qty = usd_amount / price
-        if usd_amount > user['balance']:
-            await update.message.reply_text(f"❌ Insufficient balance. You have ${user['balance']:.2f}")
+        if usd_amount > user.balance:
+            await update.message.reply_text(f"❌ Insufficient balance. You have ${user.balance:.2f}")
             return
 
-        user['balance'] -= usd_amount
+        user.balance -= usd_amount
 
-        holding = user['holdings'].get(ca)
+        holding = user.holdings.get(ca)
         if holding:
-            total_cost = holding['qty'] * holding['avg_price'] + usd_amount
-            new_qty = holding['qty'] + qty
-            holding['avg_price'] = total_cost / new_qty
-            holding['qty'] = new_qty
+            total_cost = holding.qty * holding.avg_price + usd_amount
+            new_qty = holding.qty + qty
+            holding.avg_price = total_cost / new_qty
+            holding.qty = new_qty
         else:
-            user['holdings'][ca] = {'qty': qty, 'avg_price': price}
+            user.set_holding(ca, qty, price)
 
-        user['history'].append(f"🟢 Bought {qty:.4f} of {ca} at ${price:.4f}")
-        
-        # Update database
-        session = Session()
-        db_user = session.query(User).filter_by(telegram_id=uid).first()
-        db_user.balance = user['balance']
-        db_user.holdings = user['holdings']
-        db_user.history = user['history']
-        session.commit()
+        record_trade(uid, user, ca, 'buy', qty, price, f"🟢 Bought {qty:.4f} of {ca} at ${price:.4f}")
 
         await update.message.reply_text(
             f"✅ Bought {qty:.4f} of {ca} at ${price:.4f}\n"
-            f"💵 Remaining Balance: ${user['balance']:.2f}"
+            f"💵 Remaining Balance: ${user.balance:.2f}"
         )
     except Exception as e:
         logger.error(f"Error in buy token: {e}")
         await update.message.reply_text("❌ An error occurred during the trade. Please try again.")
-        session.rollback()
 
 async def handle_sell_token(update, context, token, percent):
     """Handle token sale"""
     try:
         uid = update.effective_user.id
-        user = USERS[uid]
+        user = await get_user(uid, update.message)
+        if not user:
+            return
         
-        holding = user['holdings'].get(token)
+        holding = user.holdings.get(token)
         if not holding:
             await update.message.reply_text("❌ You don't own this token.")
             return
 
-        price = await get_token_price(token)
+        if not market_data.is_available():
+            await update.message.reply_text("⚠️ Market data is temporarily unavailable. Please try again shortly.")
+            return
+
+        with request_priority(TRADE):
+            price = await get_held_token_price(token)
         if not price:
             await update.message.reply_text("❌ Token price fetch failed.")
             return
 
-        qty_to_sell = holding['qty'] * (percent / 100)
-        if qty_to_sell <= 0 or qty_to_sell > holding['qty']:
+        qty_to_sell = holding.qty * (percent / 100)
+        if qty_to_sell <= 0 or qty_to_sell > holding.qty:
             await update.message.reply_text("❗ Invalid sell percentage.")
             return
 
         usd_value = qty_to_sell * price
-        pnl = (price - holding['avg_price']) * qty_to_sell
-        user['balance'] += usd_value
-        user['realized_pnl'] += pnl
-        holding['qty'] -= qty_to_sell
+        pnl = (price - holding.avg_price) * qty_to_sell
+        user.balance += usd_value
+        user.realized_pnl += pnl
+        leaderboard.update_pnl(uid, user.realized_pnl)
+        holding.qty -= qty_to_sell
 
-        if holding['qty'] <= 0.00001:
-            del user['holdings'][token]
+        if holding.qty <= 0.00001:
+            del user.holdings[token]
         
-        user['history'].append(f"🔴 Sold {qty_to_sell:.4f} of {token} at ${price:.4f} | PnL: ${pnl:.2f}")
-        
-        # Update database
-        session = Session()
-        db_user = session.query(User).filter_by(telegram_id=uid).first()
-        db_user.balance = user['balance']
-        db_user.holdings = user['holdings']
-        db_user.realized_pnl = user['realized_pnl']
-        db_user.history = user['history']
-        session.commit()
+        record_trade(uid, user, token, 'sell', qty_to_sell, price,
+                     f"🔴 Sold {qty_to_sell:.4f} of {token} at ${price:.4f} | PnL: ${pnl:.2f}")
 
         await update.message.reply_text(
             f"✅ Sold {qty_to_sell:.4f} of {token} at ${price:.4f}\n"
             f"💵 PnL: ${pnl:.2f}\n"
-            f"💰 New Balance: ${user['balance']:.2f}"
+            f"💰 New Balance: ${user.balance:.2f}"
         )
     except Exception as e:
         logger.error(f"Error in sell token: {e}")
         await update.message.reply_text("❌ An error occurred during the trade. Please try again.")
-        session.rollback()
 
 async def show_balance(query, context):
     """Show user's balance"""
     try:
         uid = query.from_user.id
-        user = USERS[uid]
+        user = await get_user(uid, query.message)
+        if not user:
+            return
         
-        msg = (
-            f"💵 Cash: ${user['balance']:.2f}\n"
-            f"📦 Holdings Value: Click to Check token PnL"
-        )
+        stale = {}
+
+        async def prices_with_fallback(addresses):
+            prices = await get_held_token_prices(addresses)
+            for address in addresses:
+                if address not in prices:
+                    known = last_known_price(address)
+                    if known:
+                        prices[address], stale[address] = known
+            return prices
+
+        with request_priority(VALUATION):
+            valuation = await value_portfolio(user, prices_with_fallback)
+        lines = [
+            f"💵 Cash: ${valuation['cash']:.2f}",
+            f"📦 Holdings Value: ${valuation['holdings_value']:.2f}",
+            f"💼 Total Equity: ${valuation['total_equity']:.2f}",
+            f"📈 Unrealized PnL: ${valuation['unrealized_pnl']:.2f}",
+        ]
+        if valuation['positions']:
+            lines.append("")
+            for position in valuation['positions']:
+                line = (
+                    f"• {token_metadata.label(position['token'])}: ${position['value']:.2f} "
+                    f"(PnL ${position['unrealized_pnl']:.2f})"
+                )
+                if position['token'] in stale:
+                    line += f" ⏳ {format_age(stale[position['token']])} old"
+                lines.append(line)
+        if stale:
+            lines.append("\n⚠️ Market data is unavailable; ⏳ marks last known prices.")
+        if valuation['unpriced']:
+            lines.append(f"\n⚠️ Couldn't price {len(valuation['unpriced'])} token(s)")
+        msg = "\n".join(lines)
         keyboard = [[InlineKeyboardButton("📈 View Token PnL", callback_data="menu_pnl")]]
         await query.message.reply_text(msg, reply_markup=InlineKeyboardMarkup(keyboard))
     except Exception as e:
@@ -380,12 +897,14 @@ async def show_pnl_tokens(query, context):
     """Show list of tokens for PnL check"""
     try:
         uid = query.from_user.id
-        user = USERS[uid]
-        tokens = list(user['holdings'].keys())
+        user = await get_user(uid, query.message)
+        if not user:
+            return
+        tokens = list(user.holdings.keys())
         if not tokens:
             await query.message.reply_text("📭 No active positions.")
             return
-        keyboard = [[InlineKeyboardButton(token, callback_data=f"pnl:{token}")] for token in tokens]
+        keyboard = [[InlineKeyboardButton(token_metadata.label(token), callback_data=f"pnl:{token}")] for token in tokens]
         await query.message.reply_text("📈 Click on a token to view PnL:", reply_markup=InlineKeyboardMarkup(keyboard))
     except Exception as e:
         logger.error(f"Error in show PnL tokens: {e}")
@@ -396,27 +915,37 @@ async def show_token_pnl(query, context):
     try:
         uid = query.from_user.id
         token = query.data.split(":")[1]
-        user = USERS[uid]
-        holding = user['holdings'].get(token)
+        user = await get_user(uid, query.message)
+        if not user:
+            return
+        holding = user.holdings.get(token)
         if not holding:
             await query.message.reply_text("❌ No holdings found for this token.")
             return
 
-        price = await get_token_price(token)
+        with request_priority(VALUATION):
+            price = await get_held_token_price(token)
+        stale_age = None
         if not price:
-            await query.message.reply_text("❌ Couldn't fetch price.")
-            return
+            known = last_known_price(token)
+            if not known:
+                await query.message.reply_text("❌ Couldn't fetch price.")
+                return
+            price, stale_age = known
 
-        qty = holding['qty']
-        avg = holding['avg_price']
+        qty = holding.qty
+        avg = holding.avg_price
         pnl = (price - avg) * qty
+        symbol = token_metadata.symbol(token)
         msg = (
-            f"📊 Token: {token}\n"
+            f"📊 Token: {f'{symbol} ({token})' if symbol else token}\n"
             f"• Qty: {qty:.4f}\n"
             f"• Avg Price: ${avg:.4f}\n"
             f"• Current Price: ${price:.4f}\n"
             f"• PnL: ${pnl:.2f}"
         )
+        if stale_age is not None:
+            msg += f"\n\n⚠️ Market data is unavailable. Showing the last known price from {format_age(stale_age)} ago."
         await query.message.reply_text(msg)
     except Exception as e:
         logger.error(f"Error in show token PnL: {e}")
@@ -454,21 +983,18 @@ async def show_referral_info(query, context):
     try:
         uid = query.from_user.id
         
-        # Get user from database if not in memory
-        session = Session()
-        db_user = session.query(User).filter_by(telegram_id=uid).first()
-        
-        if not db_user:
-            await query.message.reply_text("❌ User not found. Please use /start to register.")
+        if not await get_user(uid, query.message):
             return
         
+        async with AsyncSession() as session:
+            referral_count = await session.scalar(
+                select(User.referral_count).filter_by(telegram_id=uid)
+            )
+        
         # Generate referral link
         bot_username = (await context.bot.get_me()).username
         referral_link = f"https://t.me/{bot_username}?start=ref_{uid}"
         
-        # Count referrals
-        referral_count = session.query(User).filter_by(referral_id=uid).count()
-        
         msg = (
             "🎁 Referral Program\n\n"
             f"• Get ${REFERRAL_BONUS} for each friend you invite\n"
@@ -479,13 +1005,39 @@ async def show_referral_info(query, context):
             "💡 Copy and share this link with your friends!"
         )
         
-        await query.message.reply_text(msg, parse_mode='Markdown')
+        keyboard = [[InlineKeyboardButton("🏆 Top Referrers", callback_data="referral_leaderboard")]]
+        await query.message.reply_text(msg, parse_mode='Markdown', reply_markup=InlineKeyboardMarkup(keyboard))
     except Exception as e:
         logger.error(f"Error in show referral info: {e}")
         import traceback
         logger.error(f"Traceback: {traceback.format_exc()}")
         await query.message.reply_text("❌ An error occurred. Please try again.")
 
+async def show_referral_leaderboard(query, context):
+    """Show the users with the most referrals"""
+    try:
+        async with AsyncSession() as session:
+            # Walks ix_users_referral_count from the top, so cost doesn't grow with the user count
+            rows = (await session.execute(
+                select(User.telegram_id, User.username, User.referral_count)
+                .where(User.referral_count > 0)
+                .order_by(User.referral_count.desc())
+                .limit(REFERRAL_LEADERBOARD_SIZE)
+            )).all()
+
+        if not rows:
+            await query.message.reply_text("🏆 No referrals yet. Be the first to invite a friend!")
+            return
+
+        msg = "🏆 Top Referrers\n\n"
+        for rank, (telegram_id, username, count) in enumerate(rows, 1):
+            name = f"@{username}" if username else f"User {telegram_id}"
+            msg += f"{rank}. {name} — {count} referrals\n"
+        await query.message.reply_text(msg)
+    except Exception as e:
+        logger.error(f"Error in referral leaderboard: {e}")
+        await query.message.reply_text("❌ An error occurred. Please try again.")
+
 async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Broadcast message to all users (admin only)"""
     try:
@@ -502,8 +1054,11 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Remove the "/broadcast " part to get just the message content
         message = message.replace('/broadcast ', '', 1)
         
-        session = Session()
-        users = session.query(User).all()
+        # Read the recipients up front rather than holding a pooled connection for the whole send loop
+        async with AsyncSession() as session:
+            users = (await session.execute(
+                select(User.telegram_id, User.last_broadcast_message_id)
+            )).all()
         
         if not users:
             await update.message.reply_text("❌ No users found in the database.")
@@ -511,6 +1066,7 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         sent = 0
         failed = 0
+        message_ids = []
         
         # Check if message contains 'bros' placeholder
         has_name_placeholder = 'bros' in message
@@ -554,20 +1110,30 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
                             chat_id=user.telegram_id,
                             text=user_message
                         )
-                        user.last_broadcast_message_id = new_message.message_id
+                        message_ids.append({'uid': user.telegram_id, 'message_id': new_message.message_id})
                         sent += 1
                 else:
                     new_message = await context.bot.send_message(
                         chat_id=user.telegram_id,
                         text=user_message
                     )
-                    user.last_broadcast_message_id = new_message.message_id
+                    message_ids.append({'uid': user.telegram_id, 'message_id': new_message.message_id})
                     sent += 1
             except Exception as e:
                 failed += 1
                 logger.error(f"Failed to send broadcast to user {user.telegram_id}: {e}")
         
-        session.commit()
+        if message_ids:
+            async with AsyncSession() as session:
+                connection = await session.connection()
+                await connection.execute(
+                    sql_update(User)
+                    .where(User.telegram_id == bindparam('uid'))
+                    .values(last_broadcast_message_id=bindparam('message_id')),
+                    message_ids
+                )
+                with DB_COMMIT_SECONDS.time('broadcast'):
+                    await session.commit()
         status_message = f"✅ Message sent to {sent} users."
         if failed > 0:
             status_message += f"\n❌ Failed to send to {failed} users."
@@ -576,18 +1142,282 @@ async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error(f"Error in broadcast: {e}")
         await update.message.reply_text("❌ An error occurred during broadcast.")
 
+async def show_top_movers(update: Update, context: ContextTypes.DEFAULT_TYPE, name, title):
+    """Show a top gainers/losers snapshot"""
+    try:
+        with request_priority(BACKGROUND):
+            tokens, age = await market_snapshot.get(name)
+        if not tokens:
+            await update.message.reply_text("❌ Market data is unavailable right now. Please try again.")
+            return
+
+        lines = [title, ""]
+        for i, token in enumerate(tokens, 1):
+            symbol = token.get('symbol') or token.get('address', '?')[:6]
+            price = token.get('price')
+            change = token.get('v24hChangePercent')
+            line = f"{i}. {symbol}"
+            if price is not None:
+                line += f" ${price:.6g}"
+            if change is not None:
+                line += f" ({change:+.1f}%)"
+            lines.append(line)
+            if token.get('address'):
+                lines.append(f"   {token['address']}")
+        lines.append(f"\n🕒 Updated {age:.0f}s ago")
+        await update.message.reply_text("\n".join(lines))
+    except Exception as e:
+        logger.error(f"Error in top movers ({name}): {e}")
+        await update.message.reply_text("❌ An error occurred. Please try again.")
+
+async def top_gainers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the /gainers command"""
+    await show_top_movers(update, context, 'gainers', "🚀 Top Gainers (24h)")
+
+async def top_losers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the /losers command"""
+    await show_top_movers(update, context, 'losers', "📉 Top Losers (24h)")
+
+async def search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the /search command"""
+    try:
+        if not context.args:
+            await update.message.reply_text("📝 Usage: /search <symbol or name>")
+            return
+
+        query = " ".join(context.args)
+        with request_priority(BACKGROUND):
+            tokens = await token_index.search(query, SEARCH_RESULTS_LIMIT)
+        if not tokens:
+            await update.message.reply_text(f"🔍 No tokens found for \"{query}\".")
+            return
+
+        lines = [f"🔍 Results for \"{query}\":", ""]
+        keyboard = []
+        for token in tokens:
+            symbol = token.get('symbol') or '?'
+            name = token.get('name') or ''
+            lines.append(f"• {symbol} {name}".rstrip())
+            lines.append(f"   {token['address']}")
+            keyboard.append([InlineKeyboardButton(f"🟢 Buy {symbol}", callback_data=f"ca_buy:{token['address']}")])
+        await update.message.reply_text("\n".join(lines), reply_markup=InlineKeyboardMarkup(keyboard))
+    except Exception as e:
+        logger.error(f"Error in search: {e}")
+        await update.message.reply_text("❌ An error occurred. Please try again.")
+
+async def show_history_page(message, uid, before=None):
+    """Send one page of a user's trades, newest first, with a button for older ones"""
+    user = await get_user(uid, message)
+    if not user:
+        return
+
+    if not before and len(write_behind.queued_trades(user.db_id)) >= HISTORY_PAGE_SIZE:
+        await write_behind.flush()  # rare: more unwritten trades than a page, so give them ids to page by
+
+    # Keyset pagination on (timestamp, id): each page is an index range scan, however deep
+    stmt = select(Trade).filter_by(user_id=user.db_id)
+    if before:
+        stmt = stmt.where(tuple_(Trade.timestamp, Trade.id) < before)
+    async with write_behind.holding_flushes():
+        # Trades from the last flush interval are still in memory; they're newer than any written one
+        queued = [] if before else [Trade(**row) for row in write_behind.queued_trades(user.db_id)]
+        stmt = stmt.order_by(Trade.timestamp.desc(), Trade.id.desc()).limit(HISTORY_PAGE_SIZE + 1 - len(queued))
+        async with AsyncSession() as session:
+            trades = queued + (await session.scalars(stmt)).all()
+
+    if not trades:
+        await message.reply_text("📭 No trades yet." if not before else "📭 No older trades.")
+        return
+
+    page = trades[:HISTORY_PAGE_SIZE]
+    lines = ["📜 Trade History", ""]
+    for trade in page:
+        symbol = token_metadata.symbol(trade.token_address) or trade.token_symbol
+        symbol = symbol or token_metadata.label(trade.token_address)
+        action = "🟢 Bought" if trade.trade_type == 'buy' else "🔴 Sold"
+        lines.append(
+            f"{trade.timestamp:%Y-%m-%d %H:%M} {action} {trade.amount:.4f} {symbol} "
+            f"at ${trade.price:.6f} (${trade.amount * trade.price:.2f})"
+        )
+
+    keyboard = None
+    if len(trades) > HISTORY_PAGE_SIZE:
+        last = page[-1]
+        keyboard = InlineKeyboardMarkup([[InlineKeyboardButton(
+            "⬅️ Older", callback_data=f"history:{last.timestamp.isoformat()}:{last.id}"
+        )]])
+    await message.reply_text("\n".join(lines), reply_markup=keyboard)
+
+async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the /history command"""
+    try:
+        await show_history_page(update.message, update.effective_user.id)
+    except Exception as e:
+        logger.error(f"Error in history: {e}")
+        await update.message.reply_text("❌ An error occurred. Please try again.")
+
+async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the /leaderboard command"""
+    try:
+        uid = update.effective_user.id
+        top_pnl = leaderboard.pnl.top(LEADERBOARD_SIZE)
+        top_equity = leaderboard.equity.top(LEADERBOARD_SIZE)
+        uids = {user_id for user_id, _ in top_pnl + top_equity}
+        names = {}
+        if uids:
+            async with AsyncSession() as session:
+                rows = await session.execute(
+                    select(User.telegram_id, User.username).where(User.telegram_id.in_(uids))
+                )
+                names = {telegram_id: '@' + username if username else f"User {telegram_id}"
+                         for telegram_id, username in rows}
+
+        lines = ["🏆 Leaderboard", "", "💵 Realized PnL"]
+        for rank, (user_id, pnl) in enumerate(top_pnl, 1):
+            lines.append(f"{rank}. {names.get(user_id, f'User {user_id}')}: ${pnl:,.2f}")
+        if not top_pnl:
+            lines.append("No closed trades yet.")
+
+        age = leaderboard.equity_age()
+        lines += ["", f"💰 Total equity ({format_age(age)} ago)" if age is not None else "💰 Total equity"]
+        for rank, (user_id, equity) in enumerate(top_equity, 1):
+            lines.append(f"{rank}. {names.get(user_id, f'User {user_id}')}: ${equity:,.2f}")
+        if not top_equity:
+            lines.append("Rankings are still being calculated.")
+
+        pnl_rank = leaderboard.pnl.rank(uid)
+        equity_rank = leaderboard.equity.rank(uid)
+        lines += [
+            "",
+            f"📍 Your PnL rank: {f'#{pnl_rank} of {len(leaderboard.pnl)}' if pnl_rank else 'unranked'}",
+            f"📍 Your equity rank: {f'#{equity_rank} of {len(leaderboard.equity)}' if equity_rank else 'unranked'}",
+        ]
+        await update.message.reply_text("\n".join(lines))
+    except Exception as e:
+        logger.error(f"Error in leaderboard: {e}")
+        await update.message.reply_text("❌ An error occurred. Please try again.")
+
+async def show_holders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show who holds a token (admin only)"""
+    try:
+        if update.effective_user.id != ADMIN_ID:
+            await update.message.reply_text("🚫 You are not authorized to use this command.")
+            return
+
+        if not context.args or not is_solana_address(context.args[0]):
+            await update.message.reply_text("📝 Usage: /holders <token contract address>")
+            return
+
+        ca = context.args[0]
+        await write_behind.flush()
+        # Served by the positions token_address index
+        async with AsyncSession() as session:
+            holders, total_qty = (await session.execute(
+                select(func.count(), func.coalesce(func.sum(Position.qty), 0.0))
+                .where(Position.token_address == ca)
+            )).one()
+            top = (await session.execute(
+                select(User.telegram_id, User.username, Position.qty)
+                .join(User, User.id == Position.user_id)
+                .where(Position.token_address == ca)
+                .order_by(Position.qty.desc())
+                .limit(TOP_MOVERS_LIMIT)
+            )).all()
+
+        lines = [f"👥 Holders of {token_metadata.label(ca)}", "", f"• Holders: {holders}", f"• Total qty: {total_qty:.4f}"]
+        if top:
+            lines.append("")
+        for telegram_id, username, qty in top:
+            lines.append(f"• {'@' + username if username else telegram_id}: {qty:.4f}")
+        await update.message.reply_text("\n".join(lines))
+    except Exception as e:
+        logger.error(f"Error in holders: {e}")
+        await update.message.reply_text("❌ An error occurred. Please try again.")
+
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show internal counters (admin only)"""
+    try:
+        if update.effective_user.id != ADMIN_ID:
+            await update.message.reply_text("🚫 You are not authorized to use this command.")
+            return
+
+        cache = price_cache.stats()
+        providers = market_data.stats()
+        persist = write_behind.stats()
+        users = USERS.stats()
+        updates = update_processor.stats()
+        hooks = webhook.stats() if webhook is not None else None
+        lines = [
+            "📊 Bot Stats\n",
+            f"👥 Users in memory: {users['size']}/{users['capacity']}",
+            f"• Hits: {users['hits']} | Loads: {users['misses']} | Evictions: {users['evictions']} | "
+            f"Hit ratio: {users['hit_ratio']:.1%}\n",
+            "💾 Write-behind",
+            f"• Dirty users: {persist['dirty']} | Flushes: {persist['flushes']} | Rows: {persist['rows_written']}",
+            f"• Trades pending: {persist['pending_trades']} | Written: {persist['trades_written']}",
+            f"• Positions pending: {persist['dirty_positions']} | Written: {persist['positions_written']}",
+            f"• Failures: {persist['failures']} | Last flush: {persist['last_flush_seconds'] * 1000:.0f}ms\n",
+            "💲 Price cache",
+            f"• TTL: {price_cache.ttl:g}s, size: {cache['size']}/{price_cache.max_size}",
+            f"• Hits: {cache['hits']} | Misses: {cache['misses']} | Coalesced: {cache['coalesced']}",
+            f"• Evictions: {cache['evictions']} | Hit ratio: {cache['hit_ratio']:.1%}\n",
+            "⚙️ Update processing",
+            f"• Running: {updates['running']}/{updates['max_concurrent']} (peak {updates['peak_running']}) | "
+            f"Processed: {updates['processed']} | Pending: {updates['backlog']} ({updates['queued']} not started)",
+            f"• Waited behind own update: {updates['serialized']} | Active user locks: {updates['user_locks']}",
+            f"• Webhook: {hooks['received']} received | {hooks['rejected']} rejected | {hooks['malformed']} malformed\n"
+            if hooks else "• Mode: polling\n",
+            "🏆 Leaderboard",
+            f"• PnL ranked: {len(leaderboard.pnl)} | Equity ranked: {len(leaderboard.equity)}",
+            f"• Tokens priced per batch: {leaderboard.tokens_priced} | "
+            f"Last batch: {leaderboard.last_batch_seconds * 1000:.0f}ms\n",
+            "🔥 Hot prices",
+            f"• Held tokens tracked: {len(hot_prices)} (refresh every {hot_prices.interval:g}s)\n",
+            "📸 Market snapshots",
+        ]
+        for name in market_snapshot.feeds:
+            age = market_snapshot.age(name)
+            lines.append(f"• {name}: {age:.0f}s old" if age is not None else f"• {name}: not loaded")
+        lines += [
+            "",
+            "🔍 Search index",
+            f"• Tokens: {len(token_index)} | Local hits: {token_index.local_hits} | "
+            f"Remote fallbacks: {token_index.remote_fallbacks}\n",
+            "🏷 Token metadata",
+            f"• Cached: {len(token_metadata)} | Pending: {token_metadata.pending} | "
+            f"Failed fills: {token_metadata.failed_fills}\n",
+            "🛰 Market data",
+        ]
+        for name, p95 in providers['p95'].items():
+            lines.append(f"• {name} p95: {p95 * 1000:.0f}ms" if p95 is not None else f"• {name} p95: n/a")
+        for name, breaker in providers['breakers'].items():
+            lines.append(f"• {name} breaker: {breaker['state']} (opened {breaker['times_opened']}x)")
+        lines.append(f"• Hedges fired: {providers['hedges_fired']} | Failovers: {providers['failovers']}\n")
+        limiter = birdeye_limiter.stats()
+        lines.append(f"🚦 Birdeye rate limiter ({birdeye_limiter.rate:g}/s, {limiter['backoffs']} backoffs)")
+        for name, cls in limiter['classes'].items():
+            lines.append(
+                f"• {name}: queued {cls['queued']} | granted {cls['granted']} | "
+                f"avg wait {cls['avg_wait'] * 1000:.0f}ms | max {cls['max_wait'] * 1000:.0f}ms"
+            )
+        msg = "\n".join(lines)
+        await update.message.reply_text(msg)
+    except Exception as e:
+        logger.error(f"Error in stats: {e}")
+        await update.message.reply_text("❌ An error occurred. Please try again.")
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming messages"""
     try:
         uid = update.effective_user.id
         text = update.message.text.strip()
-        user = USERS.get(uid)
+        user = await USERS.get(uid)
         
         if not user:
             await start(update, context)
             return
 
-        ctx = user['context']
+        ctx = user.context or {}
         if 'mode' in ctx:
             if ctx['mode'] == 'buy':
                 if is_solana_address(text):
@@ -600,7 +1430,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                             await update.message.reply_text("❌ Please enter a positive amount.")
                             return
                         await handle_buy_token(update, context, ctx['ca'], usd)
-                        user['context'] = {}
+                        user.context = None
                     except ValueError:
                         await update.message.reply_text("❌ Please enter a valid number.")
                     except Exception as e:
@@ -611,7 +1441,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 try:
                     percent = float(text)
                     await handle_sell_token(update, context, ctx['token'], percent)
-                    user['context'] = {}
+                    user.context = None
                 except ValueError:
                     await update.message.reply_text("❌ Please enter a valid percentage.")
                 except Exception as e:
@@ -652,12 +1482,20 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await show_token_pnl(query, context)
         elif data.startswith("ca_buy:"):
             ca = data.split(":")[1]
-            USERS[query.from_user.id]['context'] = {'mode': 'buy', 'ca': ca}
-            await query.message.reply_text("💵 How much USD to invest?")
+            user = await get_user(query.from_user.id, query.message)
+            if user:
+                user.context = {'mode': 'buy', 'ca': ca}
+                await query.message.reply_text("💵 How much USD to invest?")
         elif data.startswith("ca_sell:"):
             token = data.split(":")[1]
-            USERS[query.from_user.id]['context'] = {'mode': 'sell', 'token': token}
-            await query.message.reply_text("💸 Enter the % of token to sell:")
+            user = await get_user(query.from_user.id, query.message)
+            if user:
+                user.context = {'mode': 'sell', 'token': token}
+                await query.message.reply_text("💸 Enter the % of token to sell:")
+        elif data.startswith("history:"):
+            timestamp, trade_id = data.split(":", 1)[1].rsplit(":", 1)
+            await show_history_page(query.message, query.from_user.id,
+                                    (datetime.fromisoformat(timestamp), int(trade_id)))
         elif data == "menu_copy_trade":
             await handle_coming_soon(query, context, "Copy Trade")
         elif data == "menu_check_wallet_pnl":
@@ -666,74 +1504,79 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await show_promotions(query.message)
         elif data == "menu_referral":
             await show_referral_info(query, context)
+        elif data == "referral_leaderboard":
+            await show_referral_leaderboard(query, context)
     except Exception as e:
         logger.error(f"Error in button handler: {e}")
         await update.callback_query.message.reply_text("❌ An error occurred. Please try again.")
 
+# Updates from different users are handled concurrently; each user's run in order
+update_processor = PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES)
+webhook = None
+
+async def run_webhook(application: Application):
+    """Run the bot on updates Telegram POSTs to the uptime server, until SIGINT/SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with application:  # initialize / shutdown
+        try:
+            # post_init serves the webhook route along with /health; updates POSTed
+            # before start() wait in the update queue
+            await application.post_init(application)
+            await application.start()
+            await webhook.register(WEBHOOK_URL, drop_pending_updates=True)
+            logger.info("Bot is receiving updates by webhook")
+            await stop.wait()
+        finally:
+            logger.info("Stopping webhook mode...")
+            if application.running:
+                await application.stop()
+            await application.post_shutdown(application)
+
 def main():
     """Start the bot"""
     # Create application
-    application = Application.builder().token(os.getenv('BOT_TOKEN')).build()
+    application = (
+        Application.builder()
+        .token(os.getenv('BOT_TOKEN'))
+        .concurrent_updates(update_processor)
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .get_updates_request(InstrumentedRequest())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Add handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("broadcast", broadcast))
-    application.add_handler(CallbackQueryHandler(button_handler))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(TypeHandler(Update, log_first_update), group=-1)
+    application.add_handler(CommandHandler("start", instrument_handler(start, "start")))
+    application.add_handler(CommandHandler("broadcast", instrument_handler(broadcast, "broadcast")))
+    application.add_handler(CommandHandler("stats", instrument_handler(show_stats, "stats")))
+    application.add_handler(CommandHandler("gainers", instrument_handler(top_gainers, "gainers")))
+    application.add_handler(CommandHandler("losers", instrument_handler(top_losers, "losers")))
+    application.add_handler(CommandHandler("search", instrument_handler(search, "search")))
+    application.add_handler(CommandHandler("history", instrument_handler(show_history, "history")))
+    application.add_handler(CommandHandler("leaderboard", instrument_handler(show_leaderboard, "leaderboard")))
+    application.add_handler(CommandHandler("holders", instrument_handler(show_holders, "holders")))
+    application.add_handler(CallbackQueryHandler(instrument_handler(button_handler, "button_handler", callback_kind)))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND,
+                                           instrument_handler(handle_message, "handle_message", message_mode)))
     
-    # Global variables for cleanup
-    global uptime_server, uptime_task
-    
-    def run_uptime_server():
-        """Run uptime server in a separate thread"""
-        import asyncio
-        import threading
-        
-        def start_server():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            async def server():
-                global uptime_server, uptime_task
-                
-                # Start uptime HTTP server
-                logger.info("Starting uptime HTTP server...")
-                uptime_server = await start_uptime_server()
-                
-                # Start background ping task
-                if UPTIME_MONITORING_ENABLED:
-                    logger.info("Starting uptime monitoring...")
-                    uptime_task = asyncio.create_task(uptime_ping_loop())
-                    logger.info("Uptime monitoring started")
-                
-                # Keep the server running
-                while True:
-                    await asyncio.sleep(1)
-            
-            try:
-                loop.run_until_complete(server())
-            except Exception as e:
-                logger.error(f"Uptime server error: {e}")
-            finally:
-                loop.close()
-        
-        # Start server in thread
-        server_thread = threading.Thread(target=start_server, daemon=True)
-        server_thread.start()
-        return server_thread
-    
-    # Run the services
-    logger.info("Starting bot with uptime monitoring...")
+    # Webhook mode is selected by WEBHOOK_URL; the route is served by the uptime server
+    global webhook
+    if WEBHOOK_URL:
+        webhook = TelegramWebhook(application, WEBHOOK_SECRET, WEBHOOK_PATH)
     
     try:
-        # Start uptime server in background thread
-        if UPTIME_MONITORING_ENABLED:
-            uptime_thread = run_uptime_server()
-            logger.info("Uptime services started in background")
-        
-        # Start the bot with standard polling
-        logger.info("Starting bot polling...")
-        application.run_polling(drop_pending_updates=True)
+        # The uptime server and ping loop run on the bot's own loop, started in post_init
+        if webhook is not None:
+            asyncio.run(run_webhook(application))
+        else:
+            logger.info("Starting bot polling...")
+            application.run_polling(drop_pending_updates=True)
         
     except KeyboardInterrupt:
         logger.info("Received keyboard interrupt, shutting down...")
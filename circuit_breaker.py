@@ -0,0 +1,103 @@
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class CircuitBreaker:
+    """Fail fast once a dependency's recent error rate crosses a threshold.
+
+    Outcomes are tracked over a sliding time window. When at least
+    `min_calls` outcomes are in the window and the failure ratio reaches
+    `failure_rate`, the breaker opens and allow() returns False for
+    `open_for` seconds. It then goes half-open: a single probe call is let
+    through, closing the breaker on success or re-opening it on failure.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 10,
+                 window: float = 30.0, open_for: float = 15.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_for = open_for
+        self.state = self.CLOSED
+        self._events = deque()  # (timestamp, failed)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.times_opened = 0
+
+    def _trim(self, now: float):
+        while self._events and self._events[0][0] < now - self.window:
+            _, failed = self._events.popleft()
+            self._failures -= failed
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self._opened_at = now
+        self._probing = False
+        self.times_opened += 1
+        logger.warning(f"Circuit breaker '{self.name}' opened")
+
+    def _close(self):
+        self.state = self.CLOSED
+        self._events.clear()
+        self._failures = 0
+        self._probing = False
+        logger.info(f"Circuit breaker '{self.name}' closed")
+
+    def is_open(self) -> bool:
+        """True while calls are being rejected (the half-open probe window doesn't count)"""
+        return self.state == self.OPEN and time.monotonic() < self._opened_at + self.open_for
+
+    def allow(self) -> bool:
+        """Whether a call may go through now"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() < self._opened_at + self.open_for:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release(self):
+        """Give back a half-open probe slot whose call was abandoned (e.g. a cancelled hedge)"""
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+
+    def record_success(self):
+        if self.state == self.HALF_OPEN:
+            self._close()
+            return
+        now = time.monotonic()
+        self._events.append((now, False))
+        self._trim(now)
+
+    def record_failure(self):
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self._open(now)
+            return
+        self._events.append((now, True))
+        self._failures += 1
+        self._trim(now)
+        if self.state == self.CLOSED and len(self._events) >= self.min_calls \
+                and self._failures / len(self._events) >= self.failure_rate:
+            self._open(now)
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'window_calls': len(self._events),
+            'window_failures': self._failures,
+            'times_opened': self.times_opened,
+        }
@@ -0,0 +1,132 @@
+import time
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class RankedBoard:
+    """Users ranked by a score, highest first.
+
+    Keeps a sorted list of (-score, uid) keys next to a uid -> score map, so
+    finding a user's rank is a bisect and moving a user is one removal plus
+    one insertion. Ties are broken by uid so every key is unique.
+    """
+
+    def __init__(self, scores: Optional[Dict[int, float]] = None):
+        self._scores: Dict[int, float] = dict(scores or {})
+        self._keys: List[Tuple[float, int]] = sorted((-score, uid) for uid, score in self._scores.items())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, uid: int) -> bool:
+        return uid in self._scores
+
+    def update(self, uid: int, score: float):
+        """Set a user's score, moving them to their new place"""
+        old = self._scores.get(uid)
+        if old == score:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, uid))]
+        self._scores[uid] = score
+        insort(self._keys, (-score, uid))
+
+    def remove(self, uid: int):
+        old = self._scores.pop(uid, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, uid))]
+
+    def rank(self, uid: int) -> Optional[int]:
+        """1-based rank of a user, or None if they aren't on the board"""
+        score = self._scores.get(uid)
+        if score is None:
+            return None
+        return bisect_left(self._keys, (-score, uid)) + 1
+
+    def score(self, uid: int) -> Optional[float]:
+        return self._scores.get(uid)
+
+    def top(self, n: int) -> List[Tuple[int, float]]:
+        """The first `n` (uid, score) pairs"""
+        return [(uid, -negated) for negated, uid in self._keys[:n]]
+
+class Leaderboard:
+    """Realized PnL and total equity rankings, served from memory.
+
+    The PnL board is seeded once and then moved along by `update_pnl` as
+    sells realize profit. Equity depends on prices, so it is rebuilt by a
+    background batch every `interval` seconds: `load_equity()` returns each
+    user's cash and their (uid, token, qty, avg_price) positions, every
+    token held by anyone is priced once through `get_prices`, and positions
+    with no price fall back to their cost basis.
+    """
+
+    def __init__(self, load_pnl: Callable[[], Awaitable[Dict[int, float]]],
+                 load_equity: Callable[[], Awaitable[Tuple[Dict[int, float], Iterable[Tuple[int, str, float, float]]]]],
+                 get_prices: Callable[[List[str]], Awaitable[Dict[str, float]]], interval: float = 60.0):
+        self.load_pnl = load_pnl
+        self.load_equity = load_equity
+        self.get_prices = get_prices
+        self.interval = interval
+        self.pnl = RankedBoard()
+        self.equity = RankedBoard()
+        self._equity_updated: Optional[float] = None
+        self.tokens_priced = 0
+        self.last_batch_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def update_pnl(self, uid: int, realized_pnl: float):
+        self.pnl.update(uid, realized_pnl)
+
+    def equity_age(self) -> Optional[float]:
+        """Seconds since the equity board was rebuilt, or None if it never was"""
+        return time.monotonic() - self._equity_updated if self._equity_updated is not None else None
+
+    async def seed(self):
+        """Load the PnL board from the database"""
+        self.pnl = RankedBoard(await self.load_pnl())
+        logger.info(f"PnL leaderboard seeded with {len(self.pnl)} users")
+
+    async def rebuild_equity(self):
+        """Value every user with one price lookup per distinct held token"""
+        started = time.monotonic()
+        balances, positions = await self.load_equity()
+        positions = list(positions)
+        tokens = list({token for _, token, _, _ in positions})
+        prices = await self.get_prices(tokens) if tokens else {}
+
+        equity = dict(balances)
+        for uid, token, qty, avg_price in positions:
+            if uid in equity:
+                equity[uid] += qty * prices.get(token, avg_price)
+        self.equity = RankedBoard(equity)
+        self._equity_updated = time.monotonic()
+        self.tokens_priced = len(tokens)
+        self.last_batch_seconds = self._equity_updated - started
+
+    async def _run(self):
+        while True:
+            try:
+                await self.rebuild_equity()
+            except Exception as e:
+                logger.error(f"Error rebuilding equity leaderboard: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background equity batch on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Equity leaderboard batch started (every {self.interval:g}s)")
+
+    async def stop(self):
+        """Cancel the background equity batch"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
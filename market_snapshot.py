@@ -0,0 +1,85 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class MarketSnapshot:
+    """Shared market rankings refreshed in the background and served from memory.
+
+    Each feed (e.g. top gainers) is a zero-argument coroutine function. A
+    background task refreshes every feed on a fixed cadence; readers always
+    get the last good snapshot immediately. A read that finds a snapshot
+    older than the cadence (stale-while-revalidate) kicks off one refresh in
+    the background but still returns the stale data.
+    """
+
+    def __init__(self, feeds: Dict[str, Callable[[], Awaitable[List[Dict]]]], interval: float = 15.0):
+        self.feeds = feeds
+        self.interval = interval
+        self._data: Dict[str, List[Dict]] = {}
+        self._updated: Dict[str, float] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def age(self, name: str) -> Optional[float]:
+        """Seconds since `name` was last refreshed, or None if never loaded"""
+        updated = self._updated.get(name)
+        return time.monotonic() - updated if updated is not None else None
+
+    async def _refresh_one(self, name: str):
+        data = await self.feeds[name]()
+        if data:  # keep serving the last good snapshot if the refresh came back empty
+            self._data[name] = data
+            self._updated[name] = time.monotonic()
+
+    def _revalidate(self, name: str) -> asyncio.Task:
+        task = self._refreshing.get(name)
+        if task is None or task.done():
+            task = asyncio.create_task(self._refresh_one(name))
+            self._refreshing[name] = task
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def get(self, name: str) -> Tuple[List[Dict], Optional[float]]:
+        """Return (snapshot, age in seconds) for a feed"""
+        if name not in self._data:
+            # Nothing to serve yet: wait for the (shared) first load
+            try:
+                await asyncio.shield(self._revalidate(name))
+            except Exception as e:
+                logger.error(f"Error loading market snapshot '{name}': {e}")
+            return self._data.get(name, []), self.age(name)
+        age = self.age(name)
+        if age > self.interval:
+            self._revalidate(name)
+        return self._data[name], age
+
+    async def refresh(self):
+        """Refresh every feed concurrently"""
+        results = await asyncio.gather(*(self._revalidate(name) for name in self.feeds), return_exceptions=True)
+        for name, result in zip(self.feeds, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error refreshing market snapshot '{name}': {result}")
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background refresher on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Market snapshot refresher started (every {self.interval:g}s)")
+
+    async def stop(self):
+        """Cancel the background refresher"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
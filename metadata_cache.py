@@ -0,0 +1,171 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from models import TokenMetadata
+from metrics import DB_COMMIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class TokenMetadataCache:
+    """Two-tier cache of token symbols/names/decimals keyed by mint address.
+
+    Tier one is an in-memory LRU that renders read synchronously; tier two is
+    the token_metadata table. Misses are never fetched inline: they are
+    queued, and a background filler resolves them from the database first and
+    then from the market-data providers in one multi-mint request per batch,
+    persisting whatever it finds. `fetch_many` raises when no provider could
+    answer; the batch is then re-queued after a growing delay, and only
+    mints a provider actually answered as unknown are remembered as such.
+    """
+
+    def __init__(self, session_factory, fetch_many: Callable[[List[str]], Awaitable[Dict[str, Dict]]],
+                 capacity: int = 50000, batch_size: int = 100,
+                 retry_delay: float = 1.0, max_retry_delay: float = 60.0):
+        self.session_factory = session_factory
+        self.fetch_many = fetch_many
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.failed_fills = 0
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._pending: Dict[str, None] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def pending(self) -> int:
+        """Mints queued for the background filler"""
+        return len(self._pending)
+
+    def _store(self, address: str, metadata: Dict):
+        self._entries[address] = metadata
+        self._entries.move_to_end(address)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def get(self, address: str) -> Optional[Dict]:
+        """Return cached metadata without touching the network; queue a fill on a miss"""
+        metadata = self._entries.get(address)
+        if metadata is None:
+            self.request([address])
+            return None
+        self._entries.move_to_end(address)
+        return metadata
+
+    def symbol(self, address: str) -> Optional[str]:
+        """Return the cached symbol for `address`, or None if it isn't known yet"""
+        metadata = self.get(address)
+        return metadata.get('symbol') if metadata else None
+
+    def label(self, address: str) -> str:
+        """Symbol for display, falling back to an abbreviated address"""
+        return self.symbol(address) or f"{address[:4]}…{address[-4:]}"
+
+    def request(self, addresses: Iterable[str]):
+        """Queue addresses that aren't cached yet for the background filler"""
+        for address in addresses:
+            if address not in self._entries:
+                self._pending[address] = None
+        if self._pending:
+            self._wakeup.set()
+
+    def _load_rows(self, addresses: Optional[List[str]] = None, limit: Optional[int] = None) -> List[Dict]:
+        session = self.session_factory()
+        try:
+            query = session.query(TokenMetadata)
+            if addresses is not None:
+                query = query.filter(TokenMetadata.address.in_(addresses))
+            else:
+                query = query.order_by(TokenMetadata.updated_at.desc()).limit(limit)
+            return [
+                {'address': row.address, 'symbol': row.symbol, 'name': row.name, 'decimals': row.decimals}
+                for row in query
+            ]
+        finally:
+            session.close()
+
+    def _save_rows(self, rows: List[Dict]):
+        session = self.session_factory()
+        try:
+            for row in rows:
+                session.merge(TokenMetadata(
+                    address=row['address'], symbol=row.get('symbol'),
+                    name=row.get('name'), decimals=row.get('decimals'),
+                ))
+            with DB_COMMIT_SECONDS.time('token_metadata'):
+                session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    async def warm(self):
+        """Preload the most recently updated rows so early renders hit memory"""
+        rows = await asyncio.to_thread(self._load_rows, None, self.capacity)
+        for row in reversed(rows):
+            self._store(row['address'], row)
+        logger.info(f"Loaded {len(rows)} token metadata rows")
+
+    async def fill(self, addresses: List[str]):
+        """Resolve a batch of misses from the database, then the providers"""
+        missing = [a for a in addresses if a not in self._entries]
+        if not missing:
+            return
+        for row in await asyncio.to_thread(self._load_rows, missing):
+            self._store(row['address'], row)
+        missing = [a for a in missing if a not in self._entries]
+        if not missing:
+            return
+        fetched = await self.fetch_many(missing)
+        rows = [dict(meta, address=address) for address, meta in fetched.items() if meta.get('symbol')]
+        for row in rows:
+            self._store(row['address'], row)
+        for address in missing:
+            if address not in self._entries:
+                # Answered as unknown: remember for this process so renders don't re-queue them
+                self._store(address, {'address': address, 'symbol': None, 'name': None, 'decimals': None})
+        if rows:
+            await asyncio.to_thread(self._save_rows, rows)
+
+    async def _run(self):
+        delay = self.retry_delay
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                batch = list(self._pending)[:self.batch_size]
+                for address in batch:
+                    self._pending.pop(address, None)
+                try:
+                    await self.fill(batch)
+                    delay = self.retry_delay
+                except Exception as e:
+                    self.failed_fills += 1
+                    logger.error(f"Error filling token metadata, retrying {len(batch)} mints in {delay:g}s: {e}")
+                    self.request(batch)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_retry_delay)
+
+    def start(self):
+        """Start the background filler on the running loop"""
+        if self._task is None or self._task.done():
+            if self._pending:
+                self._wakeup.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background filler"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,212 @@
+import time
+import asyncio
+import logging
+import functools
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; wide enough for cache hits (sub-ms) through slow provider calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """A monotonically increasing count per label combination"""
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for labels, value in list(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+class Histogram:
+    """Observation counts in fixed buckets per label combination.
+
+    `observe` is a dict lookup, a bisect and two additions; buckets are only
+    made cumulative when rendered.
+    """
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # labels -> per-bucket counts + [+Inf, sum]
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def time(self, *labels: str) -> '_Timer':
+        """Context manager observing the wall time of its block"""
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, series in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]:.9g}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, labels: Tuple[str, ...]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+class Gauge:
+    """A value read from a callback when scraped"""
+
+    def __init__(self, name: str, description: str, read: Callable[[], float]):
+        self.name = name
+        self.description = description
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception as e:
+            logger.error(f"Error reading gauge {self.name}: {e}")
+            return []
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge", f"{self.name} {value:g}"]
+
+class Registry:
+    """The metrics exposed on /metrics, in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, description, labelnames))
+
+    def histogram(self, name: str, description: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, description, labelnames, buckets))
+
+    def gauge(self, name: str, description: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, description, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    'bot_handler_seconds', 'Time spent handling an update', ('handler', 'kind'))
+TOKEN_PRICE_SECONDS = REGISTRY.histogram(
+    'bot_token_price_seconds', 'get_token_price latency, cache hits included')
+TOKEN_PRICE_ERRORS = REGISTRY.counter(
+    'bot_token_price_errors_total', 'get_token_price calls that returned no price', ('reason',))
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    'bot_db_commit_seconds', 'Time to commit a database transaction', ('site',))
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    'bot_event_loop_lag_seconds', 'How late the event loop woke a sleeping task',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+TELEGRAM_REQUESTS = REGISTRY.counter(
+    'bot_telegram_requests_total', 'Bot API calls by method and HTTP status', ('method', 'status'))
+
+def instrument_handler(callback, name: str, kind: Optional[Callable] = None):
+    """Wrap a handler callback to record its latency under `name` and `kind(update)`"""
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        label = kind(update) if kind else ''
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name, label)
+    return wrapper
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that counts Bot API calls by method and status"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            TELEGRAM_REQUESTS.inc(api_method, 'error')
+            raise
+        TELEGRAM_REQUESTS.inc(api_method, str(code))
+        return code, payload
+
+class LoopLagMonitor:
+    """Measures event loop lag: how much later than asked a sleep wakes up"""
+
+    def __init__(self, interval: float = 0.5, histogram: Histogram = LOOP_LAG_SECONDS):
+        self.interval = interval
+        self.histogram = histogram
+        self.lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - started - self.interval)
+            self.histogram.observe(self.lag)
+
+    def start(self):
+        """Start measuring on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
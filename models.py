@@ -1,8 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, BigInteger, JSON, text
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, BigInteger, JSON, Index, text
+from sqlalchemy import select, update, insert, cast, func, inspect
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, sessionmaker, aliased
 from datetime import datetime
 import os
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,15 +21,22 @@ class User(Base):
     telegram_id = Column(BigInteger, unique=True)
     username = Column(String)
     balance = Column(Float, default=1000.0)  # Initial balance 1k USD
-    holdings = Column(JSON, default={})  # Store holdings as JSON
+    holdings = Column(JSON, default={})  # Legacy; holdings are kept in the positions table
     realized_pnl = Column(Float, default=0.0)
-    history = Column(JSON, default=[])  # Store trade history as JSON
+    history = Column(JSON, default=[])  # Recent activity only; trades are kept in the trades table
     context = Column(JSON, default={})  # Store current context as JSON
     referral_id = Column(BigInteger, nullable=True)  # Renamed from referred_by
+    referral_count = Column(Integer, nullable=False, default=0, server_default='0')  # Users with referral_id = telegram_id
     created_at = Column(DateTime, default=datetime.utcnow)
     last_broadcast_message_id = Column(Integer, nullable=True)  # Store last broadcast message ID
     
     trades = relationship("Trade", back_populates="user", cascade="all, delete-orphan")
+    positions = relationship("Position", back_populates="user", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index('ix_users_referral_id', 'referral_id'),
+        Index('ix_users_referral_count', 'referral_count'),  # referral leaderboard
+    )
 
 class Trade(Base):
     __tablename__ = 'trades'
@@ -31,71 +44,231 @@ class Trade(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     token_address = Column(String, nullable=False)
-    token_symbol = Column(String, nullable=False)
+    token_symbol = Column(String, nullable=True)  # None when the symbol wasn't known at trade time
     amount = Column(Float, nullable=False)
     price = Column(Float, nullable=False)
     trade_type = Column(String, nullable=False)  # 'buy' or 'sell'
     timestamp = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="trades")
+    
+    __table_args__ = (
+        Index('ix_trades_user_id_timestamp', 'user_id', 'timestamp'),  # /history pages
+    )
 
-def init_db(database_url):
-    engine = create_engine(database_url)
+class Position(Base):
+    __tablename__ = 'positions'
     
-    # Create tables if they don't exist
-    Base.metadata.create_all(engine)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    token_address = Column(String, primary_key=True)
+    qty = Column(Float, nullable=False)
+    avg_price = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Ensure all expected columns exist (helps if someone dropped columns manually)
-    expected_columns = {
-        # column_name: SQL definition to add if missing
-        'telegram_id': 'BIGINT UNIQUE',
-        'username': 'VARCHAR',
-        'balance': 'FLOAT DEFAULT 1000.0',
-        'holdings': 'JSONB DEFAULT \'{}\'',
-        'realized_pnl': 'FLOAT DEFAULT 0.0',
-        'history': 'JSONB DEFAULT \'[]\'',
-        'context': 'JSONB DEFAULT \'{}\'',
-        'referral_id': 'BIGINT',
-        'created_at': 'TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()',
-        'last_broadcast_message_id': 'INTEGER'
-    }
+    user = relationship("User", back_populates="positions")
+    
+    __table_args__ = (
+        Index('ix_positions_token_address', 'token_address'),  # who holds a token
+    )
+
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migrations'
+    
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+class TokenMetadata(Base):
+    __tablename__ = 'token_metadata'
     
+    address = Column(String, primary_key=True)  # Mint address
+    symbol = Column(String, nullable=True)
+    name = Column(String, nullable=True)
+    decimals = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Columns added to users after the first release, with the SQL to add them if missing
+LEGACY_USER_COLUMNS = {
+    'telegram_id': 'BIGINT UNIQUE',
+    'username': 'VARCHAR',
+    'balance': 'FLOAT DEFAULT 1000.0',
+    'holdings': 'JSONB DEFAULT \'{}\'',
+    'realized_pnl': 'FLOAT DEFAULT 0.0',
+    'history': 'JSONB DEFAULT \'[]\'',
+    'context': 'JSONB DEFAULT \'{}\'',
+    'referral_id': 'BIGINT',
+    'created_at': 'TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW()',
+    'last_broadcast_message_id': 'INTEGER'
+}
+MIGRATION_LOCK_ID = 7_240_416  # pg advisory lock held while migrating, so two deploys don't race
+
+def introspect(conn):
+    """Map each existing table to its column names, in one query"""
+    if conn.dialect.name == 'postgresql':
+        rows = conn.execute(text("""
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = current_schema()
+        """))
+    else:
+        inspector = inspect(conn)
+        rows = [(table, column['name']) for table in inspector.get_table_names()
+                for column in inspector.get_columns(table)]
+    tables = {}
+    for table, column in rows:
+        tables.setdefault(table, set()).add(column)
+    return tables
+
+def create_base_schema(conn):
+    """Create missing tables and repair the users table of older deployments"""
+    tables = introspect(conn)
+    missing = [table for name, table in Base.metadata.tables.items() if name not in tables]
+    if missing:
+        logger.info(f"Creating tables: {', '.join(table.name for table in missing)}")
+        Base.metadata.create_all(conn, tables=missing, checkfirst=False)
+    columns = tables.get('users')
+    if not columns:
+        return
+    
+    # First, handle the migration from referred_by to referral_id
+    if 'referred_by' in columns:
+        logger.info("Renaming 'referred_by' column to 'referral_id'")
+        conn.execute(text("ALTER TABLE users RENAME COLUMN referred_by TO referral_id"))
+        columns = (columns - {'referred_by'}) | {'referral_id'}
+    
+    # Then ensure all expected columns exist (helps if someone dropped columns manually)
+    for column_name, column_def in LEGACY_USER_COLUMNS.items():
+        if column_name not in columns:
+            logger.info(f"Adding missing column '{column_name}' to users table")
+            conn.execute(text(f"ALTER TABLE users ADD COLUMN {column_name} {column_def}"))
+
+def create_indexes(conn):
+    """Indexes that create_all skipped because their tables already existed"""
+    for table in (Trade.__table__, Position.__table__):
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def dialect_insert(dialect_name):
+    """INSERT construct with ON CONFLICT support for the given dialect"""
+    return sqlite.insert if dialect_name == 'sqlite' else postgresql.insert
+
+def backfill_positions(conn):
+    """Move holdings still stored in the users.holdings JSON into the positions table"""
+    users = conn.execute(
+        select(User.id, User.holdings)
+        .where(User.holdings.isnot(None), cast(User.holdings, String).notin_(['{}', 'null']))
+    ).all()
+    if not users:
+        return
+    rows = [
+        {'user_id': user_id, 'token_address': token, 'qty': holding['qty'], 'avg_price': holding['avg_price']}
+        for user_id, holdings in users
+        for token, holding in (holdings or {}).items()
+    ]
+    if rows:
+        insert = dialect_insert(conn.dialect.name)
+        conn.execute(insert(Position).on_conflict_do_nothing(), rows)
+    conn.execute(update(User).where(User.id.in_([user_id for user_id, _ in users])).values(holdings={}))
+    logger.info(f"Moved {len(rows)} holdings of {len(users)} users into the positions table")
+
+def add_referral_counts(conn):
+    """Index referrals and backfill the denormalized referral_count"""
+    if 'referral_count' not in introspect(conn).get('users', ()):
+        logger.info("Adding 'referral_count' column to users table")
+        conn.execute(text("ALTER TABLE users ADD COLUMN referral_count INTEGER NOT NULL DEFAULT 0"))
+    for index in User.__table__.indexes:
+        index.create(conn, checkfirst=True)
+    referred = aliased(User)
+    conn.execute(update(User).values(referral_count=(
+        select(func.count()).where(referred.referral_id == User.telegram_id).scalar_subquery()
+    )))
+
+def nullable_trade_symbols(conn):
+    """Let trades be recorded before their token's symbol is known, and drop stored address stand-ins"""
+    if conn.dialect.name == 'postgresql':
+        conn.execute(text("ALTER TABLE trades ALTER COLUMN token_symbol DROP NOT NULL"))
+        conn.execute(update(Trade).where(Trade.token_symbol.like('%…%')).values(token_symbol=None))
+
+# Applied in order, once each; append new steps with the next version number
+MIGRATIONS = [
+    (1, 'base schema', create_base_schema),
+    (2, 'trade and position indexes', create_indexes),
+    (3, 'positions backfill', backfill_positions),
+    (4, 'referral counts', add_referral_counts),
+    (5, 'nullable trade symbols', nullable_trade_symbols),
+]
+
+def schema_version(conn):
+    """Latest applied migration, or 0 before the migrations table exists"""
+    try:
+        return conn.execute(select(func.max(SchemaMigration.version))).scalar() or 0
+    except DBAPIError:
+        conn.rollback()
+        return 0
+
+def run_migrations(conn):
+    """Bring the schema up to date; a warm start is a single query"""
+    latest = MIGRATIONS[-1][0]
+    if schema_version(conn) >= latest:
+        conn.commit()
+        return
+    
+    locked = conn.dialect.name == 'postgresql'
+    if locked:
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {'id': MIGRATION_LOCK_ID})
+    try:
+        SchemaMigration.__table__.create(conn, checkfirst=True)
+        conn.commit()
+        current = schema_version(conn)  # another instance may have migrated while we waited
+        for version, name, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            started = time.monotonic()
+            migrate(conn)
+            conn.execute(insert(SchemaMigration).values(version=version, name=name, applied_at=datetime.utcnow()))
+            conn.commit()
+            logger.info(f"Applied migration {version} ({name}) in {time.monotonic() - started:.2f}s")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if locked:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {'id': MIGRATION_LOCK_ID})
+            conn.commit()
+
+def init_db(database_url):
+    engine = create_engine(database_url)
     with engine.connect() as conn:
         try:
-            # First, handle the migration from referred_by to referral_id
-            check_old_column = text("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name='users' 
-                AND column_name='referred_by'
-            """)
-            old_column_exists = conn.execute(check_old_column).fetchone()
-            
-            if old_column_exists:
-                logger.info("Renaming 'referred_by' column to 'referral_id'")
-                rename_query = text("ALTER TABLE users RENAME COLUMN referred_by TO referral_id")
-                conn.execute(rename_query)
-                conn.commit()
-                logger.info("Successfully renamed column")
-            
-            # Then ensure all expected columns exist
-            for column_name, column_def in expected_columns.items():
-                # Check if column exists
-                check_column_query = text("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name='users' 
-                    AND column_name=:col
-                """)
-                result = conn.execute(check_column_query, {'col': column_name}).fetchone()
-                if not result:
-                    logger.info(f"Adding missing column '{column_name}' to users table")
-                    add_column_query = text(f"ALTER TABLE users ADD COLUMN {column_name} {column_def}")
-                    conn.execute(add_column_query)
-                    conn.commit()
-                    logger.info(f"Successfully added '{column_name}' column")
+            run_migrations(conn)
         except Exception as e:
-            logger.error(f"Error ensuring columns exist: {e}")
+            logger.error(f"Error migrating database: {e}")
             raise
-    
-    return engine 
\ No newline at end of file
+    return engine
+
+async def migrate(async_engine):
+    """Run pending migrations over the async engine"""
+    async with async_engine.connect() as conn:
+        await conn.run_sync(run_migrations)
+
+def async_database_url(database_url):
+    """Point a Postgres URL at the asyncpg driver"""
+    url = make_url(database_url)
+    if url.drivername in ('postgres', 'postgresql', 'postgresql+psycopg2'):
+        url = url.set(drivername='postgresql+asyncpg')
+        # asyncpg takes ssl=... rather than libpq's sslmode=...
+        sslmode = url.query.get('sslmode')
+        if sslmode:
+            url = url.difference_update_query(['sslmode']).update_query_dict({'ssl': sslmode})
+    return url
+
+def init_async_db(database_url, pool_size=10, max_overflow=5, pool_timeout=10.0, pool_recycle=1800):
+    """Create the async engine the bot's handlers use (connects lazily)"""
+    return create_async_engine(
+        async_database_url(database_url),
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=True,
+    )
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, insert, update
+
+from models import User, Trade, Position, dialect_insert
+from metrics import DB_COMMIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class WriteBehind:
+    """Write-behind persistence for in-memory user state.
+
+    Trade handlers mutate USERS and call mark_dirty(uid),
+    mark_position_dirty(uid, token) and record_trade(row) instead of writing
+    to the database themselves. A background task snapshots every dirty user
+    and position and writes them, along with the queued ledger rows, in one
+    batched transaction every `interval` seconds, or sooner once `max_dirty`
+    users or trades are waiting. Positions are upserted one row each, and
+    deleted once `position_snapshot` reports them closed. A failed flush puts the
+    users back on the dirty set, so at most `interval` seconds (plus one
+    flush) of trades are exposed to a crash. stop() drains everything on
+    shutdown; the bot calls it from post_shutdown, which python-telegram-bot
+    runs after SIGINT/SIGTERM stop the application.
+    """
+
+    def __init__(self, session_factory, snapshot: Callable[[int], Optional[Dict]],
+                 position_snapshot: Callable[[int, str], Optional[Dict]] = None,
+                 interval: float = 1.0, max_dirty: int = 500):
+        self.session_factory = session_factory
+        self.snapshot = snapshot
+        self.position_snapshot = position_snapshot
+        self.interval = interval
+        self.max_dirty = max_dirty
+        self._dirty: Dict[int, None] = {}
+        self._trades: List[Dict] = []
+        self._positions: Dict[Tuple[int, str], None] = {}
+        self._flushing: Dict[int, int] = {}  # users whose snapshots are being written -> flushes writing them
+        self._flush_lock = asyncio.Lock()  # one async snapshot+write in flight, so writes land in snapshot order
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.flushes = 0
+        self.rows_written = 0
+        self.trades_written = 0
+        self.positions_written = 0
+        self.failures = 0
+        self.last_flush_seconds = 0.0
+
+    def __len__(self):
+        return len(self._dirty)
+
+    def mark_dirty(self, uid: int):
+        """Queue a user's in-memory state to be written on the next flush"""
+        self._dirty[uid] = None
+        if len(self._dirty) >= self.max_dirty and self._wakeup is not None:
+            self._wakeup.set()
+
+    def is_dirty(self, uid: int) -> bool:
+        """Whether a user has changes that aren't in the database yet"""
+        return uid in self._dirty or uid in self._flushing
+
+    def mark_position_dirty(self, uid: int, token_address: str):
+        """Queue one of a user's positions to be upserted (or deleted, once closed) on the next flush"""
+        self._positions[(uid, token_address)] = None
+
+    def record_trade(self, row: Dict):
+        """Queue a Trade ledger row to be inserted on the next flush"""
+        self._trades.append(row)
+        if len(self._trades) >= self.max_dirty and self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def pending_trades(self) -> int:
+        return len(self._trades)
+
+    def queued_trades(self, user_id: int) -> List[Dict]:
+        """A user's ledger rows still waiting for a flush, newest first"""
+        return [row for row in reversed(self._trades) if row['user_id'] == user_id]
+
+    @asynccontextmanager
+    async def holding_flushes(self):
+        """Keep flushes out of this block, so every queued row is either in the database or in memory.
+
+        Readers merging queued_trades() into a query hold this around both,
+        so no row is missed or counted twice by a flush landing in between.
+        """
+        async with self._flush_lock:
+            yield
+
+    def _take_snapshots(self) -> Tuple[List[Dict], List[Dict], List[Dict], set]:
+        dirty, self._dirty = self._dirty, {}
+        trades, self._trades = self._trades, []
+        dirty_positions, self._positions = self._positions, {}
+        uids = set(dirty).union(uid for uid, _ in dirty_positions)
+        for uid in uids:
+            self._flushing[uid] = self._flushing.get(uid, 0) + 1
+        rows = []
+        for uid in dirty:
+            row = self.snapshot(uid)
+            if row is not None:
+                rows.append(row)
+        positions = []
+        for uid, token_address in dirty_positions:
+            position = self.position_snapshot(uid, token_address)
+            if position is not None:
+                positions.append(dict(position, uid=uid))
+        return rows, trades, positions, uids
+
+    def _release(self, uids: set):
+        """Drop the in-flight mark a finished (or failed, and requeued) flush held on its users"""
+        for uid in uids:
+            remaining = self._flushing[uid] - 1
+            if remaining:
+                self._flushing[uid] = remaining
+            else:
+                del self._flushing[uid]
+
+    def _write(self, rows: List[Dict], trades: List[Dict], positions: List[Dict]):
+        """Write snapshots, positions and ledger rows in one transaction (runs in a worker thread)"""
+        stmt = (
+            update(User)
+            .where(User.telegram_id == bindparam('uid'))
+            .values(
+                balance=bindparam('balance', type_=User.balance.type),
+                realized_pnl=bindparam('realized_pnl', type_=User.realized_pnl.type),
+                history=bindparam('history', type_=User.history.type),
+            )
+        )
+        session = self.session_factory()
+        try:
+            connection = session.connection()
+            if rows:
+                connection.execute(stmt, rows)
+            if trades:
+                connection.execute(insert(Trade), trades)
+            self._write_positions(connection, positions)
+            with DB_COMMIT_SECONDS.time('write_behind'):
+                session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _write_positions(self, connection, positions: List[Dict]):
+        columns = ('user_id', 'token_address', 'qty', 'avg_price', 'updated_at')
+        upserts = [{k: p[k] for k in columns} for p in positions if p['qty'] is not None]
+        closed = [{'uid': p['user_id'], 'token': p['token_address']} for p in positions if p['qty'] is None]
+        if upserts:
+            stmt = dialect_insert(connection.dialect.name)(Position)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Position.user_id, Position.token_address],
+                set_={'qty': stmt.excluded.qty, 'avg_price': stmt.excluded.avg_price,
+                      'updated_at': stmt.excluded.updated_at},
+            )
+            connection.execute(stmt, upserts)
+        if closed:
+            connection.execute(
+                delete(Position).where(Position.user_id == bindparam('uid'),
+                                       Position.token_address == bindparam('token')),
+                closed
+            )
+
+    def _requeue(self, rows: List[Dict], trades: List[Dict], positions: List[Dict]):
+        for row in rows:
+            self._dirty.setdefault(row['uid'], None)
+        self._trades[:0] = trades  # keep ledger order
+        for position in positions:
+            self._positions.setdefault((position['uid'], position['token_address']), None)
+
+    async def flush(self):
+        """Write every dirty user, position and queued trade now.
+
+        Concurrent callers queue on one lock rather than writing in parallel:
+        each waits for the flush in flight, then writes whatever is left.
+        """
+        async with self._flush_lock:
+            await self._flush()
+
+    async def _flush(self):
+        rows, trades, positions, uids = self._take_snapshots()
+        if not rows and not trades and not positions:
+            self._release(uids)
+            return
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            await asyncio.to_thread(self._write, rows, trades, positions)
+        except Exception as e:
+            self.failures += 1
+            self._requeue(rows, trades, positions)
+            logger.error(f"Write-behind flush of {len(rows)} users/{len(trades)} trades failed, will retry: {e}")
+            return
+        finally:
+            self._release(uids)
+        self.flushes += 1
+        self.rows_written += len(rows)
+        self.trades_written += len(trades)
+        self.positions_written += len(positions)
+        self.last_flush_seconds = loop.time() - started
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        """Start the background flusher on the running loop"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Write-behind flusher started (every {self.interval:g}s or {self.max_dirty} users)")
+
+    async def stop(self):
+        """Stop the background flusher and write everything that's still dirty"""
+        if self._task is not None:
+            # Let an in-progress flush finish rather than cancelling it mid-write
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._dirty or self._trades or self._positions:
+            logger.error(f"{len(self._dirty)} users and {len(self._trades)} trades could not be written on shutdown")
+
+    def stats(self) -> dict:
+        return {
+            'dirty': len(self._dirty),
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'pending_trades': len(self._trades),
+            'trades_written': self.trades_written,
+            'dirty_positions': len(self._positions),
+            'positions_written': self.positions_written,
+            'failures': self.failures,
+            'last_flush_seconds': self.last_flush_seconds,
+        }
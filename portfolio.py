@@ -0,0 +1,47 @@
+from typing import Awaitable, Callable, Dict, List
+
+from user_state import UserState
+
+async def value_portfolio(user: UserState, get_prices: Callable[[List[str]], Awaitable[Dict[str, float]]]) -> dict:
+    """Value a user's cash and holdings with a single batched price lookup.
+
+    `get_prices` receives every held address at once and returns a mapping of
+    address -> USD price. Positions it has no price for are listed under
+    'unpriced' and left out of the totals.
+    """
+    holdings = user.holdings
+    prices = await get_prices(list(holdings.keys())) if holdings else {}
+
+    positions = []
+    unpriced = []
+    holdings_value = 0.0
+    unrealized_pnl = 0.0
+    for token, holding in holdings.items():
+        price = prices.get(token)
+        if price is None:
+            unpriced.append(token)
+            continue
+        qty = holding.qty
+        avg = holding.avg_price
+        value = qty * price
+        pnl = (price - avg) * qty
+        holdings_value += value
+        unrealized_pnl += pnl
+        positions.append({
+            'token': token,
+            'qty': qty,
+            'avg_price': avg,
+            'price': price,
+            'value': value,
+            'unrealized_pnl': pnl,
+        })
+
+    positions.sort(key=lambda p: p['value'], reverse=True)
+    return {
+        'cash': user.balance,
+        'holdings_value': holdings_value,
+        'total_equity': user.balance + holdings_value,
+        'unrealized_pnl': unrealized_pnl,
+        'positions': positions,
+        'unpriced': unpriced,
+    }
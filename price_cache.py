@@ -0,0 +1,161 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from rate_limiter import current_priority
+
+logger = logging.getLogger(__name__)
+
+class PriceCache:
+    """In-process TTL cache for token prices with single-flight misses.
+
+    Entries expire after `ttl` seconds and the least recently used entry is
+    evicted once `max_size` is reached. Concurrent misses for the same address
+    share one in-flight fetch instead of each going out to the API, unless
+    that fetch was started at a lower request priority: a trade never waits
+    in the rate limiter's background queue behind someone else's refresh.
+    Expired entries are kept (until evicted) as the last known price for
+    fallbacks.
+    """
+
+    def __init__(self, ttl: float = 5.0, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # address -> (price, expires_at, fetched_at)
+        self._inflight: Dict[str, Tuple[asyncio.Future, int]] = {}  # address -> (fetch, its request priority)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.overtaken = 0
+        self.evictions = 0
+
+    def peek(self, address: str) -> Optional[float]:
+        """Return a fresh cached price without fetching, or None"""
+        entry = self._entries.get(address)
+        if entry is None or entry[1] < time.monotonic():
+            return None
+        return entry[0]
+
+    def put(self, address: str, price: float):
+        """Store a price, evicting the least recently used entry if full"""
+        now = time.monotonic()
+        self._entries[address] = (price, now + self.ttl, now)
+        self._entries.move_to_end(address)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, address: str, fetch: Callable[[str], Awaitable[Optional[float]]]) -> Optional[float]:
+        """Return the cached price for `address`, calling `fetch` on a miss"""
+        entry = self._entries.get(address)
+        if entry is not None and entry[1] >= time.monotonic():
+            self._entries.move_to_end(address)
+            self.hits += 1
+            return entry[0]
+
+        priority = current_priority()
+        inflight = self._joinable(address, priority)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        task = asyncio.ensure_future(fetch(address))
+        self._track(address, task, priority)
+        return await asyncio.shield(task)
+
+    def _joinable(self, address: str, priority: int) -> Optional[asyncio.Future]:
+        """The in-flight fetch for `address`, if it was started at `priority` or a more urgent one"""
+        inflight = self._inflight.get(address)
+        if inflight is None:
+            return None
+        if inflight[1] > priority:
+            self.overtaken += 1
+            return None
+        return inflight[0]
+
+    def _track(self, address: str, task: asyncio.Future, priority: int):
+        self._inflight[address] = (task, priority)
+        task.add_done_callback(lambda t: self._on_fetched(address, t))
+
+    def last_known(self, address: str) -> Optional[tuple]:
+        """Return (price, age in seconds) of the last fetched price, fresh or not"""
+        entry = self._entries.get(address)
+        if entry is None:
+            return None
+        return entry[0], time.monotonic() - entry[2]
+
+    async def get_many(self, addresses: Iterable[str],
+                       fetch_many: Callable[[list], Awaitable[Dict[str, float]]]) -> Dict[str, float]:
+        """Return prices for many addresses, fetching all misses in one `fetch_many` call"""
+        prices = {}
+        waiting = {}
+        missing = []
+        priority = current_priority()
+        now = time.monotonic()
+        for address in dict.fromkeys(addresses):
+            entry = self._entries.get(address)
+            if entry is not None and entry[1] >= now:
+                self._entries.move_to_end(address)
+                self.hits += 1
+                prices[address] = entry[0]
+                continue
+            inflight = self._joinable(address, priority)
+            if inflight is not None:
+                self.coalesced += 1
+                waiting[address] = inflight
+            else:
+                self.misses += 1
+                missing.append(address)
+
+        if missing:
+            batch = asyncio.ensure_future(fetch_many(missing))
+            for address in missing:
+                task = asyncio.ensure_future(self._pick(batch, address))
+                self._track(address, task, priority)
+                waiting[address] = task
+
+        for address, task in waiting.items():
+            try:
+                price = await asyncio.shield(task)
+            except Exception as e:
+                logger.warning(f"Price lookup failed for {address}: {e}")
+                continue
+            if price is not None:
+                prices[address] = price
+        return prices
+
+    @staticmethod
+    async def _pick(batch: asyncio.Future, address: str) -> Optional[float]:
+        return (await asyncio.shield(batch)).get(address)
+
+    def _on_fetched(self, address: str, task: asyncio.Future):
+        """Store a finished fetch and release its waiters"""
+        inflight = self._inflight.get(address)
+        overtaken = inflight is None or inflight[0] is not task
+        if not overtaken:
+            del self._inflight[address]
+        if task.cancelled() or task.exception() is not None:
+            return
+        price = task.result()
+        if price is None:  # don't cache failed lookups
+            return
+        if overtaken and self.peek(address) is not None:
+            return  # the more urgent fetch that overtook this one already stored a price
+        self.put(address, price)
+
+    def stats(self) -> dict:
+        """Counters for sizing the TTL against the API quota"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'overtaken': self.overtaken,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'inflight': len(self._inflight),
+            'hit_ratio': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,85 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class HotPriceTable:
+    """Prices for every token currently held by any user, refreshed in the background.
+
+    Positions subscribe/unsubscribe their token as they open and close, so the
+    set of addresses to refresh is maintained incrementally instead of being
+    rebuilt from all users every cycle. A token stays subscribed while at
+    least one position references it.
+    """
+
+    def __init__(self, fetch_many: Callable[[List[str]], Awaitable[Dict[str, float]]],
+                 interval: float = 10.0, batch_size: int = 100, max_age: Optional[float] = None):
+        self.fetch_many = fetch_many
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_age = max_age if max_age is not None else interval * 2
+        self._refs: Dict[str, int] = {}
+        self._prices: Dict[str, tuple] = {}  # address -> (price, fetched_at)
+        self._task: Optional[asyncio.Task] = None
+        self.last_refresh = None
+
+    def subscribe(self, address: str):
+        """Add a reference to `address` (a position in it was opened)"""
+        self._refs[address] = self._refs.get(address, 0) + 1
+
+    def unsubscribe(self, address: str):
+        """Drop a reference to `address` (a position in it was closed)"""
+        count = self._refs.get(address, 0) - 1
+        if count > 0:
+            self._refs[address] = count
+        else:
+            self._refs.pop(address, None)
+            self._prices.pop(address, None)
+
+    def get(self, address: str) -> Optional[float]:
+        """Return the refreshed price for `address` if it's recent enough, else None"""
+        entry = self._prices.get(address)
+        if entry is None or time.monotonic() - entry[1] > self.max_age:
+            return None
+        return entry[0]
+
+    def __len__(self):
+        return len(self._refs)
+
+    async def refresh(self):
+        """Re-price every subscribed token in batches"""
+        addresses = list(self._refs)
+        for i in range(0, len(addresses), self.batch_size):
+            batch = addresses[i:i + self.batch_size]
+            prices = await self.fetch_many(batch)
+            now = time.monotonic()
+            for address, price in prices.items():
+                if address in self._refs:  # may have been closed while we were fetching
+                    self._prices[address] = (price, now)
+        self.last_refresh = time.monotonic()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing hot prices: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background refresher on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Hot price refresher started (every {self.interval:g}s)")
+
+    async def stop(self):
+        """Cancel the background refresher"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, highest first
+TRADE = 0        # executing a buy or sell
+VALUATION = 1    # PnL views, balance, hot price refresh
+BACKGROUND = 2   # rankings, search, metadata
+PRIORITY_NAMES = {TRADE: 'trade', VALUATION: 'valuation', BACKGROUND: 'background'}
+
+_current_priority: ContextVar[int] = ContextVar('request_priority', default=VALUATION)
+
+@contextmanager
+def request_priority(priority: int):
+    """Tag outbound API calls made inside this block (and tasks it spawns) with a priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def current_priority() -> int:
+    return _current_priority.get()
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
+
+class PriorityRateLimiter:
+    """Token-bucket scheduler that hands out request slots by priority class.
+
+    Callers await acquire() before each outbound request. While tokens are
+    available and nobody is queued, slots are granted immediately; otherwise
+    waiters queue per class and every refilled token goes to the highest
+    priority waiter first. backoff() pauses all grants, e.g. after a 429 with
+    Retry-After.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._tokens = self.burst
+        self._updated = None
+        self._paused_until = 0.0
+        self._queues: Dict[int, deque] = {p: deque() for p in PRIORITY_NAMES}
+        self._timer: Optional[asyncio.Handle] = None
+        self._granted = {p: 0 for p in PRIORITY_NAMES}
+        self._wait_total = {p: 0.0 for p in PRIORITY_NAMES}
+        self._wait_max = {p: 0.0 for p in PRIORITY_NAMES}
+        self.backoffs = 0
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _record(self, priority: int, waited: float):
+        self._granted[priority] += 1
+        self._wait_total[priority] += waited
+        self._wait_max[priority] = max(self._wait_max[priority], waited)
+
+    async def acquire(self, priority: Optional[int] = None):
+        """Wait for a request slot"""
+        if priority is None:
+            priority = current_priority()
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if now >= self._paused_until and not any(self._queues.values()):
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self._record(priority, 0.0)
+                return
+
+        waiter = loop.create_future()
+        entry = (waiter, now)
+        queue = self._queues[priority]
+        queue.append(entry)
+        self._schedule(loop, 0)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    queue.remove(entry)
+                except ValueError:
+                    pass
+            raise
+
+    def backoff(self, seconds: float):
+        """Pause all grants for `seconds` (e.g. from a Retry-After header)"""
+        loop = asyncio.get_running_loop()
+        until = loop.time() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            self._tokens = 0
+            self._updated = until
+            self.backoffs += 1
+            logger.warning(f"Rate limited upstream, pausing requests for {seconds:.1f}s")
+
+    def _schedule(self, loop, delay: float):
+        if self._timer is None:
+            self._timer = loop.call_later(delay, self._dispatch)
+
+    def _dispatch(self):
+        self._timer = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if now < self._paused_until:
+            self._schedule(loop, self._paused_until - now)
+            return
+        self._refill(now)
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            while queue and self._tokens >= 1:
+                waiter, enqueued = queue.popleft()
+                if waiter.done():
+                    continue
+                self._tokens -= 1
+                waiter.set_result(None)
+                self._record(priority, now - enqueued)
+        if any(self._queues.values()):
+            self._schedule(loop, (1 - self._tokens) / self.rate)
+
+    def stats(self) -> dict:
+        """Queue depth and wait times per priority class"""
+        classes = {}
+        for priority, name in PRIORITY_NAMES.items():
+            granted = self._granted[priority]
+            classes[name] = {
+                'queued': len(self._queues[priority]),
+                'granted': granted,
+                'avg_wait': self._wait_total[priority] / granted if granted else 0.0,
+                'max_wait': self._wait_max[priority],
+            }
+        return {'classes': classes, 'backoffs': self.backoffs}
@@ -0,0 +1,99 @@
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Awaitable[Tuple[bool, str]]]
+
+class Freshness:
+    """Tracks whether something (e.g. price fetches) is currently failing, and since when"""
+
+    def __init__(self):
+        self.last_success: Optional[float] = None
+        self.failing_since: Optional[float] = None
+
+    def success(self):
+        self.last_success = time.monotonic()
+        self.failing_since = None
+
+    def failure(self):
+        if self.failing_since is None:
+            self.failing_since = time.monotonic()
+
+    def failing_for(self) -> float:
+        """Seconds since the first failure after the last success (0 if not failing)"""
+        return time.monotonic() - self.failing_since if self.failing_since is not None else 0.0
+
+class ReadinessProber:
+    """Runs readiness checks in the background and serves the cached verdict.
+
+    Every `interval` seconds all checks run concurrently, each bounded by
+    `timeout`; a check that raises or times out counts as failed. `report()`
+    only reads the cached results, so probing /ready as often as an
+    orchestrator likes costs nothing on the bot's hot path. Results older
+    than three intervals mean the prober itself is stuck (usually a blocked
+    event loop), which is reported as not ready.
+    """
+
+    def __init__(self, checks: Dict[str, Check], interval: float = 5.0, timeout: float = 2.0):
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        self._results: Dict[str, Tuple[bool, str]] = {}
+        self._updated: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_check(self, name: str) -> Tuple[bool, str]:
+        try:
+            return await asyncio.wait_for(self.checks[name](), self.timeout)
+        except asyncio.TimeoutError:
+            return False, f"timed out after {self.timeout:g}s"
+        except Exception as e:
+            return False, f"{type(e).__name__}: {e}"
+
+    async def probe(self):
+        """Run every check once and cache the results"""
+        results = await asyncio.gather(*(self._run_check(name) for name in self.checks))
+        self._results = dict(zip(self.checks, results))
+        self._updated = time.monotonic()
+        for name, (ok, detail) in self._results.items():
+            if not ok:
+                logger.warning(f"Readiness check '{name}' failing: {detail}")
+
+    def report(self) -> Tuple[bool, dict]:
+        """(ready, per-check details) from the last probe"""
+        if self._updated is None:
+            return False, {'ready': False, 'reason': 'not probed yet'}
+        age = time.monotonic() - self._updated
+        checks = {name: {'ok': ok, 'detail': detail} for name, (ok, detail) in self._results.items()}
+        ready = all(ok for ok, _ in self._results.values())
+        if age > 3 * self.interval:
+            ready = False
+            checks['prober'] = {'ok': False, 'detail': f"last probe {age:.0f}s ago"}
+        return ready, {'ready': ready, 'age': round(age, 3), 'checks': checks}
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Error probing readiness: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background prober on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Readiness prober started (every {self.interval:g}s)")
+
+    async def stop(self):
+        """Cancel the background prober"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-memory PnL and equity leaderboards
+"""
+
+import asyncio
+import logging
+
+from leaderboard import Leaderboard, RankedBoard
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def test_ranks_follow_score_updates():
+    """Users should move when their score changes, with ties broken by uid"""
+    board = RankedBoard({1: 10.0, 2: 30.0, 3: 20.0})
+    assert board.top(3) == [(2, 30.0), (3, 20.0), (1, 10.0)]
+    assert [board.rank(uid) for uid in (1, 2, 3)] == [3, 1, 2]
+
+    board.update(1, 50.0)
+    board.update(4, 20.0)
+    assert board.top(10) == [(1, 50.0), (2, 30.0), (3, 20.0), (4, 20.0)]
+    assert board.rank(4) == 4 and board.rank(99) is None
+
+    board.remove(2)
+    assert board.rank(3) == 2 and len(board) == 3
+    logger.info("✅ Ranks follow score updates")
+
+def test_equity_batch_prices_each_token_once():
+    """The equity batch should price the union of held tokens in a single lookup"""
+    async def run():
+        lookups = []
+
+        async def load_pnl():
+            return {1: 5.0}
+
+        async def load_equity():
+            positions = [(1, 'A', 10.0, 1.0), (2, 'A', 1.0, 1.0), (2, 'B', 4.0, 3.0), (3, 'C', 2.0, 0.5)]
+            return {1: 100.0, 2: 100.0, 3: 100.0}, positions
+
+        async def get_prices(tokens):
+            lookups.append(sorted(tokens))
+            return {'A': 2.0, 'B': 10.0}  # no price for C: valued at cost
+
+        board = Leaderboard(load_pnl, load_equity, get_prices)
+        await board.seed()
+        await board.rebuild_equity()
+        assert lookups == [['A', 'B', 'C']]
+        assert board.equity.top(3) == [(2, 142.0), (1, 120.0), (3, 101.0)]
+        assert board.pnl.rank(1) == 1 and board.tokens_priced == 3
+
+        board.update_pnl(2, 8.0)
+        assert board.pnl.top(2) == [(2, 8.0), (1, 5.0)]
+
+    asyncio.run(run())
+    logger.info("✅ Equity batch prices each token once")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting leaderboard tests...")
+    tests = [test_ranks_follow_score_updates, test_equity_batch_prices_each_token_once]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
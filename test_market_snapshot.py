@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script for background-refreshed market snapshots (stale-while-revalidate)
+"""
+
+import asyncio
+import logging
+
+from market_snapshot import MarketSnapshot
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def test_first_load_is_shared():
+    """Readers arriving before the first load should all wait on one fetch"""
+    async def run():
+        calls = []
+
+        async def gainers():
+            calls.append('gainers')
+            await asyncio.sleep(0.02)
+            return [{'symbol': 'UP'}]
+
+        snapshot = MarketSnapshot({'gainers': gainers}, interval=60)
+        results = await asyncio.gather(*(snapshot.get('gainers') for _ in range(10)))
+        assert calls == ['gainers']
+        assert all(data == [{'symbol': 'UP'}] and age < 0.01 for data, age in results)
+
+    asyncio.run(run())
+    logger.info("✅ The first load is shared by every waiting reader")
+
+def test_stale_read_revalidates_in_background():
+    """A stale read should return the old snapshot at once and refresh it once in the background"""
+    async def run():
+        version = [0]
+
+        async def losers():
+            version[0] += 1
+            await asyncio.sleep(0.02)
+            return [{'symbol': f"v{version[0]}"}]
+
+        snapshot = MarketSnapshot({'losers': losers}, interval=0.05)
+        await snapshot.refresh()
+        data, age = await snapshot.get('losers')
+        assert data == [{'symbol': 'v1'}] and age < 0.05  # fresh: no refresh
+
+        await asyncio.sleep(0.06)
+        stale = await asyncio.gather(snapshot.get('losers'), snapshot.get('losers'))
+        assert all(data == [{'symbol': 'v1'}] and age > 0.05 for data, age in stale)  # served stale, not awaited
+        await asyncio.sleep(0.03)
+        data, age = await snapshot.get('losers')
+        assert data == [{'symbol': 'v2'}] and age < 0.05
+        assert version[0] == 2  # both stale reads shared one revalidation
+
+    asyncio.run(run())
+    logger.info("✅ Stale reads are served immediately and revalidated once")
+
+def test_failed_or_empty_refresh_keeps_last_snapshot():
+    """A refresh that fails or comes back empty shouldn't replace the last good snapshot"""
+    async def run():
+        answers = [[{'symbol': 'OK'}], [], RuntimeError("provider down")]
+
+        async def feed():
+            answer = answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+        snapshot = MarketSnapshot({'feed': feed}, interval=60)
+        await snapshot.refresh()
+        await snapshot.refresh()  # empty
+        await snapshot.refresh()  # raises, logged
+        data, _ = await snapshot.get('feed')
+        assert data == [{'symbol': 'OK'}] and answers == []
+
+        async def down():
+            raise RuntimeError("provider down")
+
+        broken = MarketSnapshot({'feed': down}, interval=60)
+        assert await broken.get('feed') == ([], None)  # nothing loaded yet and the load failed
+
+    asyncio.run(run())
+    logger.info("✅ Failed and empty refreshes keep the last good snapshot")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting market snapshot tests...")
+    tests = [test_first_load_is_shared, test_stale_read_revalidates_in_background,
+             test_failed_or_empty_refresh_keeps_last_snapshot]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
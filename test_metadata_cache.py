@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script for the two-tier token metadata cache (runs against a throwaway SQLite file)
+"""
+
+import os
+import asyncio
+import logging
+import tempfile
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, TokenMetadata
+from metadata_cache import TokenMetadataCache
+from token_utils import ProviderError
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def make_db(directory):
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'test.db')}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+def stored(Session):
+    session = Session()
+    try:
+        return {row.address: row.symbol for row in session.query(TokenMetadata)}
+    finally:
+        session.close()
+
+class FakeSource:
+    """fetch_many stand-in that knows some mints, or is down"""
+
+    def __init__(self, known, down=False):
+        self.known = known
+        self.down = down
+        self.calls = []
+
+    async def __call__(self, addresses):
+        self.calls.append(list(addresses))
+        if self.down:
+            raise ProviderError("no provider answered get_tokens_metadata")
+        return {a: {'address': a, 'symbol': self.known[a], 'name': None, 'decimals': 6}
+                for a in addresses if a in self.known}
+
+def test_database_hit_skips_providers():
+    """Mints already in the table should be served without a provider call"""
+    async def run(directory):
+        Session = make_db(directory)
+        session = Session()
+        session.add(TokenMetadata(address='MINT1', symbol='ONE', decimals=6))
+        session.commit()
+        session.close()
+
+        source = FakeSource({})
+        cache = TokenMetadataCache(Session, source)
+        assert cache.get('MINT1') is None  # miss queues a fill, never fetches inline
+        await cache.fill(['MINT1'])
+        assert cache.symbol('MINT1') == 'ONE' and source.calls == []
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(directory))
+    logger.info("✅ Database hits skip the providers")
+
+def test_provider_fill_and_unknown_mints():
+    """Provider answers should be cached and persisted; mints it answered as unknown cached as negatives"""
+    async def run(directory):
+        Session = make_db(directory)
+        source = FakeSource({'MINT2': 'TWO'})
+        cache = TokenMetadataCache(Session, source)
+        await cache.fill(['MINT2', 'NOPE'])
+        assert source.calls == [['MINT2', 'NOPE']]
+        assert cache.symbol('MINT2') == 'TWO' and cache.label('NOPE') == 'NOPE…NOPE'
+        assert cache.get('NOPE') == {'address': 'NOPE', 'symbol': None, 'name': None, 'decimals': None}
+        assert stored(Session) == {'MINT2': 'TWO'}  # negatives live only in memory
+
+        await cache.fill(['NOPE'])
+        assert len(source.calls) == 1  # the negative isn't re-fetched
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(directory))
+    logger.info("✅ Provider answers are cached, unknown mints remembered")
+
+def test_outage_is_retried_not_cached():
+    """When no provider answers, nothing should be cached and the batch retried after a delay"""
+    async def run(directory):
+        Session = make_db(directory)
+        source = FakeSource({'MINT3': 'THREE'}, down=True)
+        cache = TokenMetadataCache(Session, source, retry_delay=0.05)
+        cache.start()
+        try:
+            cache.request(['MINT3'])
+            await asyncio.sleep(0.02)
+            assert cache.failed_fills == 1 and len(source.calls) == 1
+            assert cache.get('MINT3') is None  # no negative entry for an outage
+
+            source.down = False
+            await asyncio.sleep(0.1)
+            assert cache.symbol('MINT3') == 'THREE' and len(source.calls) == 2
+            assert stored(Session) == {'MINT3': 'THREE'}
+        finally:
+            await cache.stop()
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(directory))
+    logger.info("✅ Outages are retried with backoff instead of cached as unknown")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting token metadata cache tests...")
+    tests = [test_database_hit_skips_providers, test_provider_fill_and_unknown_mints,
+             test_outage_is_retried_not_cached]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for the Prometheus-style metrics and their instrumentation helpers
+"""
+
+import asyncio
+import logging
+
+from aiohttp import web
+from telegram import Bot
+
+from metrics import Registry, HANDLER_SECONDS, TELEGRAM_REQUESTS, instrument_handler, InstrumentedRequest
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
+
+def test_histogram_renders_cumulative_buckets():
+    """Buckets should be cumulative with +Inf, _sum and _count, one series per label set"""
+    registry = Registry()
+    latency = registry.histogram('test_seconds', 'Test latency', ('kind',), buckets=(0.1, 1.0))
+    for value, kind in ((0.05, 'a'), (0.1, 'a'), (0.5, 'a'), (7.0, 'a'), (0.2, 'b"q')):
+        latency.observe(value, kind)
+    registry.counter('test_total', 'Test count').inc()
+    registry.gauge('test_size', 'Test size', lambda: 3)
+
+    lines = registry.render().splitlines()
+    assert 'test_seconds_bucket{kind="a",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{kind="a",le="1"} 3' in lines
+    assert 'test_seconds_bucket{kind="a",le="+Inf"} 4' in lines
+    assert 'test_seconds_sum{kind="a"} 7.65' in lines
+    assert 'test_seconds_count{kind="a"} 4' in lines
+    assert 'test_seconds_count{kind="b\\"q"} 1' in lines
+    assert 'test_total 1' in lines and 'test_size 3' in lines
+    assert '# TYPE test_seconds histogram' in lines
+    logger.info("✅ Histograms render in Prometheus text format")
+
+def test_handlers_and_telegram_calls_are_counted():
+    """Wrapped handlers should be timed under their kind; Bot API calls counted by method"""
+    async def run():
+        async def handler(update, context):
+            await asyncio.sleep(0.01)
+
+        wrapped = instrument_handler(handler, 'test_handler', lambda update: update['kind'])
+        await wrapped({'kind': 'menu_buy'}, None)
+        await wrapped({'kind': 'menu_buy'}, None)
+        assert HANDLER_SECONDS.count('test_handler', 'menu_buy') == 2
+
+        async def get_me(request):
+            return web.json_response({'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Test'}})
+
+        app = web.Application()
+        app.router.add_post('/bot1:TEST/getMe', get_me)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        before = TELEGRAM_REQUESTS.value('getMe', '200')
+        async with Bot('1:TEST', base_url=f"http://127.0.0.1:{port}/bot", request=InstrumentedRequest()) as bot:
+            await bot.get_me()
+        await runner.cleanup()
+        assert TELEGRAM_REQUESTS.value('getMe', '200') == before + 2  # once on initialize, once explicitly
+
+    asyncio.run(run())
+    logger.info("✅ Handler latency and Bot API calls are recorded")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting metrics tests...")
+    tests = [test_histogram_renders_cumulative_buckets, test_handlers_and_telegram_calls_are_counted]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
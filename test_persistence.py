@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Test script for write-behind user persistence (runs against a throwaway SQLite file)
+"""
+
+import os
+import time
+import asyncio
+import logging
+import tempfile
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, User, Trade, Position
+from persistence import WriteBehind
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def make_db(directory):
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'test.db')}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    session.add_all([User(telegram_id=uid, balance=1000.0, holdings={}, realized_pnl=0.0, history=[])
+                     for uid in (1, 2)])
+    session.commit()
+    session.close()
+    return Session
+
+def rows(Session):
+    session = Session()
+    try:
+        return {u.telegram_id: (u.balance, u.realized_pnl, u.history) for u in session.query(User)}
+    finally:
+        session.close()
+
+def positions(Session):
+    session = Session()
+    try:
+        return {(p.user_id, p.token_address): (p.qty, p.avg_price) for p in session.query(Position)}
+    finally:
+        session.close()
+
+def make_writer(Session, state, **kwargs):
+    def snapshot_position(uid, token):
+        holding = state[uid]['holdings'].get(token)
+        return {'user_id': uid, 'token_address': token, 'qty': holding['qty'] if holding else None,
+                'avg_price': holding['avg_price'] if holding else None, 'updated_at': datetime(2024, 1, 1)}
+
+    return WriteBehind(Session, lambda uid: dict(state[uid], uid=uid), snapshot_position, **kwargs)
+
+def test_batched_flush_and_shutdown():
+    """Dirty users should be written in the background and drained on stop"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            Session = make_db(directory)
+            state = {
+                1: {'balance': 900.0, 'holdings': {'A': {'qty': 2.0, 'avg_price': 50.0}}, 'realized_pnl': 0.0,
+                    'history': ['🟢 Bought']},
+                2: {'balance': 1000.0, 'holdings': {}, 'realized_pnl': 0.0, 'history': []},
+            }
+            writer = make_writer(Session, state, interval=0.05)
+            writer.start()
+            writer.mark_dirty(1)
+            writer.mark_dirty(1)  # coalesced into one row
+            writer.mark_position_dirty(1, 'A')
+            writer.record_trade({'user_id': 1, 'token_address': 'A', 'token_symbol': 'AAA', 'amount': 2.0,
+                                 'price': 50.0, 'trade_type': 'buy', 'timestamp': datetime(2024, 1, 1)})
+            await asyncio.sleep(0.2)
+            assert rows(Session)[1] == (900.0, 0.0, ['🟢 Bought'])
+            assert positions(Session) == {(1, 'A'): (2.0, 50.0)}
+            assert writer.stats()['rows_written'] == 1 and writer.stats()['trades_written'] == 1
+            session = Session()
+            assert [(t.user_id, t.trade_type, t.amount) for t in session.query(Trade)] == [(1, 'buy', 2.0)]
+            session.close()
+
+            state[2].update(balance=1100.0, realized_pnl=100.0)
+            writer.mark_dirty(2)
+            await writer.stop()
+            assert rows(Session)[2][0] == 1100.0 and rows(Session)[2][1] == 100.0
+            assert len(writer) == 0
+
+    asyncio.run(run())
+    logger.info("✅ Dirty users are flushed in batches and drained on shutdown")
+
+def test_failed_flush_is_retried():
+    """A failed write should keep the users dirty for the next flush"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            Session = make_db(directory)
+            state = {1: {'balance': 42.0, 'holdings': {}, 'realized_pnl': 0.0, 'history': []}}
+            writer = make_writer(Session, state)
+            write = writer._write
+
+            def broken(rows, trades, positions):
+                raise RuntimeError("database is down")
+
+            writer._write = broken
+            writer.mark_dirty(1)
+            await writer.flush()
+            assert len(writer) == 1 and writer.failures == 1
+            assert rows(Session)[1][0] == 1000.0
+
+            writer._write = write
+            await writer.flush()
+            assert len(writer) == 0 and rows(Session)[1][0] == 42.0
+
+    asyncio.run(run())
+    logger.info("✅ Failed flushes are retried")
+
+def test_position_upsert_and_close():
+    """Positions should be upserted in place and deleted once closed"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            Session = make_db(directory)
+            state = {1: {'balance': 0.0, 'holdings': {'A': {'qty': 1.0, 'avg_price': 10.0},
+                                                      'B': {'qty': 5.0, 'avg_price': 1.0}},
+                         'realized_pnl': 0.0, 'history': []}}
+            writer = make_writer(Session, state)
+            writer.mark_position_dirty(1, 'A')
+            writer.mark_position_dirty(1, 'B')
+            await writer.flush()
+            assert positions(Session) == {(1, 'A'): (1.0, 10.0), (1, 'B'): (5.0, 1.0)}
+
+            state[1]['holdings']['A'] = {'qty': 3.0, 'avg_price': 12.0}
+            del state[1]['holdings']['B']
+            writer.mark_position_dirty(1, 'A')
+            writer.mark_position_dirty(1, 'B')
+            await writer.flush()
+            assert positions(Session) == {(1, 'A'): (3.0, 12.0)}
+            assert writer.stats()['positions_written'] == 4
+
+    asyncio.run(run())
+    logger.info("✅ Positions are upserted and deleted when closed")
+
+def test_overlapping_flushes():
+    """Flushes started while one is writing should queue behind it, keeping users dirty until written"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            Session = make_db(directory)
+            state = {1: {'balance': 10.0, 'holdings': {}, 'realized_pnl': 0.0, 'history': []},
+                     2: {'balance': 1000.0, 'holdings': {}, 'realized_pnl': 0.0, 'history': []}}
+            writer = make_writer(Session, state)
+            write = writer._write
+            written = []
+
+            def slow(rows, trades, positions):
+                time.sleep(0.1)  # the first write is still in its worker thread when the others start
+                write(rows, trades, positions)
+                written.append({row['uid']: row['balance'] for row in rows})
+
+            writer._write = slow
+            writer.mark_dirty(1)
+            first = asyncio.create_task(writer.flush())
+            await asyncio.sleep(0.02)
+
+            idle = asyncio.create_task(writer.flush())  # nothing new to write
+            state[1]['balance'] = 20.0
+            writer.mark_dirty(1)
+            writer.mark_dirty(2)
+            second = asyncio.create_task(writer.flush())
+            await asyncio.sleep(0.02)
+            assert writer.is_dirty(1)
+
+            await first
+            assert writer.is_dirty(1) and writer.is_dirty(2)  # the newer snapshot isn't written yet
+            await asyncio.gather(idle, second)
+            assert written == [{1: 10.0}, {1: 20.0, 2: 1000.0}], written
+            assert not writer.is_dirty(1) and not writer.is_dirty(2)
+            assert rows(Session)[1][0] == 20.0
+
+    asyncio.run(run())
+    logger.info("✅ Overlapping flushes are serialized and keep users dirty")
+
+def test_queued_trades_and_held_flushes():
+    """Readers should see a user's unwritten trades, and no flush should land while they hold flushes off"""
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            Session = make_db(directory)
+            state = {1: {'balance': 1000.0, 'holdings': {}, 'realized_pnl': 0.0, 'history': []}}
+            writer = make_writer(Session, state)
+            for n, user_id in enumerate((1, 2, 1)):
+                writer.record_trade({'user_id': user_id, 'token_address': 'MINT', 'token_symbol': None, 'amount': n,
+                                     'price': 1.0, 'trade_type': 'buy', 'timestamp': datetime(2024, 1, 1, 0, n)})
+            assert [row['amount'] for row in writer.queued_trades(1)] == [2, 0]  # newest first
+
+            async with writer.holding_flushes():
+                flush = asyncio.create_task(writer.flush())
+                await asyncio.sleep(0.02)
+                assert not flush.done() and len(writer.queued_trades(1)) == 2
+            await flush
+            assert writer.queued_trades(1) == []
+            session = Session()
+            try:
+                assert session.query(Trade).count() == 3
+            finally:
+                session.close()
+
+    asyncio.run(run())
+    logger.info("✅ Unwritten trades are readable and flushes can be held off")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting write-behind persistence tests...")
+    tests = [test_batched_flush_and_shutdown, test_failed_flush_is_retried, test_position_upsert_and_close,
+             test_overlapping_flushes, test_queued_trades_and_held_flushes]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
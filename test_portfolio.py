@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script for batched portfolio valuation through the price cache
+"""
+
+import asyncio
+import logging
+
+from portfolio import value_portfolio
+from price_cache import PriceCache
+from user_state import UserState, Holding
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+PRICES = {'AAA': 2.0, 'BBB': 0.5}
+
+def make_user():
+    return UserState(db_id=1, balance=100.0, holdings={
+        'AAA': Holding(10.0, 1.0),    # worth 20, up 10
+        'BBB': Holding(100.0, 1.0),   # worth 50, down 50
+        'DEAD': Holding(5.0, 3.0),    # no price anywhere
+    })
+
+def test_batched_valuation_with_unpriced_positions():
+    """All holdings should be priced in one batch; unpriced ones listed and left out of the totals"""
+    batches = []
+
+    async def fetch_many(addresses):
+        batches.append(sorted(addresses))
+        return {a: PRICES[a] for a in addresses if a in PRICES}
+
+    async def run():
+        cache = PriceCache(ttl=60)
+        get_prices = lambda addresses: cache.get_many(addresses, fetch_many)
+        portfolio = await value_portfolio(make_user(), get_prices)
+        assert batches == [['AAA', 'BBB', 'DEAD']]
+        assert portfolio['unpriced'] == ['DEAD']
+        assert [p['token'] for p in portfolio['positions']] == ['BBB', 'AAA']  # largest value first
+        assert portfolio['holdings_value'] == 70.0 and portfolio['total_equity'] == 170.0
+        assert portfolio['unrealized_pnl'] == -40.0
+
+        again = await value_portfolio(make_user(), get_prices)
+        assert again == portfolio
+        assert batches == [['AAA', 'BBB', 'DEAD'], ['DEAD']]  # priced tokens served from cache
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses']) == (2, 4), stats
+
+    asyncio.run(run())
+    logger.info("✅ Portfolio valued in one batch, unpriced positions reported")
+
+def test_empty_portfolio_skips_lookup():
+    """A user with no holdings should be valued without a price lookup"""
+    async def get_prices(addresses):
+        raise AssertionError("no lookup expected")
+
+    async def run():
+        portfolio = await value_portfolio(UserState(db_id=1, balance=42.0), get_prices)
+        assert portfolio['total_equity'] == 42.0 and portfolio['positions'] == [] and portfolio['unpriced'] == []
+
+    asyncio.run(run())
+    logger.info("✅ Empty portfolios need no price lookup")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting portfolio valuation tests...")
+    tests = [test_batched_valuation_with_unpriced_positions, test_empty_portfolio_skips_lookup]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test script for the TTL price cache and its single-flight coalescing
+"""
+
+import asyncio
+import logging
+
+from price_cache import PriceCache
+from rate_limiter import request_priority, current_priority, TRADE, VALUATION, BACKGROUND
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def test_concurrent_misses_share_one_fetch():
+    """Many concurrent lookups of one address should cause a single fetch"""
+    calls = []
+
+    async def fetch(address):
+        calls.append(address)
+        await asyncio.sleep(0.05)
+        return 1.5
+
+    async def run():
+        cache = PriceCache(ttl=60)
+        prices = await asyncio.gather(*(cache.get("TokenA", fetch) for _ in range(100)))
+        assert prices == [1.5] * 100
+        assert calls == ["TokenA"]
+        assert await cache.get("TokenA", fetch) == 1.5
+        stats = cache.stats()
+        assert (stats['misses'], stats['coalesced'], stats['hits']) == (1, 99, 1), stats
+
+    asyncio.run(run())
+    logger.info("✅ Concurrent misses were coalesced into one fetch")
+
+def test_ttl_expiry_and_eviction():
+    """Entries should expire after the TTL and the LRU entry should be evicted"""
+    async def fetch(address):
+        return float(len(address))
+
+    async def run():
+        cache = PriceCache(ttl=0.05, max_size=2)
+        await cache.get("A", fetch)
+        await cache.get("BB", fetch)
+        await cache.get("A", fetch)    # A becomes most recently used
+        await cache.get("CCC", fetch)  # evicts BB
+        assert cache.peek("A") == 1.0 and cache.peek("BB") is None
+        assert cache.stats()['evictions'] == 1
+        await asyncio.sleep(0.06)
+        assert cache.peek("A") is None
+
+    asyncio.run(run())
+    logger.info("✅ TTL expiry and LRU eviction work")
+
+def test_failed_fetch_is_not_cached():
+    """A failed lookup should propagate to all waiters and not be cached"""
+    async def failing(address):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        cache = PriceCache(ttl=60)
+        results = await asyncio.gather(*(cache.get("X", failing) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert cache.stats()['size'] == 0 and cache.stats()['inflight'] == 0
+
+    asyncio.run(run())
+    logger.info("✅ Failed fetches are shared and not cached")
+
+def test_trade_overtakes_background_fetch():
+    """A trade shouldn't wait on a background fetch, but valuation may join a trade's fetch"""
+    calls = []
+
+    async def fetch(address):
+        priority = current_priority()
+        calls.append(priority)
+        await asyncio.sleep(0.2 if priority == BACKGROUND else 0.02)  # background waits its turn
+        return 1.0 if priority == BACKGROUND else 2.0
+
+    async def run():
+        cache = PriceCache(ttl=60)
+        with request_priority(BACKGROUND):
+            background = asyncio.create_task(cache.get("TokenA", fetch))
+        await asyncio.sleep(0)
+        with request_priority(TRADE):
+            trade = asyncio.create_task(cache.get("TokenA", fetch))
+            await asyncio.sleep(0)
+        with request_priority(VALUATION):
+            valuation = asyncio.create_task(cache.get_many(["TokenA"], lambda addresses: fetch(addresses[0])))
+        started = asyncio.get_running_loop().time()
+        assert await trade == 2.0 and asyncio.get_running_loop().time() - started < 0.1
+        assert await valuation == {"TokenA": 2.0}  # joined the trade's fetch
+        assert await background == 1.0
+        assert calls == [BACKGROUND, TRADE] and cache.peek("TokenA") == 2.0  # the older fetch didn't overwrite
+        stats = cache.stats()
+        assert (stats['overtaken'], stats['coalesced'], stats['inflight']) == (1, 1, 0), stats
+
+    asyncio.run(run())
+    logger.info("✅ Trades overtake lower-priority in-flight fetches")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting price cache tests...")
+    tests = [test_concurrent_misses_share_one_fetch, test_ttl_expiry_and_eviction, test_failed_fetch_is_not_cached,
+             test_trade_overtakes_background_fetch]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
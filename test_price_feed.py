@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script for the hot price table of held tokens
+"""
+
+import asyncio
+import logging
+
+from price_feed import HotPriceTable
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def test_refcounted_subscriptions():
+    """A token should stay hot while any position references it and be dropped with the last one"""
+    batches = []
+
+    async def fetch_many(addresses):
+        batches.append(sorted(addresses))
+        return {a: 1.0 for a in addresses}
+
+    async def run():
+        table = HotPriceTable(fetch_many, interval=60)
+        table.subscribe('AAA')
+        table.subscribe('AAA')  # two users hold it
+        table.subscribe('BBB')
+        await table.refresh()
+        assert batches == [['AAA', 'BBB']] and table.get('AAA') == 1.0 and len(table) == 2
+
+        table.unsubscribe('AAA')
+        assert table.get('AAA') == 1.0  # still referenced once
+        table.unsubscribe('AAA')
+        table.unsubscribe('BBB')
+        assert table.get('AAA') is None and table.get('BBB') is None and len(table) == 0
+
+        table.unsubscribe('CCC')  # closing an untracked position is harmless
+        table.subscribe('CCC')
+        await table.refresh()
+        assert batches == [['AAA', 'BBB'], ['CCC']]  # only the live set, no rescan of users
+
+    asyncio.run(run())
+    logger.info("✅ Subscriptions are refcounted and the refresh set follows them")
+
+def test_batches_staleness_and_late_unsubscribe():
+    """Refreshes go out in batches, prices expire after max_age, and closed tokens aren't re-added"""
+    async def run():
+        batches = []
+
+        async def fetch_many(addresses):
+            batches.append(list(addresses))
+            if 'T2' in addresses:
+                table.unsubscribe('T2')  # closed while the batch was in flight
+            return {a: 2.0 for a in addresses}
+
+        table = HotPriceTable(fetch_many, interval=0.01, batch_size=2, max_age=0.05)
+        for n in range(5):
+            table.subscribe(f"T{n}")
+        await table.refresh()
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert table.get('T0') == 2.0 and table.get('T2') is None and len(table) == 4
+        await asyncio.sleep(0.06)
+        assert table.get('T0') is None  # too old to serve
+
+    asyncio.run(run())
+    logger.info("✅ Refreshes are batched, stale prices expire, closed tokens stay closed")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting hot price table tests...")
+    tests = [test_refcounted_subscriptions, test_batches_staleness_and_late_unsubscribe]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the priority-aware outbound rate limiter
+"""
+
+import asyncio
+import logging
+
+from rate_limiter import PriorityRateLimiter, request_priority, parse_retry_after, TRADE, VALUATION, BACKGROUND
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def test_trades_jump_the_queue():
+    """Queued trade requests should be granted before earlier background requests"""
+    async def run():
+        limiter = PriorityRateLimiter(rate=50, burst=1)
+        order = []
+
+        async def call(name, priority):
+            with request_priority(priority):
+                await limiter.acquire()
+            order.append(name)
+
+        await limiter.acquire()  # drain the bucket so everything below queues
+        background = [asyncio.create_task(call(f"bg{i}", BACKGROUND)) for i in range(3)]
+        await asyncio.sleep(0)
+        valuation = asyncio.create_task(call("pnl", VALUATION))
+        trade = asyncio.create_task(call("buy", TRADE))
+        await asyncio.gather(*background, valuation, trade)
+        assert order[:2] == ["buy", "pnl"], order
+        stats = limiter.stats()['classes']
+        assert stats['trade']['granted'] == 1 and stats['background']['granted'] == 3
+        assert all(cls['queued'] == 0 for cls in stats.values())
+
+    asyncio.run(run())
+    logger.info("✅ Trades are granted before valuation and background calls")
+
+def test_backoff_pauses_grants():
+    """backoff() should hold every request until Retry-After has passed"""
+    async def run():
+        loop = asyncio.get_running_loop()
+        limiter = PriorityRateLimiter(rate=1000, burst=10)
+        limiter.backoff(parse_retry_after("0.1"))
+        started = loop.time()
+        await limiter.acquire(TRADE)
+        assert loop.time() - started >= 0.09
+        assert limiter.stats()['backoffs'] == 1
+
+    asyncio.run(run())
+    assert parse_retry_after(None) == 1.0 and parse_retry_after("garbage", 2.0) == 2.0
+    logger.info("✅ Retry-After backoff pauses all grants")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting rate limiter tests...")
+    tests = [test_trades_jump_the_queue, test_backoff_pauses_grants]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for the background readiness prober
+"""
+
+import time
+import asyncio
+import logging
+
+from readiness import ReadinessProber, Freshness
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def test_report_serves_cached_results():
+    """Reports come from the last probe; failing, raising and hanging checks make it unready"""
+    async def run():
+        calls = []
+        healthy = {'database': True}
+
+        async def database():
+            calls.append('database')
+            return healthy['database'], 'ok' if healthy['database'] else 'down'
+
+        async def prices():
+            return True, 'fresh'
+
+        async def hangs():
+            await asyncio.sleep(10)
+
+        prober = ReadinessProber({'database': database, 'prices': prices}, interval=5, timeout=0.05)
+        assert prober.report()[0] is False  # not probed yet
+
+        await prober.probe()
+        for _ in range(100):
+            ready, report = prober.report()
+        assert ready and calls == ['database']  # reports don't re-run checks
+        assert report['checks']['prices'] == {'ok': True, 'detail': 'fresh'}
+
+        healthy['database'] = False
+        await prober.probe()
+        ready, report = prober.report()
+        assert not ready and report['checks']['database'] == {'ok': False, 'detail': 'down'}
+
+        prober.checks = {'slow': hangs}
+        await prober.probe()
+        ready, report = prober.report()
+        assert not ready and 'timed out' in report['checks']['slow']['detail']
+
+    asyncio.run(run())
+    logger.info("✅ Readiness is served from cached probe results")
+
+def test_stale_probe_is_unready():
+    """If the prober stops updating (e.g. a blocked loop), the cached verdict expires"""
+    async def run():
+        async def ok():
+            return True, 'ok'
+
+        prober = ReadinessProber({'ok': ok}, interval=0.01)
+        await prober.probe()
+        assert prober.report()[0]
+        time.sleep(0.05)
+        ready, report = prober.report()
+        assert not ready and not report['checks']['prober']['ok']
+
+    asyncio.run(run())
+    logger.info("✅ Stale probe results are reported as not ready")
+
+def test_freshness_tracks_failure_streaks():
+    """Failing time counts from the first failure after the last success"""
+    prices = Freshness()
+    assert prices.failing_for() == 0.0
+    prices.success()
+    time.sleep(0.02)
+    prices.failure()
+    assert prices.failing_for() < 0.01  # an idle gap before the failure doesn't count
+    time.sleep(0.02)
+    prices.failure()
+    assert prices.failing_for() >= 0.02
+    prices.success()
+    assert prices.failing_for() == 0.0
+    logger.info("✅ Failure streaks are timed from their first failure")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting readiness tests...")
+    tests = [test_report_serves_cached_results, test_stale_probe_is_unready, test_freshness_tracks_failure_streaks]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
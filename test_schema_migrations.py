@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for versioned schema migrations (runs against a throwaway SQLite file)
+"""
+
+import os
+import logging
+import tempfile
+
+from sqlalchemy import create_engine, event, inspect, select, text
+
+from models import User, Position, SchemaMigration, MIGRATIONS, run_migrations
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def test_cold_then_warm_start():
+    """A fresh database gets every migration; a warm start is a single query"""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'test.db')}")
+        with engine.connect() as conn:
+            run_migrations(conn)
+            versions = conn.execute(select(SchemaMigration.version)).scalars().all()
+            assert versions == [version for version, _, _ in MIGRATIONS]
+
+        statements = []
+        event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        with engine.connect() as conn:
+            run_migrations(conn)
+        assert len(statements) == 1, statements
+        engine.dispose()
+
+    logger.info("✅ Cold start migrates, warm start is one query")
+
+def test_legacy_database_is_upgraded():
+    """A pre-migrations database should get its holdings JSON moved into positions"""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'test.db')}")
+        with engine.begin() as conn:
+            User.__table__.create(conn)
+            conn.execute(User.__table__.insert().values(
+                telegram_id=1, holdings={'A': {'qty': 2.0, 'avg_price': 3.0}}, history=[]
+            ))
+
+        with engine.connect() as conn:
+            run_migrations(conn)
+            positions = conn.execute(select(Position.user_id, Position.token_address, Position.qty)).all()
+            assert positions == [(1, 'A', 2.0)], positions
+            assert conn.execute(select(User.holdings)).scalar() == {}
+            assert conn.execute(text("SELECT count(*) FROM trades")).scalar() == 0
+        engine.dispose()
+
+    logger.info("✅ Legacy databases are upgraded in place")
+
+def test_referral_counts_are_backfilled():
+    """Users from before referral_count existed should get it counted from referral_id"""
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'test.db')}")
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, telegram_id BIGINT UNIQUE, username VARCHAR,"
+                " balance FLOAT, holdings JSON, realized_pnl FLOAT, history JSON, context JSON,"
+                " referred_by BIGINT, created_at DATETIME, last_broadcast_message_id INTEGER)"
+            ))
+            conn.execute(text("INSERT INTO users (telegram_id, referred_by) VALUES (1, NULL), (2, 1), (3, 1), (4, 2)"))
+
+        with engine.connect() as conn:
+            run_migrations(conn)
+            counts = conn.execute(select(User.telegram_id, User.referral_count).order_by(User.telegram_id)).all()
+            assert counts == [(1, 2), (2, 1), (3, 0), (4, 0)], counts
+            indexes = {index['name'] for index in inspect(conn).get_indexes('users')}
+            assert {'ix_users_referral_id', 'ix_users_referral_count'} <= indexes, indexes
+        engine.dispose()
+
+    logger.info("✅ Referral counts are indexed and backfilled")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting schema migration tests...")
+    tests = [test_cold_then_warm_start, test_legacy_database_is_upgraded, test_referral_counts_are_backfilled]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script for the on-disk price tick store
+"""
+
+import os
+import asyncio
+import logging
+import tempfile
+import threading
+
+from tick_store import TickStore
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+TOKEN = "DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263"
+
+def test_range_across_segments_and_buffer():
+    """Range queries should span sealed segments, the active segment and unflushed ticks"""
+    async def run():
+        with tempfile.TemporaryDirectory() as root:
+            store = TickStore(root, segment_ticks=100)
+            for i in range(250):
+                store.append(TOKEN, 1000.0 + i, float(i))
+            await store.flush()
+            for i in range(250, 260):
+                store.append(TOKEN, 1000.0 + i, float(i))  # still buffered
+
+            ts, px = store.range(TOKEN, 1095.0, 1255.0)
+            assert list(ts) == [1000.0 + i for i in range(95, 255)]
+            assert list(px) == [float(i) for i in range(95, 255)]
+            assert store.count(TOKEN) == 260
+
+            await store.stop()
+            reopened = TickStore(root, segment_ticks=100)
+            assert reopened.count(TOKEN) == 260
+            reopened.append(TOKEN, 0.0, 1.0)  # out-of-order timestamps are clamped once flushed
+            await reopened.flush()
+            assert reopened.range(TOKEN, 1259.0, 1260.0)[1].tolist() == [259.0, 1.0]
+
+    asyncio.run(run())
+    logger.info("✅ Range queries span segments, disk and buffer")
+
+def test_ohlc_downsampling():
+    """Ticks should be bucketed into open/high/low/close bars"""
+    async def run():
+        with tempfile.TemporaryDirectory() as root:
+            store = TickStore(root)
+            for ts, price in [(0, 5.0), (10, 7.0), (20, 4.0), (59, 6.0), (60, 6.5), (130, 9.0)]:
+                store.append(TOKEN, float(ts), price)
+            await store.flush()
+            bars = store.ohlc(TOKEN, 0, 200, 60)
+            assert bars == [(0.0, 5.0, 7.0, 4.0, 6.0, 4), (60.0, 6.5, 6.5, 6.5, 6.5, 1), (120.0, 9.0, 9.0, 9.0, 9.0, 1)], bars
+            await store.stop()
+
+    asyncio.run(run())
+    logger.info("✅ OHLC downsampling works")
+
+def test_appends_never_touch_disk_on_the_loop():
+    """The store directory is made by start(), and the last on-disk tick is read by the flush worker"""
+    async def run():
+        with tempfile.TemporaryDirectory() as parent:
+            root = os.path.join(parent, 'ticks')
+            store = TickStore(root)
+            assert not os.path.exists(root)
+            store.start(flush_interval=60)
+            assert os.path.isdir(root)
+            store.append(TOKEN, 100.0, 1.0)
+            await store.stop()
+
+            reopened = TickStore(root)
+            read_on = []
+            last_on_disk = reopened._last_timestamp_on_disk
+
+            def tracked(address, counts):
+                read_on.append(threading.current_thread() is threading.main_thread())
+                return last_on_disk(address, counts)
+
+            reopened._last_timestamp_on_disk = tracked
+            reopened.append(TOKEN, 50.0, 2.0)  # behind the tick on disk
+            reopened.append(TOKEN, 40.0, 3.0)
+            assert read_on == []
+            await reopened.flush()
+            reopened.append(TOKEN, 60.0, 4.0)  # the floor is known now
+            await reopened.stop()
+            assert read_on == [False]
+            ts, px = reopened.range(TOKEN, 0.0, 1000.0)
+            assert ts.tolist() == [100.0] * 4 and px.tolist() == [1.0, 2.0, 3.0, 4.0]
+
+    asyncio.run(run())
+    logger.info("✅ Appends stay off the disk; the flush worker applies the on-disk floor")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting tick store tests...")
+    tests = [test_range_across_segments_and_buffer, test_ohlc_downsampling,
+             test_appends_never_touch_disk_on_the_loop]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for the local token search index and its remote fallback
+"""
+
+import asyncio
+import logging
+
+from token_index import TokenSearchIndex
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+UNIVERSE = [
+    {'address': 'BONKaddr', 'symbol': 'BONK', 'name': 'Bonk', 'v24hUSD': 5_000_000},
+    {'address': 'BONKAIaddr', 'symbol': 'BONKAI', 'name': 'Bonk AI', 'v24hUSD': 9_000_000},
+    {'address': 'BOMEaddr', 'symbol': 'BOME', 'name': 'Book of Meme', 'v24hUSD': 7_000_000},
+    {'address': 'WIFaddr', 'symbol': 'WIF', 'name': 'dogwifhat', 'v24hUSD': 8_000_000},
+    {'address': 'POPCATaddr', 'symbol': 'POPCAT', 'name': 'Popcat', 'v24hUSD': 3_000_000},
+]
+
+def make_index(remote_results=None):
+    calls = []
+
+    async def load_universe():
+        return list(UNIVERSE)
+
+    async def remote_search(query):
+        calls.append(query)
+        return list(remote_results or [])
+
+    return TokenSearchIndex(load_universe, remote_search), calls
+
+def test_prefix_and_fuzzy_ranking():
+    """Prefix matches on symbol or name words, fuzzy symbol matches, all ranked by volume"""
+    async def run():
+        index, calls = make_index()
+        await index.refresh()
+        assert len(index) == 5
+
+        assert [t['symbol'] for t in index.lookup('bon')] == ['BONKAI', 'BONK']  # BONKAI trades more
+        assert [t['symbol'] for t in index.lookup('meme')] == ['BOME']  # a word of the name
+        assert [t['symbol'] for t in index.lookup('POPCT')] == ['POPCAT']  # typo, trigram match
+        assert index.lookup('WIFaddr') == [UNIVERSE[3]]  # a pasted address
+        assert [t['symbol'] for t in index.lookup('b', limit=2)] == ['BONKAI', 'BOME']
+        assert index.lookup('   ') == []
+        assert calls == []
+
+    asyncio.run(run())
+    logger.info("✅ Prefix and fuzzy matches are ranked by volume")
+
+def test_remote_fallback_merges_back():
+    """Only a local miss goes remote, and what it finds is answered locally next time"""
+    async def run():
+        remote = [{'address': 'MEWaddr', 'symbol': 'MEW', 'name': 'cat in a dogs world', 'v24hUSD': 4_000_000}]
+        index, calls = make_index(remote)
+        await index.refresh()
+
+        assert [t['symbol'] for t in await index.search('bonk')] == ['BONKAI', 'BONK']
+        assert calls == [] and index.local_hits == 1
+
+        assert [t['symbol'] for t in await index.search(' mew ')] == ['MEW']
+        assert calls == ['mew'] and index.remote_fallbacks == 1
+
+        assert [t['symbol'] for t in await index.search('MEW')] == ['MEW']
+        assert [t['symbol'] for t in await index.search('dogs')] == ['MEW']  # name words indexed too
+        assert calls == ['mew'] and index.local_hits == 3
+
+        await index.refresh()  # a rebuild replaces the universe, merged tokens included
+        assert index.lookup('mew') == []
+
+    asyncio.run(run())
+    logger.info("✅ Remote fallbacks are merged into the local index")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting token search index tests...")
+    tests = [test_prefix_and_fuzzy_ranking, test_remote_fallback_merges_back]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
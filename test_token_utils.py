@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Test script for the market-data provider layer: hedging, failover and circuit breaking
+"""
+
+import asyncio
+import logging
+
+from token_utils import TokenUtils, MarketDataProvider, ProviderError, PRICE, CATALOG
+from circuit_breaker import CircuitBreaker
+from rate_limiter import PriorityRateLimiter
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+class FakeProvider(MarketDataProvider):
+    """Provider that answers after a fixed delay, or fails"""
+
+    def __init__(self, name, delay=0.0, price=1.0, fail=False, timeout=1.0, circuit_breakers=None, rate_limiter=None):
+        super().__init__(timeout=timeout, circuit_breakers=circuit_breakers, rate_limiter=rate_limiter)
+        self.name = name
+        self.delay = delay
+        self.price = price
+        self.fail = fail
+        self.calls = 0
+
+    async def get_price(self, token_address):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ProviderError(f"{self.name} is down", 503)
+        return self.price
+
+class FakeSearchProvider(FakeProvider):
+    """FakeProvider that can also search"""
+
+    async def search_tokens(self, query):
+        self.calls += 1
+        if self.fail:
+            raise ProviderError(f"{self.name} is down", 503)
+        return [{'symbol': query}]
+
+    async def get_tokens_metadata(self, token_addresses):
+        self.calls += 1
+        if self.fail:
+            raise ProviderError(f"{self.name} is down", 503)
+        return {}
+
+def test_failover_to_next_provider():
+    """A failing primary should fail over to the secondary"""
+    async def run():
+        primary = FakeProvider('primary', fail=True)
+        secondary = FakeProvider('secondary', price=2.0)
+        utils = TokenUtils([primary, secondary], hedging=False)
+        assert await utils.get_token_price("A") == 2.0
+        assert utils.stats()['failovers'] == 1
+
+    asyncio.run(run())
+    logger.info("✅ Failed primary fails over to secondary")
+
+def test_slow_primary_is_hedged():
+    """A primary slower than the hedge delay should be raced by the secondary"""
+    async def run():
+        primary = FakeProvider('primary', delay=0.5, price=1.0)
+        secondary = FakeProvider('secondary', delay=0.01, price=2.0)
+        utils = TokenUtils([primary, secondary], hedge_delay=0.05)
+        started = asyncio.get_running_loop().time()
+        assert await utils.get_token_price("A") == 2.0
+        assert asyncio.get_running_loop().time() - started < 0.3
+        assert utils.stats()['hedges_fired'] == 1
+
+    asyncio.run(run())
+    logger.info("✅ Slow primary is hedged by secondary")
+
+def test_timeout_and_all_failed():
+    """A provider past its timeout counts as failed; no answer at all gives None"""
+    async def run():
+        stuck = FakeProvider('stuck', delay=5.0, timeout=0.05)
+        down = FakeProvider('down', fail=True)
+        utils = TokenUtils([stuck, down], hedging=False)
+        assert await utils.get_token_price("A") is None
+        assert stuck.calls == 1 and down.calls == 1
+        assert await utils.search_tokens("BONK") == []  # no provider implements search
+
+    asyncio.run(run())
+    logger.info("✅ Timeouts fail over and exhausted providers return None")
+
+def test_open_breaker_fails_fast():
+    """After repeated outages the breaker should open and calls should skip the provider"""
+    async def run():
+        breaker = CircuitBreaker('down', failure_rate=0.5, min_calls=3, open_for=0.1)
+        down = FakeProvider('down', fail=True, circuit_breakers={PRICE: breaker})
+        utils = TokenUtils([down], hedging=False)
+        for _ in range(3):
+            assert await utils.get_token_price("A") is None
+        assert breaker.state == CircuitBreaker.OPEN and not utils.is_available()
+        assert await utils.get_token_price("A") is None
+        assert down.calls == 3  # rejected without calling the provider
+
+        await asyncio.sleep(0.11)
+        down.fail = False
+        assert await utils.get_token_price("A") == 1.0  # half-open probe succeeds
+        assert breaker.state == CircuitBreaker.CLOSED and utils.is_available()
+
+    asyncio.run(run())
+    logger.info("✅ Open breaker fails fast and recovers through a half-open probe")
+
+def test_rate_limit_wait_is_not_timed():
+    """Waiting for a rate-limit slot must not time the call out or count against the breaker"""
+    async def run():
+        limiter = PriorityRateLimiter(rate=100)
+        breaker = CircuitBreaker('limited', failure_rate=0.5, min_calls=1)
+        limited = FakeProvider('limited', delay=0.01, timeout=0.1, circuit_breakers={PRICE: breaker},
+                               rate_limiter=limiter)
+        utils = TokenUtils([limited], hedging=False)
+        limiter.backoff(0.3)  # e.g. a 429 with Retry-After: longer than the provider timeout
+        started = asyncio.get_running_loop().time()
+        assert await utils.get_token_price("A") == 1.0
+        assert asyncio.get_running_loop().time() - started >= 0.3
+        assert breaker.state == CircuitBreaker.CLOSED and utils.is_available()
+        assert max(utils.latency['limited']._samples) < 0.1  # only the request itself is timed
+
+    asyncio.run(run())
+    logger.info("✅ Rate-limit waits happen before the provider timeout starts")
+
+def test_catalog_failures_dont_block_pricing():
+    """Failing search calls should open only the catalog breaker, not the price one"""
+    async def run():
+        price_breaker = CircuitBreaker('flaky:price', failure_rate=0.5, min_calls=3)
+        catalog_breaker = CircuitBreaker('flaky:catalog', failure_rate=0.5, min_calls=3)
+        flaky = FakeSearchProvider('flaky', circuit_breakers={PRICE: price_breaker, CATALOG: catalog_breaker})
+        utils = TokenUtils([flaky], hedging=False)
+        flaky.fail = True
+        for _ in range(3):
+            assert await utils.search_tokens("BONK") == []
+        assert catalog_breaker.state == CircuitBreaker.OPEN and not utils.is_available('search_tokens')
+        assert price_breaker.state == CircuitBreaker.CLOSED and utils.is_available()
+        flaky.fail = False
+        assert await utils.get_token_price("A") == 1.0
+        assert set(utils.stats()['breakers']) == {'flaky:price', 'flaky:catalog'}
+
+    asyncio.run(run())
+    logger.info("✅ Catalog outages leave the price breaker closed")
+
+def test_metadata_outage_vs_unknown():
+    """Metadata lookups should raise when nobody answered, but return {} for unknown mints"""
+    async def run():
+        source = FakeSearchProvider('source', fail=True)
+        utils = TokenUtils([source], hedging=False)
+        try:
+            await utils.get_tokens_metadata(["A"])
+            assert False, "expected ProviderError"
+        except ProviderError:
+            pass
+        source.fail = False
+        assert await utils.get_tokens_metadata(["A"]) == {}
+
+    asyncio.run(run())
+    logger.info("✅ Metadata outages raise, unknown mints come back empty")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting market data provider tests...")
+    tests = [test_failover_to_next_provider, test_slow_primary_is_hedged, test_timeout_and_all_failed,
+             test_open_breaker_fails_fast, test_rate_limit_wait_is_not_timed,
+             test_catalog_failures_dont_block_pricing, test_metadata_outage_vs_unknown]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
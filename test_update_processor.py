@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test script for per-user serialized concurrent update processing
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+
+from update_processor import PerUserUpdateProcessor
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def make_update(update_id, uid):
+    user = User(id=uid, first_name=f"user{uid}", is_bot=False)
+    message = Message(message_id=update_id, date=datetime.now(), chat=Chat(id=uid, type='private'), from_user=user)
+    return Update(update_id=update_id, message=message)
+
+def test_one_user_in_order_users_in_parallel():
+    """A user's updates should run one at a time in arrival order while other users overlap"""
+    async def run():
+        processor = PerUserUpdateProcessor(max_concurrent_updates=8)
+        log = []
+
+        async def handle(uid, n):
+            log.append(('start', uid, n))
+            await asyncio.sleep(0.02)
+            log.append(('end', uid, n))
+
+        updates = [(uid, n) for n in range(3) for uid in (1, 2)]
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(*(processor.process_update(make_update(i, uid), handle(uid, n)) for i, (uid, n) in enumerate(updates)))
+        elapsed = asyncio.get_running_loop().time() - started
+
+        for uid in (1, 2):
+            events = [(kind, n) for kind, u, n in log if u == uid]
+            assert events == [('start', 0), ('end', 0), ('start', 1), ('end', 1), ('start', 2), ('end', 2)], events
+        assert elapsed < 0.1, elapsed  # two users overlapped: ~3 sleeps, not 6
+        stats = processor.stats()
+        assert stats['peak_running'] == 2 and stats['processed'] == 6 and stats['serialized'] == 4, stats
+        assert stats['user_locks'] == 0  # idle users' locks were dropped
+
+    asyncio.run(run())
+    logger.info("✅ Per-user order kept, users processed concurrently")
+
+def test_concurrency_cap():
+    """No more than max_concurrent_updates handlers should run at once"""
+    async def run():
+        processor = PerUserUpdateProcessor(max_concurrent_updates=3)
+
+        async def handle():
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(processor.process_update(make_update(uid, uid), handle()) for uid in range(20)))
+        stats = processor.stats()
+        assert stats['peak_running'] == 3 and stats['processed'] == 20, stats
+
+    asyncio.run(run())
+    logger.info("✅ Concurrency is capped")
+
+def test_only_queued_updates_count_as_stalled():
+    """A slow handler alone isn't a stall; updates left waiting behind it are"""
+    async def run():
+        processor = PerUserUpdateProcessor(max_concurrent_updates=4)
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+
+        async def quick():
+            pass
+
+        assert processor.backlog == 0 and processor.stalled_for() == 0.0
+        slow = asyncio.create_task(processor.process_update(make_update(1, 1), blocked()))
+        await asyncio.sleep(0.05)
+        assert processor.backlog == 1 and processor.stalled_for() == 0.0  # running, nothing waiting
+
+        queued = asyncio.create_task(processor.process_update(make_update(2, 1), quick()))  # behind it
+        await asyncio.sleep(0.05)
+        assert processor.backlog == 2 and processor.stats()['queued'] == 1
+        assert processor.stalled_for() >= 0.05
+
+        await processor.process_update(make_update(3, 2), quick())  # another user doesn't clear it
+        assert processor.stalled_for() >= 0.05
+
+        release.set()
+        await asyncio.gather(slow, queued)
+        assert processor.backlog == 0 and processor.stalled_for() == 0.0 and processor.processed == 3
+
+    asyncio.run(run())
+    logger.info("✅ Only updates waiting to start count as a stall")
+
+def test_cancelled_while_queued_is_finished():
+    """An update cancelled while waiting on its user's lock shouldn't stay in the backlog"""
+    async def run():
+        processor = PerUserUpdateProcessor(max_concurrent_updates=4)
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+
+        async def never():
+            raise AssertionError("cancelled update ran")
+
+        slow = asyncio.create_task(processor.process_update(make_update(1, 1), blocked()))
+        await asyncio.sleep(0)
+        handler = never()
+        waiting = asyncio.create_task(processor.process_update(make_update(2, 1), handler))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        handler.close()
+        assert processor.backlog == 1 and processor.stalled_for() == 0.0, processor.stats()
+
+        release.set()
+        await slow
+        assert processor.backlog == 0 and processor.processed == 2 and not processor.busy(1)
+
+    asyncio.run(run())
+    logger.info("✅ Cancelled queued updates leave the backlog")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting update processor tests...")
+    tests = [test_one_user_in_order_users_in_parallel, test_concurrency_cap,
+             test_only_queued_updates_count_as_stalled, test_cancelled_while_queued_is_finished]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
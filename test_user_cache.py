@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for the bounded user-state cache
+"""
+
+import asyncio
+import logging
+
+from user_cache import UserStateCache
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+def test_load_on_miss_is_coalesced():
+    """Concurrent misses should share one load; unknown users return None"""
+    async def run():
+        loads = []
+
+        async def load(uid):
+            loads.append(uid)
+            await asyncio.sleep(0.01)
+            return {'balance': float(uid)} if uid < 100 else None
+
+        cache = UserStateCache(load, capacity=10)
+        first, second = await asyncio.gather(cache.get(1), cache.get(1))
+        assert first is second and first == {'balance': 1.0}
+        assert await cache.get(1) is first
+        assert await cache.get(500) is None and 500 not in cache
+        assert loads == [1, 500]
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['coalesced'], stats['not_found']) == (1, 2, 1, 1)
+
+    asyncio.run(run())
+    logger.info("✅ Misses load once and unknown users aren't cached")
+
+def test_lru_eviction_skips_dirty_users():
+    """The least recently used clean user is evicted; dirty users wait for their write"""
+    async def run():
+        dirty = {1}
+        evicted = []
+
+        async def load(uid):
+            return {'uid': uid}
+
+        cache = UserStateCache(load, capacity=2, is_dirty=lambda uid: uid in dirty,
+                               on_evict=lambda uid, state: evicted.append(uid))
+        await cache.get(1)
+        await cache.get(2)
+        await cache.get(3)  # over capacity: 1 is oldest but dirty, so 2 goes
+        assert evicted == [2] and 1 in cache and 3 in cache
+
+        dirty.clear()  # flushed
+        await cache.get(4)
+        assert evicted == [2, 1] and len(cache) == 2
+
+        state = {'uid': 1, 'balance': 5.0}
+        cache.restore(1, state)  # a handler finishing an update on an evicted user puts it back
+        assert cache.peek(1) is state and evicted == [2, 1, 3]
+
+    asyncio.run(run())
+    logger.info("✅ LRU eviction never drops unwritten users")
+
+def test_restore_merges_into_reloaded_state():
+    """A handler's copy of a user reloaded mid-update should be merged into the resident copy"""
+    async def run():
+        busy = set()
+        inserted = []
+
+        async def load(uid):
+            return {'uid': uid, 'balance': 100.0}
+
+        cache = UserStateCache(load, capacity=1, is_dirty=lambda uid: uid in busy,
+                               on_insert=lambda uid, state: inserted.append(uid), merge=dict.update)
+        handler_copy = await cache.get(1)
+        busy.add(1)  # an update for user 1 is in flight
+        await cache.get(2)
+        assert 1 in cache and 2 not in cache  # the busy user is pinned, the newcomer trimmed
+        busy.clear()
+
+        await cache.get(2)  # now user 1 is evicted...
+        reloaded = await cache.get(1)  # ...and loaded again while the handler still holds its copy
+        assert reloaded is not handler_copy
+        handler_copy['balance'] = 50.0
+        assert cache.restore(1, handler_copy) is reloaded
+        assert cache.peek(1) is reloaded and reloaded['balance'] == 50.0
+        assert inserted == [1, 2, 2, 1, 1]  # on_insert re-run for the merged state
+
+    asyncio.run(run())
+    logger.info("✅ Busy users are pinned and late updates merge into the resident state")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting user cache tests...")
+    tests = [test_load_on_miss_is_coalesced, test_lru_eviction_skips_dirty_users,
+             test_restore_merges_into_reloaded_state]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
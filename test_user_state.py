@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Test script for the compact in-memory user state
+"""
+
+import json
+import logging
+
+from user_state import UserState, Holding
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+TOKEN = "DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263"
+
+def test_addresses_are_shared():
+    """The same token held by two users should be one string object"""
+    a = UserState(1, 100.0, holdings={json.loads(json.dumps(TOKEN)): Holding(1.0, 2.0)})
+    b = UserState(2, 100.0)
+    b.set_holding(json.loads(json.dumps(TOKEN)), 3.0, 4.0)
+    assert next(iter(a.holdings)) is next(iter(b.holdings))
+    assert b.holdings[TOKEN].qty == 3.0 and b.holdings[TOKEN].avg_price == 4.0
+    logger.info("✅ Token addresses are interned")
+
+def test_history_window_round_trips():
+    """History entries should come back as the same strings, capped to the window"""
+    user = UserState(1, 100.0, history=["🎁 Referral bonus: +$500.0"])
+    for i in range(5):
+        user.add_history(f"🟢 Bought {i}.0000 of {TOKEN} at $1.0000", window=3)
+    assert user.history == [f"🟢 Bought {i}.0000 of {TOKEN} at $1.0000" for i in (2, 3, 4)]
+    logger.info("✅ History round-trips and is capped")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting user state tests...")
+    tests = [test_addresses_are_shared, test_history_window_round_trips]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test script for webhook mode, against a local fake Bot API server
+"""
+
+import asyncio
+import logging
+
+import aiohttp
+from aiohttp import web
+from telegram.ext import Application, CommandHandler
+
+from webhook import TelegramWebhook, SECRET_HEADER
+
+# Configure logging
+logging.basicConfig(
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
+
+TOKEN = "123456:TEST"
+SECRET = "s3cret"
+
+async def start_site(app):
+    """Serve an aiohttp app on a free local port"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+async def start_fake_bot_api(calls):
+    """Pretend to be the Bot API, recording each method call and its parameters"""
+    async def method(request):
+        name = request.match_info['method']
+        params = dict(await request.post())
+        calls.append((name, params))
+        if name == 'getMe':
+            result = {'id': 123456, 'is_bot': True, 'first_name': 'Test', 'username': 'test_bot'}
+        elif name == 'sendMessage':
+            result = {'message_id': 1, 'date': 0, 'chat': {'id': int(params['chat_id']), 'type': 'private'},
+                      'text': params['text']}
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    app = web.Application()
+    app.router.add_post(f'/bot{TOKEN}/{{method}}', method)
+    return await start_site(app)
+
+def make_update(update_id, text):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id, 'date': 0, 'text': text,
+            'chat': {'id': 42, 'type': 'private'},
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'Alice'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}],
+        },
+    }
+
+def test_webhook_updates_reach_handlers():
+    """Updates with the right secret are handled; others are refused without reaching the bot"""
+    async def run():
+        calls = []
+        api_runner, api_url = await start_fake_bot_api(calls)
+
+        async def start(update, context):
+            await update.message.reply_text("hello")
+
+        application = Application.builder().token(TOKEN).base_url(f"{api_url}/bot").build()
+        application.add_handler(CommandHandler("start", start))
+        hook = TelegramWebhook(application, SECRET)
+        app = web.Application()
+        hook.add_routes(app)
+        web_runner, web_url = await start_site(app)
+
+        async with application:
+            await application.start()
+            await hook.register("https://bot.example.com/")
+            async with aiohttp.ClientSession() as session:
+                url = f"{web_url}/telegram"
+                async with session.post(url, json=make_update(1, "/start")) as response:
+                    assert response.status == 403
+                async with session.post(url, json=make_update(2, "/start"), headers={SECRET_HEADER: "wrong"}) as response:
+                    assert response.status == 403
+                async with session.post(url, data="not json", headers={SECRET_HEADER: SECRET}) as response:
+                    assert response.status == 400
+                async with session.post(url, json=make_update(3, "/start"), headers={SECRET_HEADER: SECRET}) as response:
+                    assert response.status == 200
+
+            for _ in range(100):
+                if any(name == 'sendMessage' for name, _ in calls):
+                    break
+                await asyncio.sleep(0.01)
+            await application.stop()
+
+        await web_runner.cleanup()
+        await api_runner.cleanup()
+
+        webhook_params = next(params for name, params in calls if name == 'setWebhook')
+        assert webhook_params['url'] == "https://bot.example.com/telegram"
+        assert webhook_params['secret_token'] == SECRET
+        sent = [params for name, params in calls if name == 'sendMessage']
+        assert len(sent) == 1 and sent[0]['text'] == "hello" and sent[0]['chat_id'] == "42", sent
+        assert hook.stats() == {'received': 1, 'rejected': 2, 'malformed': 1}
+
+    asyncio.run(run())
+    logger.info("✅ Webhook updates reach handlers and bad requests are rejected")
+
+def main():
+    """Run all tests"""
+    logger.info("🧪 Starting webhook tests...")
+    tests = [test_webhook_updates_reach_handlers]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except Exception as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} failed: {e!r}")
+    if failed:
+        logger.error("❌ Some tests failed")
+        return False
+    logger.info("🎉 All tests passed!")
+    return True
+
+if __name__ == "__main__":
+    exit(0 if main() else 1)
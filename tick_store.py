@@ -0,0 +1,252 @@
+import os
+import re
+import mmap
+import bisect
+import asyncio
+import logging
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_TICKS = 1 << 20  # ticks per segment file (8 MiB per column)
+_SAFE_NAME = re.compile(r"[1-9A-HJ-NP-Za-km-z]{32,44}")
+
+class TickStore:
+    """Append-only on-disk store of (timestamp, price) ticks per token.
+
+    Each token has a directory of fixed-size segments, and each segment is
+    two raw float64 columns (`NNNNNN.ts` and `NNNNNN.px`). Appends are
+    buffered in memory and flushed in the background; reads memory-map the
+    segment files and binary-search the timestamp column, so a range query
+    only touches the segments and rows it returns. Timestamps are Unix
+    seconds and are kept non-decreasing per token: appends are clamped to
+    the previous buffered tick, and to the last tick on disk once the flush
+    worker has read it, so append() never touches the disk.
+    """
+
+    def __init__(self, root: str, segment_ticks: int = SEGMENT_TICKS):
+        self.root = root
+        self.segment_ticks = segment_ticks
+        self._buffers: Dict[str, Tuple[array, array]] = {}  # appended, not yet handed to the writer
+        self._writing: Dict[str, Tuple[array, array]] = {}  # being written by a flush
+        self._segments: Dict[str, List[int]] = {}  # durable tick count per segment
+        self._last_ts: Dict[str, float] = {}  # last appended timestamp, floored by disk once loaded
+        self._disk_floor_loaded: set = set()  # tokens whose last on-disk timestamp is folded into _last_ts
+        self._sealed_maps: Dict[Tuple[str, int, str], mmap.mmap] = {}
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flush_interval = 5.0
+
+    def _path(self, address: str, segment: int, column: str) -> str:
+        return os.path.join(self.root, address, f"{segment:06d}.{column}")
+
+    def _discover(self, address: str) -> List[int]:
+        """Durable tick counts per segment, read from disk"""
+        counts = []
+        directory = os.path.join(self.root, address)
+        if os.path.isdir(directory):
+            segment = 0
+            while os.path.exists(self._path(address, segment, 'ts')):
+                # A torn write can leave the columns uneven; trust the shorter one
+                ts_size = os.path.getsize(self._path(address, segment, 'ts'))
+                px_size = os.path.getsize(self._path(address, segment, 'px')) \
+                    if os.path.exists(self._path(address, segment, 'px')) else 0
+                counts.append(min(ts_size, px_size) // 8)
+                segment += 1
+        return counts
+
+    def _segment_counts(self, address: str) -> List[int]:
+        """Durable tick counts per segment, discovered from disk on first use"""
+        counts = self._segments.get(address)
+        if counts is None:
+            counts = self._segments[address] = self._discover(address)
+        return counts
+
+    def append(self, address: str, timestamp: float, price: float):
+        """Record one tick (buffered until the next flush)"""
+        if not _SAFE_NAME.fullmatch(address):
+            return
+        timestamp = max(timestamp, self._last_ts.get(address, timestamp))
+        self._last_ts[address] = timestamp
+        buffer = self._buffers.get(address)
+        if buffer is None:
+            buffer = self._buffers[address] = (array('d'), array('d'))
+        buffer[0].append(timestamp)
+        buffer[1].append(price)
+
+    def _last_timestamp_on_disk(self, address: str, counts: List[int]) -> float:
+        for segment in range(len(counts) - 1, -1, -1):
+            if counts[segment]:
+                with open(self._path(address, segment, 'ts'), 'rb') as f:
+                    f.seek((counts[segment] - 1) * 8)
+                    return array('d', f.read(8))[0]
+        return float('-inf')
+
+    @staticmethod
+    def _clamp(timestamps: array, floor: float):
+        """Raise the leading timestamps of a sorted column that fall below `floor`"""
+        below = bisect.bisect_left(timestamps, floor)
+        if below:
+            timestamps[:below] = array('d', [floor]) * below
+
+    def _write(self, pending: Dict[str, Tuple[array, array]], counts: Dict[str, Optional[List[int]]],
+               floors: Dict[str, float]) -> Dict[str, List[int]]:
+        """Append buffered ticks to segment files (runs in a worker thread).
+
+        Tokens with no known segment counts are discovered here, and tokens
+        listed in `floors` get their last on-disk timestamp read and applied
+        to the pending ticks first; `floors` is filled in for the caller.
+        """
+        for address, (timestamps, prices) in pending.items():
+            if counts[address] is None:
+                counts[address] = self._discover(address)
+            segments = counts[address]
+            if address in floors:
+                floors[address] = self._last_timestamp_on_disk(address, segments)
+                self._clamp(timestamps, floors[address])
+            os.makedirs(os.path.join(self.root, address), exist_ok=True)
+            offset = 0
+            while offset < len(timestamps):
+                if not segments or segments[-1] >= self.segment_ticks:
+                    segments.append(0)
+                segment = len(segments) - 1
+                room = self.segment_ticks - segments[-1]
+                chunk = slice(offset, offset + room)
+                for column, values in (('ts', timestamps), ('px', prices)):
+                    with open(self._path(address, segment, column), 'r+b' if segments[-1] else 'wb') as f:
+                        f.seek(segments[-1] * 8)  # overwrite any torn tail past the durable count
+                        f.write(values[chunk].tobytes())
+                        f.truncate()
+                written = len(timestamps[chunk])
+                segments[-1] += written
+                offset += written
+        return counts
+
+    async def flush(self):
+        """Write all buffered ticks to disk"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffers:
+                return
+            self._writing, self._buffers = self._buffers, {}
+            counts = {address: list(self._segments[address]) if address in self._segments else None
+                      for address in self._writing}
+            floors = {address: float('-inf') for address in self._writing if address not in self._disk_floor_loaded}
+            try:
+                counts = await asyncio.to_thread(self._write, self._writing, counts, floors)
+                self._segments.update(counts)
+                for address, floor in floors.items():
+                    # Ticks appended while the worker ran haven't seen the on-disk floor yet
+                    self._disk_floor_loaded.add(address)
+                    self._last_ts[address] = max(self._last_ts[address], floor)
+                    if address in self._buffers:
+                        self._clamp(self._buffers[address][0], floor)
+            except Exception:
+                # Put the ticks back in front of anything appended meanwhile so nothing is lost
+                for address, (timestamps, prices) in self._writing.items():
+                    newer = self._buffers.get(address)
+                    if newer is not None:
+                        timestamps.extend(newer[0])
+                        prices.extend(newer[1])
+                    self._buffers[address] = (timestamps, prices)
+                raise
+            finally:
+                self._writing = {}
+
+    def _column(self, address: str, segment: int, column: str, count: int):
+        """Memory-map a segment column; returns (mmap, float64 view, owned)"""
+        key = (address, segment, column)
+        sealed = count >= self.segment_ticks
+        mapped = self._sealed_maps.get(key) if sealed else None
+        if mapped is None:
+            with open(self._path(address, segment, column), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), count * 8, access=mmap.ACCESS_READ)
+            if sealed:
+                self._sealed_maps[key] = mapped
+        return mapped, memoryview(mapped)[:count * 8].cast('d'), not sealed
+
+    def range(self, address: str, start: float, end: float) -> Tuple[array, array]:
+        """Timestamps and prices of ticks with start <= timestamp < end"""
+        out_ts, out_px = array('d'), array('d')
+        for segment, count in enumerate(self._segment_counts(address)):
+            if not count:
+                continue
+            ts_map, ts, ts_owned = self._column(address, segment, 'ts', count)
+            try:
+                if ts[0] >= end or ts[count - 1] < start:
+                    continue
+                i = bisect.bisect_left(ts, start)
+                j = bisect.bisect_left(ts, end, i)
+                out_ts.frombytes(ts[i:j].tobytes())
+                px_map, px, px_owned = self._column(address, segment, 'px', count)
+                try:
+                    out_px.frombytes(px[i:j].tobytes())
+                finally:
+                    px.release()
+                    if px_owned:
+                        px_map.close()
+            finally:
+                ts.release()
+                if ts_owned:
+                    ts_map.close()
+        for source in (self._writing, self._buffers):
+            buffered = source.get(address)
+            if buffered:
+                i = bisect.bisect_left(buffered[0], start)
+                j = bisect.bisect_left(buffered[0], end, i)
+                out_ts.extend(buffered[0][i:j])
+                out_px.extend(buffered[1][i:j])
+        return out_ts, out_px
+
+    def ohlc(self, address: str, start: float, end: float, bucket: float) -> List[Tuple[float, float, float, float, float, int]]:
+        """Downsample ticks into (bucket_start, open, high, low, close, count) bars"""
+        ts, px = self.range(address, start, end)
+        bars = []
+        i = 0
+        n = len(ts)
+        while i < n:
+            bucket_start = (ts[i] // bucket) * bucket
+            j = bisect.bisect_left(ts, bucket_start + bucket, i)
+            window = px[i:j]
+            bars.append((bucket_start, window[0], max(window), min(window), window[-1], j - i))
+            i = j
+        return bars
+
+    def count(self, address: str) -> int:
+        """Total ticks stored for a token, including unflushed ones"""
+        total = sum(self._segment_counts(address))
+        for source in (self._writing, self._buffers):
+            if address in source:
+                total += len(source[address][0])
+        return total
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing price ticks: {e}")
+
+    def start(self, flush_interval: float = 5.0):
+        """Create the store directory and start the background flusher on the running loop"""
+        os.makedirs(self.root, exist_ok=True)
+        self.flush_interval = flush_interval
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background flusher, flush what's left and unmap sealed segments"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        for mapped in self._sealed_maps.values():
+            mapped.close()
+        self._sealed_maps.clear()
@@ -0,0 +1,160 @@
+import time
+import bisect
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TokenSearchIndex:
+    """Local symbol/name search over a periodically refreshed token universe.
+
+    Prefix matches come from a sorted key list (bisect), fuzzy matches from a
+    trigram inverted index over symbols; both are ranked by 24h volume. Only
+    a query with no local match goes to the remote search, and whatever it
+    returns is merged into the index for the next user.
+    """
+
+    def __init__(self, load_universe: Callable[[], Awaitable[List[Dict]]],
+                 remote_search: Callable[[str], Awaitable[List[Dict]]],
+                 interval: float = 600.0, fuzzy_threshold: float = 0.4):
+        self.load_universe = load_universe
+        self.remote_search = remote_search
+        self.interval = interval
+        self.fuzzy_threshold = fuzzy_threshold
+        self._tokens: Dict[str, Dict] = {}
+        self._keys: List[tuple] = []  # sorted (lowercase key, address)
+        self._trigrams: Dict[str, set] = {}  # trigram -> addresses
+        self._gram_counts: Dict[str, int] = {}  # address -> number of symbol trigrams
+        self._task: Optional[asyncio.Task] = None
+        self.last_refresh = None
+        self.local_hits = 0
+        self.remote_fallbacks = 0
+
+    def __len__(self):
+        return len(self._tokens)
+
+    @staticmethod
+    def _volume(token: Dict) -> float:
+        return float(token.get('v24hUSD') or 0.0)
+
+    def _index_token(self, address: str, token: Dict, keys: List[tuple], trigrams: Dict[str, set],
+                     gram_counts: Dict[str, int]):
+        symbol = (token.get('symbol') or '').lower()
+        name = (token.get('name') or '').lower()
+        for key in {symbol, name, *name.split()}:
+            if key:
+                keys.append((key, address))
+        if symbol:
+            grams = _trigrams(symbol)
+            gram_counts[address] = len(grams)
+            for gram in grams:
+                trigrams.setdefault(gram, set()).add(address)
+
+    def replace(self, tokens: List[Dict]):
+        """Rebuild the index from a fresh universe (swapped in atomically)"""
+        universe = {t['address']: t for t in tokens if t.get('address')}
+        keys, trigrams, gram_counts = [], {}, {}
+        for address, token in universe.items():
+            self._index_token(address, token, keys, trigrams, gram_counts)
+        keys.sort()
+        self._tokens, self._keys, self._trigrams, self._gram_counts = universe, keys, trigrams, gram_counts
+        self.last_refresh = time.monotonic()
+
+    def merge(self, tokens: List[Dict]):
+        """Add tokens found by the remote search to the live index"""
+        keys = []
+        for token in tokens:
+            address = token.get('address')
+            if not address or address in self._tokens:
+                continue
+            self._tokens[address] = token
+            self._index_token(address, token, keys, self._trigrams, self._gram_counts)
+        for key in keys:
+            bisect.insort(self._keys, key)
+
+    def _prefix(self, query: str) -> set:
+        keys = self._keys
+        found = set()
+        for i in range(bisect.bisect_left(keys, (query,)), len(keys)):
+            key, address = keys[i]
+            if not key.startswith(query):
+                break
+            found.add(address)
+        return found
+
+    def _fuzzy(self, query: str) -> set:
+        grams = _trigrams(query)
+        counts: Dict[str, int] = {}
+        for gram in grams:
+            for address in self._trigrams.get(gram, ()):
+                counts[address] = counts.get(address, 0) + 1
+        found = set()
+        # Jaccard similarity of trigram sets; candidates sharing too few grams can't pass
+        min_shared = self.fuzzy_threshold * len(grams)
+        for address, shared in counts.items():
+            if shared < min_shared:
+                continue
+            union = len(grams) + self._gram_counts[address] - shared
+            if shared / union >= self.fuzzy_threshold:
+                found.add(address)
+        return found
+
+    def lookup(self, query: str, limit: int = 10) -> List[Dict]:
+        """Answer a query from the local index only"""
+        query = query.strip()
+        if query in self._tokens:  # full address pasted in
+            return [self._tokens[query]]
+        query = query.lower()
+        if not query:
+            return []
+        found = self._prefix(query)
+        if len(found) < limit:
+            found |= self._fuzzy(query)
+        ranked = sorted((self._tokens[a] for a in found), key=self._volume, reverse=True)
+        return ranked[:limit]
+
+    async def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Search locally, falling back to the remote search only on a miss"""
+        results = self.lookup(query, limit)
+        if results:
+            self.local_hits += 1
+            return results
+        self.remote_fallbacks += 1
+        remote = await self.remote_search(query.strip())
+        self.merge(remote)
+        return sorted(remote, key=self._volume, reverse=True)[:limit]
+
+    async def refresh(self):
+        """Reload the token universe and rebuild the index"""
+        tokens = await self.load_universe()
+        if tokens:
+            self.replace(tokens)
+            logger.info(f"Token search index rebuilt with {len(self._tokens)} tokens")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing token search index: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background refresher on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background refresher"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,82 +1,478 @@
 import os
-import requests
+import time
+import asyncio
+import logging
+import aiohttp
+from collections import deque
 from typing import Dict, List, Optional
 
+from rate_limiter import PriorityRateLimiter, parse_retry_after
+from circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
 BIRDEYE_API_KEY = os.getenv('BIRDEYE_API_KEY')
 HELIUS_API_KEY = os.getenv('HELIUS_API_KEY')
+BIRDEYE_BASE_URL = os.getenv('BIRDEYE_BASE_URL', 'https://public-api.birdeye.so')
+HELIUS_API_URL = os.getenv('HELIUS_API_URL', 'https://api.helius.xyz')
+HELIUS_RPC_URL = os.getenv('HELIUS_RPC_URL', 'https://mainnet.helius-rpc.com')
+
+# Method groups, each with its own circuit breaker per provider
+PRICE = 'price'      # get_price, get_prices
+CATALOG = 'catalog'  # token lists, search, metadata
+
+class ProviderError(Exception):
+    """A market-data provider returned an unusable response"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+class EmptyResult(ProviderError):
+    """A provider answered, but had nothing for the request (e.g. unknown tokens)"""
+
+def is_outage(error: BaseException) -> bool:
+    """Whether an error means the provider itself is unhealthy (vs. e.g. an unknown token)"""
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError)):
+        return True
+    return isinstance(error, ProviderError) and error.status is not None and (error.status >= 500 or error.status == 429)
+
+class MarketDataProvider:
+    """Interface every market-data source implements.
+
+    Each provider owns one long-lived pooled aiohttp session so lookups reuse
+    warm keep-alive connections. Call start() once the event loop is running
+    and close() on shutdown. Methods a source doesn't offer raise
+    NotImplementedError and TokenUtils skips the provider for that call.
+    An optional PriorityRateLimiter gates every request to the API: TokenUtils
+    takes the slots through acquire() before a call's timeout starts, so time
+    spent queued for the rate limit never counts as provider latency. An
+    optional circuit breaker per method group lets TokenUtils skip the
+    provider during outages. Price lookups and catalog calls (token lists,
+    search, metadata) are broken separately, so failing background catalog
+    refreshes can't stop trades from being priced.
+    """
+
+    name = 'provider'
+    METHOD_GROUPS = {'get_price': PRICE, 'get_prices': PRICE}  # every other method is CATALOG
+
+    def __init__(self, timeout: float = 5.0, connect_timeout: float = 2.0, pool_size: int = 100,
+                 dns_cache_ttl: int = 300, keepalive_timeout: float = 60.0,
+                 rate_limiter: Optional[PriorityRateLimiter] = None,
+                 circuit_breakers: Optional[Dict[str, CircuitBreaker]] = None):
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.circuit_breakers = dict(circuit_breakers or {})  # method group -> breaker
+        self.pool_size = pool_size
+        self._client_timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout, sock_read=timeout)
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _headers(self) -> Dict[str, str]:
+        return {'accept': 'application/json'}
+
+    async def start(self):
+        """Open the pooled session (idempotent)"""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self._client_timeout, headers=self._headers())
+        logger.info(f"{self.name} provider started (pool size {self.pool_size})")
+
+    async def close(self):
+        """Close the pooled session and its connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def breaker(self, method: str) -> Optional[CircuitBreaker]:
+        """The circuit breaker guarding `method`, if its group has one"""
+        return self.circuit_breakers.get(self.METHOD_GROUPS.get(method, CATALOG))
+
+    def requests_for(self, method: str, args) -> int:
+        """How many API requests a call to `method` with `args` makes"""
+        return 1
+
+    async def acquire(self, method: str, args):
+        """Wait for the rate-limit slots a call to `method` with `args` needs"""
+        if self.rate_limiter is not None:
+            for _ in range(self.requests_for(method, args)):
+                await self.rate_limiter.acquire()
+
+    async def _request_json(self, method: str, url: str, **kwargs):
+        if self._session is None or self._session.closed:
+            await self.start()
+        async with self._session.request(method, url, **kwargs) as response:
+            if response.status == 429 and self.rate_limiter is not None:
+                self.rate_limiter.backoff(parse_retry_after(response.headers.get('Retry-After')))
+            if response.status != 200:
+                raise ProviderError(f"{self.name} returned status {response.status} for {url}", response.status)
+            return await response.json()
+
+    async def get_price(self, token_address: str) -> Optional[float]:
+        """Get the USD price of a token"""
+        raise NotImplementedError
+
+    async def get_prices(self, token_addresses: List[str]) -> Dict[str, float]:
+        """Get USD prices for many tokens; unknown tokens are left out"""
+        raise NotImplementedError
+
+    async def search_tokens(self, query: str) -> List[Dict]:
+        """Search tokens by symbol or name"""
+        raise NotImplementedError
+
+    async def get_top_gainers(self, limit: int = 10) -> List[Dict]:
+        """Get the top gaining tokens over 24h"""
+        raise NotImplementedError
+
+    async def get_top_losers(self, limit: int = 10) -> List[Dict]:
+        """Get the top losing tokens over 24h"""
+        raise NotImplementedError
+
+    async def get_tokens_by_volume(self, offset: int = 0, limit: int = 50) -> List[Dict]:
+        """Get one page of tokens ranked by 24h volume"""
+        raise NotImplementedError
+
+    async def get_tokens_metadata(self, token_addresses: List[str]) -> Dict[str, Dict]:
+        """Get symbol/name/decimals for many mints, keyed by address"""
+        raise NotImplementedError
+
+class BirdeyeProvider(MarketDataProvider):
+    """Market data from the Birdeye public API"""
+
+    name = 'birdeye'
+    MULTI_PRICE_BATCH = 100  # Birdeye's limit on addresses per multi_price call
+    TOKEN_LIST_PAGE = 50  # Birdeye's limit on tokens per tokenlist page
+
+    def __init__(self, api_key: Optional[str], base_url: str = BIRDEYE_BASE_URL, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+
+    def _headers(self):
+        return {'accept': 'application/json', 'x-chain': 'solana', 'X-API-KEY': self.api_key or ''}
+
+    def requests_for(self, method, args):
+        if method == 'get_prices':
+            return max(1, -(-len(set(args[0])) // self.MULTI_PRICE_BATCH))
+        return 1
+
+    async def get_price(self, token_address):
+        data = await self._request_json('GET', f"{self.base_url}/defi/price", params={'address': token_address})
+        return float(data["data"]["value"])
+
+    async def get_prices(self, token_addresses):
+        addresses = list(dict.fromkeys(token_addresses))
+        chunks = [addresses[i:i + self.MULTI_PRICE_BATCH] for i in range(0, len(addresses), self.MULTI_PRICE_BATCH)]
+        results = await asyncio.gather(*(self._get_price_chunk(chunk) for chunk in chunks))
+        prices = {}
+        for chunk_prices in results:
+            prices.update(chunk_prices)
+        return prices
+
+    async def _get_price_chunk(self, addresses):
+        data = await self._request_json(
+            'GET', f"{self.base_url}/defi/multi_price", params={'list_address': ','.join(addresses)}
+        )
+        prices = {}
+        for address, item in (data.get("data") or {}).items():
+            if item and item.get("value") is not None:
+                prices[address] = float(item["value"])
+        return prices
+
+    async def _token_list(self, sort_by, sort_type, limit, offset=0):
+        data = await self._request_json('GET', f"{self.base_url}/defi/tokenlist", params={
+            'sort_by': sort_by, 'sort_type': sort_type, 'offset': offset, 'limit': limit,
+        })
+        return data['data']['tokens']
+
+    async def search_tokens(self, query):
+        data = await self._request_json('GET', f"{self.base_url}/defi/v3/search", params={
+            'chain': 'solana', 'keyword': query, 'target': 'token',
+            'sort_by': 'volume_24h_usd', 'sort_type': 'desc', 'offset': 0, 'limit': 20,
+        })
+        tokens = []
+        for item in (data.get('data') or {}).get('items') or []:
+            for token in item.get('result') or []:
+                tokens.append({
+                    'address': token.get('address'),
+                    'symbol': token.get('symbol'),
+                    'name': token.get('name'),
+                    'decimals': token.get('decimals'),
+                    'v24hUSD': token.get('volume_24h_usd') or 0.0,
+                    'price': token.get('price'),
+                })
+        return tokens
+
+    async def get_top_gainers(self, limit=10):
+        return await self._token_list('v24hChangePercent', 'desc', limit)
+
+    async def get_top_losers(self, limit=10):
+        return await self._token_list('v24hChangePercent', 'asc', limit)
+
+    async def get_tokens_by_volume(self, offset=0, limit=50):
+        return await self._token_list('v24hUSD', 'desc', min(limit, self.TOKEN_LIST_PAGE), offset)
+
+    async def get_tokens_metadata(self, token_addresses):
+        data = await self._request_json(
+            'GET', f"{self.base_url}/defi/v3/token/meta-data/multiple",
+            params={'list_address': ','.join(token_addresses)},
+        )
+        metadata = {}
+        for address, item in (data.get('data') or {}).items():
+            if item:
+                metadata[address] = {
+                    'address': address,
+                    'symbol': item.get('symbol'),
+                    'name': item.get('name'),
+                    'decimals': item.get('decimals'),
+                }
+        return metadata
+
+class HeliusProvider(MarketDataProvider):
+    """Market data from Helius (DAS asset prices and token metadata)"""
+
+    name = 'helius'
+    ASSET_BATCH = 1000  # getAssetBatch limit
+
+    def __init__(self, api_key: Optional[str], api_url: str = HELIUS_API_URL, rpc_url: str = HELIUS_RPC_URL, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        self.api_url = api_url.rstrip('/')
+        self.rpc_url = rpc_url.rstrip('/')
+
+    def requests_for(self, method, args):
+        if method == 'get_prices':
+            return max(1, -(-len(set(args[0])) // self.ASSET_BATCH))
+        return 1
+
+    async def _get_assets(self, addresses):
+        assets = []
+        for i in range(0, len(addresses), self.ASSET_BATCH):
+            data = await self._request_json('POST', f"{self.rpc_url}/", params={'api-key': self.api_key or ''}, json={
+                'jsonrpc': '2.0', 'id': 'paper-trade', 'method': 'getAssetBatch',
+                'params': {'ids': addresses[i:i + self.ASSET_BATCH]},
+            })
+            if 'error' in data:
+                raise ProviderError(f"helius getAssetBatch error: {data['error']}")
+            assets.extend(asset for asset in data.get('result') or [] if asset)
+        return assets
+
+    async def get_price(self, token_address):
+        prices = await self.get_prices([token_address])
+        return prices.get(token_address)
+
+    async def get_prices(self, token_addresses):
+        prices = {}
+        for asset in await self._get_assets(list(dict.fromkeys(token_addresses))):
+            price_info = (asset.get('token_info') or {}).get('price_info') or {}
+            if price_info.get('price_per_token') is not None:
+                prices[asset['id']] = float(price_info['price_per_token'])
+        return prices
+
+    async def get_tokens_metadata(self, token_addresses):
+        data = await self._request_json(
+            'POST', f"{self.api_url}/v0/token-metadata", params={'api-key': self.api_key or ''},
+            json={'mintAccounts': list(token_addresses), 'includeOffChain': False, 'disableCache': False},
+        )
+        metadata = {}
+        for item in data or []:
+            address = item.get('account')
+            legacy = item.get('legacyMetadata') or {}
+            on_chain = (((item.get('onChainMetadata') or {}).get('metadata') or {}).get('data')) or {}
+            parsed = ((((item.get('onChainAccountInfo') or {}).get('accountInfo') or {}).get('data') or {})
+                      .get('parsed') or {}).get('info') or {}
+            if not address:
+                continue
+            metadata[address] = {
+                'address': address,
+                'symbol': (on_chain.get('symbol') or legacy.get('symbol') or '').strip() or None,
+                'name': (on_chain.get('name') or legacy.get('name') or '').strip() or None,
+                'decimals': parsed.get('decimals', legacy.get('decimals')),
+            }
+        return metadata
+
+class LatencyTracker:
+    """Rolling window of a provider's successful response times"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        """95th percentile latency, or None until enough samples are collected"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
 
 class TokenUtils:
-    @staticmethod
-    async def get_token_price(token_address: str) -> Optional[float]:
-        """Get token price from Birdeye API"""
+    """Async market-data facade over an ordered list of providers.
+
+    Every call goes to the first provider that implements it. If that
+    provider hasn't answered by its p95 latency, the next provider is fired
+    as a hedge and whichever answers first wins. Errors, timeouts and empty
+    answers fail over to the next provider in order. Providers whose circuit
+    breaker is open are skipped, so a full outage fails fast.
+    """
+
+    def __init__(self, providers: List[MarketDataProvider], hedge_delay: float = 0.5,
+                 min_hedge_delay: float = 0.05, hedging: bool = True):
+        self.providers = providers
+        self.hedge_delay = hedge_delay  # used until a provider has enough samples for a p95
+        self.min_hedge_delay = min_hedge_delay
+        self.hedging = hedging
+        self.latency = {provider.name: LatencyTracker() for provider in providers}
+        self.hedges_fired = 0
+        self.failovers = 0
+
+    async def start(self):
+        for provider in self.providers:
+            await provider.start()
+
+    async def close(self):
+        for provider in self.providers:
+            await provider.close()
+
+    def _hedge_after(self, provider: MarketDataProvider) -> float:
+        p95 = self.latency[provider.name].p95()
+        return max(self.min_hedge_delay, p95 if p95 is not None else self.hedge_delay)
+
+    async def _attempt(self, provider: MarketDataProvider, method: str, args):
+        breaker = provider.breaker(method)
         try:
-            headers = {'X-API-KEY': BIRDEYE_API_KEY}
-            response = requests.get(
-                f'https://public-api.birdeye.so/public/price?address={token_address}',
-                headers=headers
-            )
-            data = response.json()
-            return float(data['data']['value'])
+            await provider.acquire(method, args)
+            started = time.monotonic()
+            result = await asyncio.wait_for(getattr(provider, method)(*args), provider.timeout)
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release()
+            raise
         except Exception as e:
-            print(f"Error getting token price: {e}")
-            return None
+            if breaker is not None:
+                if is_outage(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            raise
+        self.latency[provider.name].record(time.monotonic() - started)
+        if breaker is not None:
+            breaker.record_success()
+        if not result:
+            raise EmptyResult(f"{provider.name} returned no data for {method}")
+        return result
+
+    def _implements(self, provider: MarketDataProvider, method: str) -> bool:
+        return getattr(type(provider), method) is not getattr(MarketDataProvider, method)
+
+    def is_available(self, method: str = 'get_price') -> bool:
+        """False when every provider offering `method` has an open breaker for its group"""
+        breakers = [p.breaker(method) for p in self.providers if self._implements(p, method)]
+        return any(breaker is None or not breaker.is_open() for breaker in breakers)
+
+    async def _call(self, method: str, *args, default=None, require_answer: bool = False):
+        """First non-empty answer, else `default`; with `require_answer`, raise if no provider answered at all"""
+        queue = [p for p in self.providers if self._implements(p, method)]
+        pending = {}
+
+        def launch():
+            while queue:
+                provider = queue.pop(0)
+                breaker = provider.breaker(method)
+                if breaker is None or breaker.allow():
+                    pending[asyncio.ensure_future(self._attempt(provider, method, args))] = provider
+                    return
 
-    @staticmethod
-    async def search_tokens(query: str) -> List[Dict]:
-        """Search for tokens using Birdeye API"""
+        answered = False
+        launch()
         try:
-            headers = {'X-API-KEY': BIRDEYE_API_KEY}
-            response = requests.get(
-                f'https://public-api.birdeye.so/public/tokenlist?sort_by=volume&sort_type=desc&offset=0&limit=20&query={query}',
-                headers=headers
-            )
-            data = response.json()
-            return data['data']['tokens']
-        except Exception as e:
-            print(f"Error searching tokens: {e}")
-            return []
+            while pending:
+                timeout = None
+                if self.hedging and queue and len(pending) == 1:
+                    timeout = self._hedge_after(next(iter(pending.values())))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges_fired += 1
+                    launch()
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        logger.warning(f"{provider.name} {method} failed: {e!r}")
+                        answered = answered or isinstance(e, EmptyResult)
+                        if queue and not pending:
+                            self.failovers += 1
+                            launch()
+            if require_answer and not answered:
+                raise ProviderError(f"no provider answered {method}")
+            return default
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get_token_price(self, token_address: str) -> Optional[float]:
+        """Get a token's USD price, or None if no provider could price it"""
+        return await self._call('get_price', token_address)
+
+    async def get_token_prices(self, token_addresses: List[str]) -> Dict[str, float]:
+        """Get USD prices for many tokens in as few requests as the provider allows"""
+        if not token_addresses:
+            return {}
+        return await self._call('get_prices', list(token_addresses), default={})
 
-    @staticmethod
-    async def get_top_gainers() -> List[Dict]:
+    async def search_tokens(self, query: str) -> List[Dict]:
+        """Search for tokens by symbol or name"""
+        return await self._call('search_tokens', query, default=[])
+
+    async def get_top_gainers(self, limit: int = 10) -> List[Dict]:
         """Get top gaining tokens"""
-        try:
-            headers = {'X-API-KEY': BIRDEYE_API_KEY}
-            response = requests.get(
-                'https://public-api.birdeye.so/public/tokenlist?sort_by=price_change_24h&sort_type=desc&offset=0&limit=10',
-                headers=headers
-            )
-            data = response.json()
-            return data['data']['tokens']
-        except Exception as e:
-            print(f"Error getting top gainers: {e}")
-            return []
+        return await self._call('get_top_gainers', limit, default=[])
 
-    @staticmethod
-    async def get_top_losers() -> List[Dict]:
+    async def get_top_losers(self, limit: int = 10) -> List[Dict]:
         """Get top losing tokens"""
-        try:
-            headers = {'X-API-KEY': BIRDEYE_API_KEY}
-            response = requests.get(
-                'https://public-api.birdeye.so/public/tokenlist?sort_by=price_change_24h&sort_type=asc&offset=0&limit=10',
-                headers=headers
-            )
-            data = response.json()
-            return data['data']['tokens']
-        except Exception as e:
-            print(f"Error getting top losers: {e}")
-            return []
+        return await self._call('get_top_losers', limit, default=[])
 
-    @staticmethod
-    async def get_token_metadata(token_address: str) -> Optional[Dict]:
-        """Get token metadata using Helius API"""
-        try:
-            headers = {'Authorization': f'Bearer {HELIUS_API_KEY}'}
-            response = requests.get(
-                f'https://api.helius.xyz/v0/tokens/metadata?api-key={HELIUS_API_KEY}&mintAccounts={token_address}',
-                headers=headers
-            )
-            data = response.json()
-            return data[0] if data else None
-        except Exception as e:
-            print(f"Error getting token metadata: {e}")
-            return None 
\ No newline at end of file
+    async def get_token_universe(self, size: int = 1000, page_size: int = 50) -> List[Dict]:
+        """Get the `size` highest-volume tokens, one page request at a time"""
+        tokens = []
+        for offset in range(0, size, page_size):
+            page = await self._call('get_tokens_by_volume', offset, min(page_size, size - offset), default=[])
+            tokens.extend(page)
+            if len(page) < min(page_size, size - offset):
+                break
+        return tokens
+
+    async def get_tokens_metadata(self, token_addresses: List[str]) -> Dict[str, Dict]:
+        """Get symbol/name/decimals for many mints, keyed by address.
+
+        Mints left out were answered as unknown. Raises ProviderError when no
+        provider answered at all, so callers can tell an outage from unknown
+        tokens.
+        """
+        if not token_addresses:
+            return {}
+        return await self._call('get_tokens_metadata', list(token_addresses), default={}, require_answer=True)
+
+    async def get_token_metadata(self, token_address: str) -> Optional[Dict]:
+        """Get symbol/name/decimals for one mint (raises ProviderError if no provider answered)"""
+        return (await self.get_tokens_metadata([token_address])).get(token_address)
+
+    def stats(self) -> dict:
+        """Per-provider p95 latency, per-group breaker state, plus hedge and failover counters"""
+        return {
+            'p95': {name: tracker.p95() for name, tracker in self.latency.items()},
+            'breakers': {breaker.name: breaker.stats() for p in self.providers for breaker in p.circuit_breakers.values()},
+            'hedges_fired': self.hedges_fired,
+            'failovers': self.failovers,
+        }
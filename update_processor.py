@@ -0,0 +1,124 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently across users but one at a time per user.
+
+    Each user gets an asyncio.Lock for as long as they have updates in
+    flight. Locks are FIFO, so a user's updates still run in the order they
+    arrived, and a lock is dropped as soon as its last waiter is done, so
+    idle users cost nothing. At most `max_concurrent_updates` handlers run at
+    once; the slot is taken after the user's lock, so a user queueing many
+    updates can't tie up slots other users could run in. The base class
+    semaphore only caps how many updates may be waiting in the processor.
+
+    `backlog` counts updates handed to the processor and not finished yet,
+    whether queued or running. `stalled_for()` is the age of the oldest
+    update that is still queued, waiting on its user's lock or for a slot,
+    so a slow handler on its own isn't a stall but the updates it holds up are.
+    """
+
+    def __init__(self, max_concurrent_updates: int = 64, max_pending_updates: int = 4096):
+        super().__init__(max_pending_updates)
+        self.concurrency = max_concurrent_updates
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiting: Dict[int, int] = {}  # updates holding or queued on each user's lock
+        self.running = 0
+        self.peak_running = 0
+        self.entered = 0
+        self.processed = 0
+        self.serialized = 0
+        self._queued: Dict[int, float] = {}  # updates not started yet -> when they arrived, oldest first
+
+    @staticmethod
+    def key(update: object) -> Optional[int]:
+        """The user an update belongs to, or None for updates that need no ordering"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def _run(self, ticket: int, coroutine: Awaitable[Any]):
+        async with self._running:
+            del self._queued[ticket]
+            self.running += 1
+            self.peak_running = max(self.peak_running, self.running)
+            try:
+                await coroutine
+            finally:
+                self.running -= 1
+
+    def busy(self, key: int) -> bool:
+        """Whether a user has an update running or queued"""
+        return key in self._waiting
+
+    @property
+    def backlog(self) -> int:
+        return self.entered - self.processed
+
+    def stalled_for(self) -> float:
+        """Seconds the oldest queued update has been waiting to start (0 when nothing is queued)"""
+        for arrived in self._queued.values():
+            return time.monotonic() - arrived
+        return 0.0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        self.entered += 1
+        ticket = self.entered
+        self._queued[ticket] = time.monotonic()
+        try:
+            await self._process(ticket, update, coroutine)
+        finally:
+            # Also reached when the update is cancelled before it ever started
+            self._queued.pop(ticket, None)
+            self.processed += 1
+
+    async def _process(self, ticket: int, update: object, coroutine: Awaitable[Any]):
+        key = self.key(update)
+        if key is None:
+            await self._run(ticket, coroutine)
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        elif lock.locked():
+            self.serialized += 1
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            async with lock:
+                await self._run(ticket, coroutine)
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            'max_concurrent': self.concurrency,
+            'running': self.running,
+            'peak_running': self.peak_running,
+            'processed': self.processed,
+            'backlog': self.backlog,
+            'queued': len(self._queued),
+            'serialized': self.serialized,
+            'user_locks': len(self._locks),
+        }
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class UserStateCache:
+    """Bounded LRU of per-user in-memory state, loaded from the database on a miss.
+
+    `load(uid)` builds a user's state (or returns None for unknown users);
+    concurrent misses for the same user share one load. Once more than
+    `capacity` users are resident the least recently used ones are evicted,
+    but never while `is_dirty(uid)` says they still have unwritten changes
+    or an update in flight: those stay until the write-behind flusher has
+    written them and a later insert trims them. `on_insert`/`on_evict` let
+    the bot keep per-user side state (hot price subscriptions) in step;
+    `on_insert` may be called again for a resident user and must be
+    idempotent. `merge(resident, state)` folds a handler's copy into a
+    resident copy that was reloaded meanwhile.
+    """
+
+    def __init__(self, load: Callable[[int], Awaitable[Optional[dict]]], capacity: int = 10000,
+                 is_dirty: Callable[[int], bool] = None,
+                 on_insert: Callable[[int, dict], None] = None, on_evict: Callable[[int, dict], None] = None,
+                 merge: Callable[[dict, dict], None] = None):
+        self.load = load
+        self.capacity = capacity
+        self.is_dirty = is_dirty or (lambda uid: False)
+        self.on_insert = on_insert
+        self.on_evict = on_evict
+        self.merge = merge
+        self._entries: "OrderedDict[int, dict]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.not_found = 0
+        self.evictions = 0
+
+    def __contains__(self, uid: int) -> bool:
+        return uid in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, uid: int) -> dict:
+        state = self._entries[uid]
+        self._entries.move_to_end(uid)
+        return state
+
+    def peek(self, uid: int) -> Optional[dict]:
+        """Resident state without touching recency (for the flusher)"""
+        return self._entries.get(uid)
+
+    def put(self, uid: int, state: dict):
+        """Make `state` the resident state for `uid`, then trim to capacity"""
+        old = self._entries.get(uid)
+        if old is not state:
+            if old is not None and self.on_evict:
+                self.on_evict(uid, old)
+            self._entries[uid] = state
+            if self.on_insert:
+                self.on_insert(uid, state)
+        self._entries.move_to_end(uid)
+        self.trim()
+
+    def restore(self, uid: int, state: dict) -> dict:
+        """Make sure a state a handler is about to mark dirty is resident, and return the resident copy.
+
+        If the user was evicted the handler's copy is put back. If they were
+        evicted and loaded again meanwhile, the handler's copy is merged into
+        the reloaded one rather than replacing it, so nothing holding the
+        resident copy is left with a detached one.
+        """
+        resident = self._entries.get(uid)
+        if resident is state:
+            return state
+        if resident is None or self.merge is None:
+            logger.warning(f"User {uid} was evicted mid-update; restoring the updated state")
+            self.put(uid, state)
+            return state
+        logger.warning(f"User {uid} was reloaded mid-update; merging the update into the resident state")
+        self.merge(resident, state)
+        if self.on_insert:
+            self.on_insert(uid, resident)
+        return resident
+
+    def trim(self):
+        """Evict least recently used clean users until within capacity"""
+        excess = len(self._entries) - self.capacity
+        if excess <= 0:
+            return
+        victims = []
+        for uid in self._entries:
+            if not self.is_dirty(uid):
+                victims.append(uid)
+                if len(victims) == excess:
+                    break
+        for uid in victims:
+            state = self._entries.pop(uid)
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(uid, state)
+
+    async def get(self, uid: int) -> Optional[dict]:
+        """Return a user's state, loading it on a miss (None if the user doesn't exist)"""
+        state = self._entries.get(uid)
+        if state is not None:
+            self._entries.move_to_end(uid)
+            self.hits += 1
+            return state
+
+        inflight = self._inflight.get(uid)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._load(uid))
+        self._inflight[uid] = task
+        task.add_done_callback(lambda t: self._inflight.pop(uid, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, uid: int) -> Optional[dict]:
+        state = await self.load(uid)
+        if state is None:
+            self.not_found += 1
+            return None
+        resident = self._entries.get(uid)
+        if resident is not None:
+            return resident  # registered or loaded by someone else meanwhile
+        self.put(uid, state)
+        return state
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'not_found': self.not_found,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
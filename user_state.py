@@ -0,0 +1,60 @@
+import sys
+from typing import Dict, Iterable, List, Optional
+
+class Holding:
+    """One open position: quantity held and average entry price"""
+
+    __slots__ = ('qty', 'avg_price')
+
+    def __init__(self, qty: float, avg_price: float):
+        self.qty = qty
+        self.avg_price = avg_price
+
+    def __repr__(self):
+        return f"Holding(qty={self.qty!r}, avg_price={self.avg_price!r})"
+
+class UserState:
+    """A resident user's balance, positions and recent activity.
+
+    Slotted so each user costs a few fixed fields rather than a dict of
+    dicts. Holdings are keyed by interned addresses, so a token held by many
+    users is stored once. Recent history is kept UTF-8 encoded: every entry
+    starts with an emoji, which would otherwise make each str use four bytes
+    per character.
+    """
+
+    __slots__ = ('db_id', 'balance', 'realized_pnl', 'holdings', 'context', 'referral_id', '_history')
+
+    def __init__(self, db_id: int, balance: float, realized_pnl: float = 0.0,
+                 holdings: Optional[Dict[str, Holding]] = None, history: Iterable[str] = (),
+                 context: Optional[dict] = None, referral_id: Optional[int] = None):
+        self.db_id = db_id
+        self.balance = balance
+        self.realized_pnl = realized_pnl
+        self.holdings: Dict[str, Holding] = {}
+        for address, holding in (holdings or {}).items():
+            self.holdings[sys.intern(address)] = holding
+        self.context = context or None
+        self.referral_id = referral_id
+        self._history: List[bytes] = [entry.encode() for entry in history]
+
+    def set_holding(self, address: str, qty: float, avg_price: float):
+        """Open or replace a position"""
+        self.holdings[sys.intern(address)] = Holding(qty, avg_price)
+
+    @property
+    def history(self) -> List[str]:
+        return [entry.decode() for entry in self._history]
+
+    def add_history(self, entry: str, window: int):
+        """Add an activity entry, keeping only the last `window`"""
+        self._history.append(entry.encode())
+        del self._history[:-window]
+
+    def absorb(self, other: 'UserState'):
+        """Take over the fields of another copy of this user that a handler updated"""
+        self.balance = other.balance
+        self.realized_pnl = other.realized_pnl
+        self.holdings = other.holdings
+        self.context = other.context
+        self._history = other._history
@@ -0,0 +1,64 @@
+import hmac
+import logging
+from typing import Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+class TelegramWebhook:
+    """Receives Telegram updates POSTed to an aiohttp route.
+
+    Telegram echoes the secret token registered with setWebhook in a header
+    on every delivery; requests without it are rejected. Accepted updates are
+    parsed and put on the Application's update queue, and the request is
+    answered straight away: handlers run afterwards, so a slow handler never
+    makes Telegram time out and redeliver.
+    """
+
+    def __init__(self, application: Application, secret_token: str, path: str = '/telegram'):
+        self.application = application
+        self.secret_token = secret_token
+        self.path = path
+        self.received = 0
+        self.rejected = 0
+        self.malformed = 0
+
+    def add_routes(self, app: web.Application):
+        app.router.add_post(self.path, self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            self.rejected += 1
+            logger.warning(f"Rejected webhook request from {request.remote}: bad secret token")
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+            if update is None:
+                raise ValueError("empty update")
+        except Exception as e:
+            self.malformed += 1
+            logger.error(f"Malformed webhook update: {e}")
+            return web.Response(status=400)
+        self.received += 1
+        self.application.update_queue.put_nowait(update)
+        return web.Response()
+
+    async def register(self, base_url: str, drop_pending_updates: Optional[bool] = None):
+        """Point Telegram at this route"""
+        url = base_url.rstrip('/') + self.path
+        await self.application.bot.set_webhook(
+            url=url,
+            secret_token=self.secret_token,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=drop_pending_updates,
+        )
+        logger.info(f"Webhook registered at {url}")
+
+    def stats(self) -> dict:
+        return {'received': self.received, 'rejected': self.rejected, 'malformed': self.malformed}